@@ -9,7 +9,14 @@ const courseSchema = new mongoose.Schema({
   enrollment: Number,
   withdraw: Number,
   past_classes: Number,
-  new_classes: Number
+  new_classes: Number,
+  gpa_weighted: Number,
+  gpa_std: Number,
+  gpa_p25: Number,
+  gpa_median: Number,
+  gpa_p75: Number,
+  gpa_ci_low: Number,
+  gpa_ci_high: Number
 });
 
 const Course = mongoose.model('Course', courseSchema, 'course');
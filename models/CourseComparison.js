@@ -0,0 +1,23 @@
+const mongoose = require('mongoose');
+
+const courseComparisonSchema = new mongoose.Schema({
+  course_id: { type: String, index: true, unique: true },
+  dept: String,
+  title: String,
+  instructors: [{
+    _id: false,
+    rank: Number,
+    instructor_id: String,
+    last_name: String,
+    basis: String,
+    gpa: Number,
+    enrollment: Number,
+    withdraw_rate: Number,
+    sections: Number,
+    crns: [String]
+  }]
+});
+
+const CourseComparison = mongoose.model('CourseComparison', courseComparisonSchema, 'course_comparison');
+
+module.exports = CourseComparison;
@@ -0,0 +1,17 @@
+const mongoose = require('mongoose');
+
+const courseTermTrendSchema = new mongoose.Schema({
+  trend_id: String,
+  course_id: { type: String, index: true },
+  year: String,
+  term: String,
+  term_order: Number,
+  gpa: Number,
+  enrollment: Number,
+  withdraw_rate: Number,
+  sections: Number
+});
+
+const CourseTermTrend = mongoose.model('CourseTermTrend', courseTermTrendSchema, 'course_term_trend');
+
+module.exports = CourseTermTrend;
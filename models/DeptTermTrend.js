@@ -0,0 +1,17 @@
+const mongoose = require('mongoose');
+
+const deptTermTrendSchema = new mongoose.Schema({
+  trend_id: String,
+  dept: { type: String, index: true },
+  year: String,
+  term: String,
+  term_order: Number,
+  gpa: Number,
+  enrollment: Number,
+  withdraw_rate: Number,
+  sections: Number
+});
+
+const DeptTermTrend = mongoose.model('DeptTermTrend', deptTermTrendSchema, 'dept_term_trend');
+
+module.exports = DeptTermTrend;
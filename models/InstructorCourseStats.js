@@ -7,7 +7,14 @@ const instructorCourseStatsSchema = new mongoose.Schema({
   gpa: Number,
   enrollment: Number,
   withdraw: Number,
-  past_classes: Number
+  past_classes: Number,
+  gpa_weighted: Number,
+  gpa_std: Number,
+  gpa_p25: Number,
+  gpa_median: Number,
+  gpa_p75: Number,
+  gpa_ci_low: Number,
+  gpa_ci_high: Number
 });
 
 const InstructorCourseStats = mongoose.model('InstructorCourseStats', instructorCourseStatsSchema, 'instructor_course_stats');
@@ -0,0 +1,17 @@
+const mongoose = require('mongoose');
+
+const instructorTermTrendSchema = new mongoose.Schema({
+  trend_id: String,
+  instructor_id: { type: String, index: true },
+  year: String,
+  term: String,
+  term_order: Number,
+  gpa: Number,
+  enrollment: Number,
+  withdraw_rate: Number,
+  sections: Number
+});
+
+const InstructorTermTrend = mongoose.model('InstructorTermTrend', instructorTermTrendSchema, 'instructor_term_trend');
+
+module.exports = InstructorTermTrend;
@@ -12,7 +12,8 @@ const newInstanceSchema = new mongoose.Schema({
   days: String,
   start_time: String,
   end_time: String,
-  location: String
+  location: String,
+  meetings: String
 });
 
 const NewInstance = mongoose.model('NewInstance', newInstanceSchema, 'new_instance');
@@ -0,0 +1,15 @@
+const mongoose = require('mongoose');
+
+const searchIndexSchema = new mongoose.Schema({
+  prefix: String,
+  results: [{
+    _id: false,
+    kind: String,
+    id: String,
+    label: String
+  }]
+});
+
+const SearchIndex = mongoose.model('SearchIndex', searchIndexSchema, 'search_index');
+
+module.exports = SearchIndex;
@@ -0,0 +1,19 @@
+const express = require('express');
+const router = express.Router();
+const CourseComparison = require('../models/CourseComparison');
+
+// Endpoint to get the ranked current instructors of one course, precomputed by
+// scripts/course_comparison.py
+router.get('/:id', async (req, res) => {
+  try {
+    const comparison = await CourseComparison.findOne({ course_id: req.params.id });
+    if (!comparison) {
+      return res.status(404).json({ message: 'Course is not offered this term' });
+    }
+    res.json(comparison);
+  } catch (err) {
+    res.status(500).json({ message: err.message });
+  }
+});
+
+module.exports = router;
@@ -0,0 +1,26 @@
+const express = require('express');
+const router = express.Router();
+const SearchIndex = require('../models/SearchIndex');
+
+// Same normalization as normalize_name in scripts/instructor_matcher.py
+const normalizeQuery = (query) => query
+  .normalize('NFKD')
+  .replace(/[\u0300-\u036f]/g, '')
+  .toLowerCase()
+  .replace(/[^\w\s-]/g, '')
+  .replace(/-/g, ' ')
+  .trim()
+  .split(/\s+/)
+  .join(' ');
+
+// Endpoint to get the ranked autocomplete results of a prefix
+router.get('/', async (req, res) => {
+  try {
+    const entry = await SearchIndex.findOne({ prefix: normalizeQuery(String(req.query.q || '')) });
+    res.json(entry ? entry.results : []);
+  } catch (err) {
+    res.status(500).json({ message: err.message });
+  }
+});
+
+module.exports = router;
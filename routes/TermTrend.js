@@ -0,0 +1,22 @@
+const express = require('express');
+const router = express.Router();
+const CourseTermTrend = require('../models/CourseTermTrend');
+const InstructorTermTrend = require('../models/InstructorTermTrend');
+const DeptTermTrend = require('../models/DeptTermTrend');
+
+// Per-term rollups precomputed by scripts/trend_rollup.py for one course, instructor or dept,
+// in chronological order whatever order the documents were loaded in
+const trendRoute = (Model, key) => async (req, res) => {
+  try {
+    const trend = await Model.find({ [key]: req.params.id }).sort({ year: 1, term_order: 1 });
+    res.json(trend);
+  } catch (err) {
+    res.status(500).json({ message: err.message });
+  }
+};
+
+router.get('/course/:id', trendRoute(CourseTermTrend, 'course_id'));
+router.get('/instructor/:id', trendRoute(InstructorTermTrend, 'instructor_id'));
+router.get('/dept/:id', trendRoute(DeptTermTrend, 'dept'));
+
+module.exports = router;
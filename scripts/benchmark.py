@@ -0,0 +1,996 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import past_cleaner
+
+
+# Synthetic subject codes, as many as the timetable has
+SUBJECTS = np.array([f"S{i:03d}" for i in range(150)])
+
+# Synthetic last names, including multi-word and hyphenated ones
+BASE_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Wilson', 'Anderson', 'Taylor', 'Thomas', 'Moore', 'Martin', 'Jackson', 'White',
+              'Harris', 'Clark', 'Lewis', 'Walker', 'Hall', 'Young', 'King', 'Wright', 'Lopez',
+              'Hill', 'Green', 'Adams', 'Baker', 'Nelson', 'Carter', 'Mitchell', 'Roberts',
+              'Turner', 'Phillips', 'Campbell', 'Parker', 'Evans', 'Edwards', 'Collins']
+LAST_NAMES = np.array(BASE_NAMES + [f'{a}-{b}' for a, b in zip(BASE_NAMES, BASE_NAMES[1:])] +
+                      [f'Van {name}' for name in BASE_NAMES[:20]] +
+                      [f'De La {name}' for name in BASE_NAMES[20:]])
+
+# Instructors per subject; a subject's instructors are consecutive entries of LAST_NAMES
+INSTRUCTORS_PER_SUBJECT = 40
+
+# Distribution rows and timetable sections of the stage suite at scale 1, about the real sizes
+SUITE_DISTRIBUTION_ROWS = 50_000
+SUITE_SECTIONS = 10_000
+
+
+def subject_instructors(subject_index, instructor_index):
+    """
+    Returns the last names of instructors of synthetic subjects.
+
+    :param subject_index: Array of indexes into SUBJECTS.
+    :param instructor_index: Array of instructor numbers below INSTRUCTORS_PER_SUBJECT.
+    :return: An array of last names, distinct within each subject.
+    """
+    return LAST_NAMES[(subject_index * 7 + instructor_index) % len(LAST_NAMES)]
+
+
+def make_distribution(num_rows, seed=0):
+    """
+    Generates a synthetic grade distribution shaped like raw_data/distribution.csv.
+    The subjects, course numbers and instructor names are drawn from fixed pools, with each
+    subject having its own 40 instructors, so the number of groups stays realistic as the row
+    count grows.
+
+    :param num_rows: The number of section rows to generate.
+    :param seed: Seed for the random number generator, so runs are reproducible.
+    :return: A pandas DataFrame with the columns read by past_cleaner.
+    """
+    rng = np.random.default_rng(seed)
+    subjects = SUBJECTS
+    titles = np.array(['Introduction', 'Intermediate', 'Advanced', 'Seminar'])
+
+    subject_index = rng.integers(0, len(subjects), num_rows)
+    subject = subjects[subject_index]
+    course_no = rng.integers(1000, 1035, num_rows) * 10 + 4
+    return pd.DataFrame({
+        'Academic Year': np.array(['2018-19', '2019-20', '2020-21', '2021-22', '2022-23'])[
+            rng.integers(0, 5, num_rows)],
+        'Term': np.array(['Fall', 'Spring', 'Summer I', 'Summer II', 'Winter'])[
+            rng.integers(0, 5, num_rows)],
+        'Subject': subject,
+        'Course No.': course_no,
+        'Course Title': titles[(course_no + (rng.random(num_rows) < 0.01)) % len(titles)],
+        'Instructor': subject_instructors(
+            subject_index, rng.integers(0, INSTRUCTORS_PER_SUBJECT, num_rows)),
+        'GPA': rng.uniform(2.0, 4.0, num_rows).round(2),
+        'Withdraws': rng.integers(0, 6, num_rows),
+        'Graded Enrollment': rng.integers(5, 300, num_rows),
+        'CRN': rng.integers(10000, 99999, num_rows),
+        'Credits': rng.integers(1, 5, num_rows)
+    })
+
+
+def make_offered_raw(num_sections, seed=0):
+    """
+    Generates a synthetic timetable shaped like raw_data/offered_raw.csv, with sections of the
+    same subjects, course numbers and instructors as make_distribution. About 7% of sections
+    are followed by a '* Additional Times *' row and 10% meet at arranged '(ARR)' times, both
+    with their values shifted as the scraper writes them; 4% have variable credits and some
+    instructors are 'Staff' or not in the historical data.
+
+    :param num_sections: The number of sections to generate.
+    :param seed: Seed for the random number generator, so runs are reproducible.
+    :return: A pandas DataFrame with the columns written by scraper.py.
+    """
+    rng = np.random.default_rng(seed)
+    subject_index = np.sort(rng.integers(0, len(SUBJECTS), num_sections))
+    course_no = rng.integers(1000, 1035, num_sections) * 10 + 4
+    last_names = subject_instructors(
+        subject_index, rng.integers(0, INSTRUCTORS_PER_SUBJECT + 5, num_sections))
+    initials = np.array(['A', 'RJ', 'JM', 'K', 'GW'])[rng.integers(0, 5, num_sections)]
+    modalities = np.array(['Face-to-Face Instruction', '', 'Online: Asynchronous',
+                           'Online with Synchronous Mtgs.', 'Hybrid (F2F & Online Instruc.)'])
+    days = np.array(['M W F', 'T R', 'M W', 'W', 'T', 'M', 'R', 'F'])
+    starts = np.array(['8:00AM', '9:05AM', '10:10AM', '11:15AM', '12:20PM', '1:25PM',
+                       '2:30PM', '3:30PM', '5:00PM', '7:00PM'])
+    ends = np.array(['8:50AM', '9:55AM', '11:00AM', '12:05PM', '1:10PM', '2:15PM',
+                     '3:20PM', '4:45PM', '6:15PM', '8:15PM'])
+
+    rows = []
+    for i in range(num_sections):
+        subject = SUBJECTS[subject_index[i]]
+        time_slot = rng.integers(0, len(starts))
+        arranged = rng.random() < 0.10
+        variable_credits = rng.random() < 0.04
+        rows.append({
+            'crn': str(80000 + i),
+            'course': f'{subject}-{course_no[i]}',
+            'title': 'Independent Study' if variable_credits else f'{subject} Topics {course_no[i]}',
+            'schedule_type': 'L',
+            'modality': modalities[rng.integers(0, len(modalities))],
+            'cr_hrs': '1 TO 19' if variable_credits else str(rng.integers(1, 5)),
+            'capacity': str(rng.integers(10, 300)),
+            'instructor': f'{initials[i]} {last_names[i]}' if rng.random() > 0.05 else 'Staff',
+            'days': '(ARR)' if arranged else days[rng.integers(0, len(days))],
+            'start_time': '----- (ARR) -----' if arranged else starts[time_slot],
+            'end_time': ('ONLINE' if rng.random() < 0.5 else 'TBA') if arranged else ends[time_slot],
+            'location': '00X' if arranged else f'BLDG {rng.integers(100, 400)}',
+            'exam': '' if arranged else '00X'
+        })
+        if not arranged and rng.random() < 0.07:
+            extra_slot = rng.integers(0, len(starts))
+            rows.append({
+                'crn': '', 'course': '', 'title': '', 'schedule_type': '',
+                'modality': '* Additional Times *',
+                'cr_hrs': days[rng.integers(0, len(days))],
+                'capacity': starts[extra_slot],
+                'instructor': ends[extra_slot],
+                'days': f'LAB {rng.integers(100, 400)}',
+                'start_time': '', 'end_time': '', 'location': '', 'exam': ''
+            })
+    return pd.DataFrame(rows)
+
+
+def write_distribution(file_path, num_rows, chunk_rows=500_000, seed=0):
+    """
+    Writes a synthetic grade distribution CSV in pieces, so inputs larger than memory can be
+    generated for the streaming checks.
+
+    :param file_path: The path of the CSV file to write.
+    :param num_rows: The total number of section rows to generate.
+    :param chunk_rows: The number of rows generated and written at a time.
+    :param seed: Seed of the first piece; each following piece uses the next seed.
+    """
+    for i, start in enumerate(range(0, num_rows, chunk_rows)):
+        make_distribution(min(chunk_rows, num_rows - start), seed + i).to_csv(
+            file_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+
+def legacy_instructor_course_stats(df):
+    """
+    Reproduces the per-group lambda aggregation past_cleaner used before the named
+    reductions, so both paths can be timed against the same input.
+
+    :param df: DataFrame returned by past_cleaner.load_distribution.
+    :return: A DataFrame of instructor-course statistics.
+    """
+    return df.groupby(['instructor_id', 'course_id']).agg({
+        'GPA': lambda x: round(x.mean(), 2),
+        'Graded Enrollment': lambda x: round(x.mean(), 2),
+        'Withdraws': lambda x: round(x.mean(), 2),
+        'CRN': 'count'
+    }).reset_index()
+
+
+def legacy_course_data(df):
+    """
+    Reproduces the per-group lambda and determine_title aggregation of the course stage.
+
+    :param df: DataFrame returned by past_cleaner.load_distribution.
+    :return: A DataFrame of course data.
+    """
+    def determine_title(titles):
+        if len(titles.unique()) > 1:
+            return 'Special Study'
+        else:
+            return titles.iloc[0]
+
+    return df.groupby('course_id').agg({
+        'Subject': 'first',
+        'Course Title': determine_title,
+        'Credits': 'first',
+        'GPA': lambda x: round(x.mean(), 2),
+        'Graded Enrollment': lambda x: round(x.mean(), 2),
+        'Withdraws': lambda x: round(x.mean(), 2),
+        'CRN': 'count'
+    }).reset_index()
+
+
+def time_call(func, *args):
+    """
+    Times a single call of a function.
+
+    :param func: The function to call.
+    :param args: Positional arguments passed to the function.
+    :return: The elapsed wall time in seconds.
+    """
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def bench_aggregations(num_rows=1_000_000):
+    """
+    Compares the lambda-based and vectorized past_cleaner aggregations on a synthetic
+    distribution and prints the timings and speedup of each stage. The vectorized stages also
+    compute the section_stats columns, and the check fails if they are slower than the lambdas.
+
+    :param num_rows: The number of synthetic section rows to aggregate.
+    """
+    df = make_distribution(num_rows)
+    df['course_id'] = df['Subject'] + ' ' + df['Course No.'].astype(str)
+    df['instructor_id'] = df['Instructor'] + ' (' + df['Subject'] + ')'
+    valid_depts = set(df['Subject'])
+    valid_course_ids = set(df['course_id'])
+    valid_instructor_ids = set(df['instructor_id'])
+
+    stages = [
+        ('course', legacy_course_data, (df,),
+         past_cleaner.build_course_data, (df, valid_depts)),
+        ('instructor_course_stats', legacy_instructor_course_stats, (df,),
+         past_cleaner.build_instructor_course_stats_data,
+         (df, valid_course_ids, valid_instructor_ids)),
+    ]
+    print(f"Aggregating {num_rows} synthetic rows")
+    for name, legacy_func, legacy_args, func, args in stages:
+        legacy_time = time_call(legacy_func, *legacy_args)
+        vectorized_time = time_call(func, *args)
+        print(f"{name}: lambda {legacy_time:.2f}s, vectorized {vectorized_time:.2f}s "
+              f"({legacy_time / vectorized_time:.1f}x)")
+        if vectorized_time > legacy_time:
+            raise AssertionError(f"Vectorized {name} with section statistics is slower than lambdas")
+
+
+def legacy_load_distribution(distribution_file):
+    """
+    The distribution loader past_cleaner used before DISTRIBUTION_DTYPES: inferred dtypes,
+    with object text columns and one concatenated key string per row for every key.
+
+    :param distribution_file: File path for the CSV containing distribution data.
+    :return: A pandas DataFrame with the distribution data and string key columns.
+    """
+    df = pd.read_csv(distribution_file)
+    df['course_id'] = df['Subject'] + ' ' + df['Course No.'].astype(str)
+    df['instructor_id'] = df['Instructor'] + ' (' + df['Subject'] + ')'
+    df['instance_id'] = df['Academic Year'] + df['Term'] + df['CRN'].astype(str)
+    return df
+
+
+def bench_distribution_memory(num_rows=2_000_000, offered_dept_file='raw_data/offered_dept.csv'):
+    """
+    Loads a synthetic distribution with the old object-column loader and with
+    past_cleaner.load_distribution, and prints the memory use of each DataFrame and the time
+    of loading and of each groupby stage. tests/test_past_cleaner.py checks that both write
+    the same cleaned tables.
+
+    :param num_rows: The number of synthetic section rows.
+    :param offered_dept_file: File path for the CSV containing offered department data.
+    """
+    temp_folder = tempfile.mkdtemp()
+    try:
+        distribution_file = os.path.join(temp_folder, 'distribution.csv')
+        write_distribution(distribution_file, num_rows)
+
+        for name, loader in (('object', legacy_load_distribution),
+                             ('categorical', past_cleaner.load_distribution)):
+            start = time.perf_counter()
+            df = loader(distribution_file)
+            load_time = time.perf_counter() - start
+            memory_mb = df.memory_usage(deep=True).sum() / 2 ** 20
+
+            output_folder = os.path.join(temp_folder, name)
+            os.makedirs(output_folder)
+            stage_time = time_call(past_cleaner.run_stages, df, offered_dept_file, output_folder)
+            state_time = time_call(past_cleaner.build_aggregate_state, df)
+            print(f"{name}: {memory_mb:.0f} MB in memory, load {load_time:.2f}s, "
+                  f"stages {stage_time:.2f}s, aggregate state {state_time:.2f}s")
+            del df
+    finally:
+        shutil.rmtree(temp_folder)
+
+
+def bench_streaming_memory(num_rows=3_000_000, chunksize=100_000):
+    """
+    Reports the peak traced memory of past_cleaner.run_streaming_pipeline on a synthetic
+    multi-million-row distribution. tests/test_past_cleaner.py checks on a smaller history that
+    the peak does not grow with the number of terms.
+
+    :param num_rows: The number of synthetic section rows to process.
+    :param chunksize: The number of rows per chunk.
+    """
+    temp_folder = tempfile.mkdtemp()
+    try:
+        distribution_file = os.path.join(temp_folder, 'distribution.csv')
+        offered_dept_file = os.path.join(temp_folder, 'offered_dept.csv')
+        write_distribution(distribution_file, num_rows)
+        pd.DataFrame({'dept_id': ['S000'], 'title': ['Synthetic']}).to_csv(
+            offered_dept_file, index=False)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        past_cleaner.run_streaming_pipeline(distribution_file, offered_dept_file, temp_folder,
+                                            chunksize=chunksize)
+        elapsed = time.perf_counter() - start
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        file_mb = os.path.getsize(distribution_file) / 2 ** 20
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(temp_folder)
+
+    print(f"Streamed {num_rows} rows ({file_mb:.0f}MB CSV) in {elapsed:.1f}s, "
+          f"peak {peak_mb:.0f}MB traced")
+
+
+def bench_cleaned_formats(cleaned_folder='cleaned_data/',
+                          tables=('past_instance', 'instructor_course_stats', 'new_instance'),
+                          repeat=20):
+    """
+    Writes Parquet copies of cleaned tables to a temporary folder and times loading each table
+    from CSV and from the memory-mapped Parquet file.
+
+    :param cleaned_folder: Folder containing the cleaned CSV files.
+    :param tables: The tables to compare.
+    :param repeat: The number of times each table is loaded per format.
+    """
+    import cleaned_tables
+
+    temp_folder = tempfile.mkdtemp()
+    try:
+        for table in tables:
+            shutil.copy(cleaned_tables.table_path(cleaned_folder, table, 'csv'), temp_folder)
+            csv_df = cleaned_tables.read_csv_table(temp_folder, table)
+            cleaned_tables.write_parquet(csv_df, temp_folder, table)
+
+            csv_file = cleaned_tables.table_path(temp_folder, table, 'csv')
+            csv_time = time_call(lambda: [pd.read_csv(csv_file) for _ in range(repeat)])
+            parquet_time = time_call(lambda: [cleaned_tables.read_table(temp_folder, table)
+                                              for _ in range(repeat)])
+            print(f"{table} ({len(csv_df)} rows): CSV {csv_time / repeat * 1000:.1f}ms, "
+                  f"Parquet {parquet_time / repeat * 1000:.1f}ms ({csv_time / parquet_time:.1f}x)")
+    finally:
+        shutil.rmtree(temp_folder)
+
+
+def bench_parallel_cleaning(num_rows=1_000_000, workers=4, raw_file='raw_data/offered_raw.csv',
+                            instructors_file='cleaned_data/instructor.csv'):
+    """
+    Times past_cleaner.run_pipeline on a synthetic distribution and new_cleaner.process_csv on
+    the raw timetable both serially and with a process pool. tests/test_past_cleaner.py and
+    tests/test_new_cleaner.py check that both modes write byte-identical files.
+
+    :param num_rows: The number of synthetic section rows for past_cleaner.
+    :param workers: The number of worker processes of the parallel runs.
+    :param raw_file: The file path of the raw CSV file written by scraper.py.
+    :param instructors_file: The file path of the instructor CSV file.
+    """
+    import new_cleaner
+
+    temp_folder = tempfile.mkdtemp()
+    try:
+        distribution_file = os.path.join(temp_folder, 'distribution.csv')
+        offered_dept_file = os.path.join(temp_folder, 'offered_dept.csv')
+        make_distribution(num_rows).to_csv(distribution_file, index=False)
+        pd.DataFrame({'dept_id': ['S000', 'S999'], 'title': ['Synthetic', 'Empty']}).to_csv(
+            offered_dept_file, index=False)
+
+        for mode, mode_workers in (('serial', 1), ('parallel', workers)):
+            past_folder = os.path.join(temp_folder, f'past_{mode}')
+            new_folder = os.path.join(temp_folder, f'new_{mode}')
+            os.makedirs(past_folder)
+            os.makedirs(new_folder)
+            shutil.copy(instructors_file, new_folder)
+
+            past_time = time_call(past_cleaner.run_pipeline, distribution_file,
+                                  offered_dept_file, past_folder, None, mode_workers)
+            new_time = time_call(new_cleaner.process_csv, raw_file,
+                                 os.path.join(new_folder, 'new_instance.csv'),
+                                 os.path.join(new_folder, 'instructor.csv'), mode_workers)
+            print(f"{mode} ({mode_workers} workers): past_cleaner {past_time:.2f}s, "
+                  f"new_cleaner {new_time:.2f}s")
+    finally:
+        shutil.rmtree(temp_folder)
+
+
+def load_timetable_pages(raw_file, pages_folder=None):
+    """
+    Collects timetable result pages for parser checks: one page per subject rendered from
+    a scraped offered_raw.csv with timetable_fixture, plus any pages saved as .html files.
+
+    :param raw_file: The file path of the raw CSV file written by scraper.py.
+    :param pages_folder: Optional folder of saved result pages.
+    :return: A dictionary mapping page name to its HTML.
+    """
+    import timetable_fixture
+
+    columns, subjects = timetable_fixture.load_subject_rows(raw_file)
+    pages = {subject: timetable_fixture.render_form('202409', subjects) +
+             timetable_fixture.render_table(columns, rows)
+             for subject, rows in subjects.items()}
+    if pages_folder:
+        for path in sorted(glob.glob(os.path.join(pages_folder, '*.html'))):
+            with open(path, 'r', encoding='utf-8') as file:
+                pages[os.path.basename(path)] = file.read()
+    return pages
+
+
+def bench_timetable_parsers(raw_file='raw_data/offered_raw.csv', pages_folder=None,
+                            subjects=('MATH', 'ENGL', 'CS'), repeat=20):
+    """
+    Times the BeautifulSoup and lxml parser engines on the pages of the largest departments.
+
+    :param raw_file: The file path of the raw CSV file written by scraper.py.
+    :param pages_folder: Optional folder of saved result pages.
+    :param subjects: The subject pages to time.
+    :param repeat: The number of times each page is parsed per engine.
+    """
+    import scraper
+
+    pages = load_timetable_pages(raw_file, pages_folder)
+    bs4_scraper = scraper.TimetableScraper(None, parser='bs4')
+    lxml_scraper = scraper.TimetableScraper(None, parser='lxml')
+
+    for subject in subjects:
+        html = pages[subject]
+        bs4_time = time_call(lambda: [bs4_scraper._parse_html(html) for _ in range(repeat)])
+        lxml_time = time_call(lambda: [lxml_scraper._parse_html(html) for _ in range(repeat)])
+        print(f"{subject}: bs4 {bs4_time / repeat * 1000:.1f}ms, lxml {lxml_time / repeat * 1000:.1f}ms "
+              f"per page ({bs4_time / lxml_time:.1f}x)")
+
+
+def iter_instructor_rows(raw_file):
+    """
+    Yields the (instructor name, department) pairs that new_cleaner.process_csv resolves,
+    skipping the same zero-credit and '* Additional Times *' rows it skips.
+
+    :param raw_file: The file path of the raw CSV file written by scraper.py.
+    :return: A generator of (instructor name, department) tuples.
+    """
+    import new_cleaner
+
+    with open(raw_file, 'r') as file:
+        for row in csv.DictReader(file):
+            try:
+                if int(row['cr_hrs']) == 0:
+                    continue
+            except ValueError:
+                continue
+            if row['modality'] == '* Additional Times *':
+                continue
+            yield row['instructor'], new_cleaner.get_department(row['course'])
+
+
+def legacy_read_instructors(file_path):
+    """
+    The exact instructor lookup new_cleaner used before InstructorMatcher, kept as the
+    reference of bench_instructor_matching.
+    Reads instructor data from a CSV file and creates a dictionary for quick lookups.
+    This dictionary is keyed by a tuple of department and a variation of the instructor's last name,
+    allowing for flexible matching of instructor names in different formats.
+
+    :param file_path: The file path of the CSV file containing instructor data.
+    :return: A dictionary where keys are tuples of (department, instructor_name_variation)
+             and values are the corresponding instructor IDs.
+    """
+    instructors = {}
+    with open(file_path, 'r') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            # Create different name variations for matching (case-insensitive)
+            last_name = row['last_name'].lower()
+            names = [last_name] + last_name.split('-') + last_name.split(' ')
+            for name in names:
+                key = (row['dept'], name)
+                instructors[key] = row['instructor_id']
+    return instructors
+
+
+def legacy_add_new_instructor(instructor_name, dept, instructors_lookup, instructors_file):
+    """
+    The new-instructor path new_cleaner used before InstructorMatcher, appending one row per call.
+    Adds a new instructor to the instructor CSV file and updates the lookup dictionary.
+    This method is used when an instructor is encountered in the data that is not already
+    in the instructor lookup.
+
+    :param instructor_name: The name of the instructor to be added.
+    :param dept: The department of the instructor.
+    :param instructors_lookup: The dictionary used for instructor lookups.
+    :param instructors_file: The file path of the instructor CSV file where new instructor data will be appended.
+    :return: The newly created instructor ID.
+    """
+    # Retain original capitalization for last_name
+    last_name_original = ' '.join(instructor_name.split(
+    )[1:]) if ' ' in instructor_name else instructor_name
+    last_name_key = last_name_original.lower()  # Use lowercased version for key
+    instructor_id = f"{last_name_original} ({dept})"
+
+    # Check if instructor already exists in the lookup
+    if (dept, last_name_key) in instructors_lookup:
+        return instructors_lookup[(dept, last_name_key)]
+
+    # Add instructor to the lookup
+    instructors_lookup[(dept, last_name_key)] = instructor_id
+    # Write the new instructor to the file
+    with open(instructors_file, 'a', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=[
+                                'instructor_id', 'last_name', 'dept', 'gpa', 'enrollment', 'withdraw', 'past_classes', 'new_classes'])
+        writer.writerow({
+            'instructor_id': instructor_id, 'last_name': last_name_original, 'dept': dept,
+            'gpa': 0.0, 'enrollment': 0.0, 'withdraw': 0.0, 'past_classes': 0, 'new_classes': 0
+        })
+    return instructor_id
+
+
+def legacy_standardize_instructor(instructor_name, dept, instructors_lookup):
+    """
+    The exact name match new_cleaner used before InstructorMatcher.
+    Standardizes the instructor name by removing initials and converting it to lowercase.
+    This method also checks the instructors_lookup to find a matching instructor ID.
+    If no match is found, it returns None.
+
+    :param instructor_name: The name of the instructor to standardize.
+    :param dept: The department of the instructor.
+    :param instructors_lookup: The lookup dictionary containing instructor IDs.
+    :return: The standardized instructor ID if a match is found, otherwise None.
+    """
+    last_name = ' '.join(instructor_name.split()[1:]).lower(
+    ) if ' ' in instructor_name else instructor_name.lower()
+    # Check various name iterations
+    for name in [last_name, last_name.replace(' ', '-'), last_name.replace('-', ' ')]:
+        key = (dept, name)
+        if key in instructors_lookup:
+            return instructors_lookup[key]
+    return None  # No match found
+
+
+def bench_instructor_matching(raw_file='raw_data/offered_raw.csv',
+                              instructors_file='cleaned_data/instructor.csv'):
+    """
+    Runs the exact legacy matcher and the InstructorMatcher over every offered
+    section, starting from the historical instructors only (past_classes > 0), and prints
+    their per-row latency and a precision/recall report that treats the exact matcher as
+    the reference, plus the sections only the new matcher resolves.
+
+    :param raw_file: The file path of the raw CSV file written by scraper.py.
+    :param instructors_file: The file path of the instructor CSV file.
+    """
+    from instructor_matcher import InstructorMatcher
+
+    rows = list(iter_instructor_rows(raw_file))
+    temp_folder = tempfile.mkdtemp()
+    try:
+        historical_file = os.path.join(temp_folder, 'instructor.csv')
+        historical = pd.read_csv(instructors_file)
+        historical = historical[historical['past_classes'] > 0]
+        historical.to_csv(historical_file, index=False)
+        historical_ids = set(historical['instructor_id'])
+
+        lookup = legacy_read_instructors(historical_file)
+        start = time.perf_counter()
+        exact_ids = []
+        for name, dept in rows:
+            instructor_id = legacy_standardize_instructor(name, dept, lookup)
+            if instructor_id is None:
+                instructor_id = legacy_add_new_instructor(name, dept, lookup, historical_file)
+            exact_ids.append(instructor_id)
+        exact_time = time.perf_counter() - start
+
+        matcher = InstructorMatcher.from_csv(historical_file)
+        start = time.perf_counter()
+        matcher_ids = [matcher.resolve(name, dept) for name, dept in rows]
+        matcher_time = time.perf_counter() - start
+    finally:
+        shutil.rmtree(temp_folder)
+
+    exact_matched = [i for i, instructor_id in enumerate(exact_ids)
+                     if instructor_id in historical_ids]
+    matcher_matched = [i for i, instructor_id in enumerate(matcher_ids)
+                       if instructor_id in historical_ids]
+    both = set(exact_matched) & set(matcher_matched)
+    agree = sum(exact_ids[i] == matcher_ids[i] for i in both)
+    only_matcher = sorted(set(matcher_matched) - set(exact_matched))
+
+    print(f"{len(rows)} sections: exact {exact_time / len(rows) * 1e6:.1f}us/row, "
+          f"matcher {matcher_time / len(rows) * 1e6:.1f}us/row")
+    print(f"Exact matcher: {len(exact_matched)} matched, "
+          f"{len(set(exact_ids) - historical_ids)} new instructors")
+    print(f"InstructorMatcher: {len(matcher_matched)} matched, "
+          f"{len(set(matcher_ids) - historical_ids)} new instructors")
+    print(f"Precision vs exact: {agree / max(len(both), 1):.4f}, "
+          f"recall vs exact: {agree / max(len(exact_matched), 1):.4f}")
+    for i in only_matcher:
+        print(f"  only matcher: {rows[i][0]} ({rows[i][1]}) -> {matcher_ids[i]}")
+
+
+def legacy_clean_rows(positioned_rows, matcher):
+    """
+    The dictionary-based row path new_cleaner.clean_rows used before Section: a fresh
+    12-key dictionary per section, with additional times and meetings added by key.
+
+    :param positioned_rows: An iterable of (position, row) tuples from iter_kept_rows.
+    :param matcher: The InstructorMatcher used to resolve instructor names.
+    :return: A generator of (position, row dictionary) tuples.
+    """
+    import new_cleaner
+    from meeting_times import encode_meetings, parse_meetings
+
+    def add_meetings(row):
+        row['meetings'] = encode_meetings(parse_meetings(
+            row['days'], row['start_time'], row['end_time']))
+        return row
+
+    last_row = None
+    last_position = None
+    for position, row in positioned_rows:
+        if row['modality'] == '* Additional Times *':
+            if last_row:
+                for key, column in new_cleaner.ADDITIONAL_TIMES_COLUMNS.items():
+                    if last_row.get(key):
+                        last_row[key] += f" and {row[column]}"
+                    else:
+                        last_row[key] = row[column]
+            continue
+
+        department = new_cleaner.get_department(row['course'])
+        if row['days'] == '(ARR)':
+            row['start_time'], row['end_time'] = '(ARR)', '(ARR)'
+        new_row = {
+            'crn': row['crn'],
+            'dept': department,
+            'course_id': row['course'].replace('-', ' '),
+            'instructor_id': matcher.resolve(row['instructor'], department),
+            'title': row['title'],
+            'modality': new_cleaner.standardize_modality(row['modality']),
+            'credits': row['cr_hrs'],
+            'capacity': row['capacity'],
+            'days': row['days'],
+            'start_time': row['start_time'],
+            'end_time': row['end_time'],
+            'location': row['location']
+        }
+        if last_row:
+            yield last_position, add_meetings(last_row)
+        last_row = new_row
+        last_position = position
+
+    if last_row:
+        yield last_position, add_meetings(last_row)
+
+
+def legacy_write_rows(rows, outfile):
+    """
+    Writes dictionary rows with csv.DictWriter, as new_cleaner.process_csv did before Section.
+
+    :param rows: A list of (position, row dictionary) tuples.
+    :param outfile: The open text file to write to.
+    """
+    import new_cleaner
+
+    writer = csv.DictWriter(outfile, fieldnames=new_cleaner.FIELDNAMES)
+    writer.writeheader()
+    for _, row in rows:
+        writer.writerow(row)
+
+
+def write_sections(rows, outfile):
+    """
+    Writes Section rows with csv.writer, as new_cleaner.process_csv does.
+
+    :param rows: A list of (position, Section) tuples.
+    :param outfile: The open text file to write to.
+    """
+    import new_cleaner
+
+    writer = csv.writer(outfile)
+    writer.writerow(new_cleaner.FIELDNAMES)
+    for _, row in rows:
+        writer.writerow(new_cleaner.section_values(row))
+
+
+def bench_row_representation(raw_file='raw_data/offered_raw.csv',
+                             instructors_file='cleaned_data/instructor.csv', terms=10):
+    """
+    Compares the dictionary rows and DictWriter of the old new_cleaner path with Section
+    rows and the tuple writer on the raw timetable repeated for several terms. The cleaned
+    rows are kept in a list, as the parallel mode keeps them, so the traced peak shows how
+    much memory they retain. tests/test_new_cleaner.py checks that both write the same bytes.
+
+    :param raw_file: The file path of the raw CSV file written by scraper.py.
+    :param instructors_file: The file path of the instructor CSV file.
+    :param terms: The number of copies of the raw timetable processed together.
+    """
+    import io
+    import new_cleaner
+    from instructor_matcher import InstructorMatcher
+
+    with open(raw_file, 'r') as file:
+        header = file.readline()
+        body = file.read()
+    raw_text = header + body * terms
+
+    paths = [('dict', legacy_clean_rows, legacy_write_rows),
+             ('Section', lambda rows, matcher: new_cleaner.clean_rows(rows, matcher, []),
+              write_sections)]
+    for name, clean, write in paths:
+        positioned_rows = list(new_cleaner.iter_kept_rows(csv.DictReader(io.StringIO(raw_text))))
+        matcher = InstructorMatcher.from_csv(instructors_file)
+        cleaned, clean_time, peak_mb = measure(
+            lambda: list(clean(positioned_rows, matcher)))
+        output = io.StringIO(newline='')
+        write_time = time_call(write, cleaned, output)
+        print(f"{name}: {len(cleaned)} rows, clean {len(cleaned) / clean_time:,.0f} rows/s, "
+              f"write {len(cleaned) / write_time:,.0f} rows/s, peak {peak_mb:.1f} MB")
+        del cleaned, positioned_rows
+
+
+def linear_search(search_index, query):
+    """
+    Finds autocomplete results by scanning every indexed document, ranked the same way as
+    SearchIndex, as the baseline for bench_search_index.
+
+    :param search_index: A SearchIndex with documents added.
+    :param query: The text typed by the user.
+    :return: A list of result dictionaries.
+    """
+    from instructor_matcher import normalize_name
+
+    query = normalize_name(query)
+    matches = []
+    for document in search_index.documents:
+        tiers = [min(i, 1) for i, term in enumerate(document[4]) if term.startswith(query)]
+        if tiers:
+            matches.append(search_index.rank(document, min(tiers)) + (document,))
+    return [search_index.result(match[-1])
+            for match in sorted(matches)[:search_index.max_results]]
+
+
+def bench_search_index(cleaned_folder='cleaned_data/',
+                       queries=('c', 'cs', 'cs 31', 'cs3114', '3114', 'data str', 'intro',
+                                'smi', 'jackson', 'math 1'), repeat=100):
+    """
+    Times autocomplete lookups in the prefix index and with a linear scan over the course and
+    instructor tables.
+
+    :param cleaned_folder: Folder containing the cleaned tables.
+    :param queries: The queries to time.
+    :param repeat: The number of times each query is run per method.
+    """
+    import cleaned_tables
+    from search_index import SearchIndex
+
+    start = time.perf_counter()
+    search_index = SearchIndex.from_tables(cleaned_tables.read_table(cleaned_folder, 'course'),
+                                           cleaned_tables.read_table(cleaned_folder, 'instructor'))
+    build_time = time.perf_counter() - start
+    print(f"Built {len(search_index.prefixes)} prefixes over {len(search_index.documents)} "
+          f"documents in {build_time:.2f}s")
+
+    for query in queries:
+        index_time = time_call(lambda: [search_index.lookup(query) for _ in range(repeat)])
+        scan_time = time_call(lambda: [linear_search(search_index, query) for _ in range(repeat)])
+        print(f"{query!r}: index {index_time / repeat * 1e6:.1f}us, "
+              f"scan {scan_time / repeat * 1e6:.1f}us ({scan_time / index_time:.0f}x)")
+
+
+def bench_schedule_conflicts(new_instance_file='cleaned_data/new_instance.csv', sample=200,
+                             schedules=1000, schedule_size=6, seed=0):
+    """
+    Builds a ScheduleChecker over a full term and times conflict listing with the interval
+    index and with a pairwise scan, and validation of random schedules.
+
+    :param new_instance_file: The file path of the new_instance CSV file.
+    :param sample: The number of sections timed with the pairwise scan.
+    :param schedules: The number of random schedules validated.
+    :param schedule_size: The number of sections per random schedule.
+    :param seed: Seed for the random number generator, so runs are reproducible.
+    """
+    from meeting_times import ScheduleChecker
+
+    start = time.perf_counter()
+    checker = ScheduleChecker.from_csv(new_instance_file)
+    build_time = time.perf_counter() - start
+    crns = list(checker.intervals)
+    rng = np.random.default_rng(seed)
+    sample_crns = rng.choice(crns, min(sample, len(crns)), replace=False).tolist()
+
+    scan_time = time_call(lambda: [{other_crn for other_crn in crns
+                                    if other_crn != crn and checker.conflict(crn, other_crn)}
+                                   for crn in sample_crns]) / len(sample_crns)
+    index_time = time_call(lambda: [checker.conflicting_sections(crn)
+                                    for crn in crns]) / len(crns)
+
+    random_schedules = [rng.choice(crns, schedule_size, replace=False).tolist()
+                        for _ in range(schedules)]
+    validate_time = time_call(lambda: [checker.validate_schedule(schedule)
+                                       for schedule in random_schedules])
+
+    print(f"{len(crns)} sections indexed in {build_time * 1000:.0f}ms")
+    print(f"Conflicts per section: index {index_time * 1e6:.0f}us, "
+          f"pairwise scan {scan_time * 1e6:.0f}us ({scan_time / index_time:.1f}x)")
+    print(f"Validated {schedules} schedules of {schedule_size} sections in "
+          f"{validate_time * 1000:.1f}ms")
+
+
+def measure(func, *args):
+    """
+    Calls a function under tracemalloc and measures its wall time and peak Python memory.
+
+    :param func: The function to call.
+    :param args: Positional arguments passed to the function.
+    :return: A tuple of (return value, seconds, peak megabytes).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+
+def write_suite_inputs(folder, scale, seed=0):
+    """
+    Writes the synthetic raw files of one scale of the stage suite.
+
+    :param folder: The folder the files are written to.
+    :param scale: The multiple of the base sizes (SUITE_DISTRIBUTION_ROWS, SUITE_SECTIONS).
+    :param seed: Seed for the generators.
+    :return: A dictionary of file paths by name.
+    """
+    files = {name: os.path.join(folder, f'{name}.csv')
+             for name in ('distribution', 'offered_dept', 'offered_raw')}
+    write_distribution(files['distribution'], SUITE_DISTRIBUTION_ROWS * scale, seed=seed)
+    pd.DataFrame({'dept_id': SUBJECTS, 'title': [f'Subject {subject}' for subject in SUBJECTS]}
+                 ).to_csv(files['offered_dept'], index=False)
+    make_offered_raw(SUITE_SECTIONS * scale, seed=seed).to_csv(files['offered_raw'], index=False)
+    return files
+
+
+def run_stage_suite(scales=(1, 10, 100), output_file='benchmark_results.json', seed=0):
+    """
+    Times every pipeline stage on seeded synthetic data at several scales and records the
+    peak memory of each. At scale 1 the data is about the size of the real files: 50,000
+    distribution rows and 10,000 timetable sections. The past_cleaner stages are timed one
+    function at a time on the loaded distribution, followed by new_cleaner.process_csv,
+    increment.process_new_instance and import.insert_into_mongo against mongomock, so the
+    suite needs no MongoDB server.
+
+    :param scales: The multiples of the base sizes to run.
+    :param output_file: The JSON file the results are written to, or None to only print them.
+    :param seed: Seed for the generators, so runs compare like with like.
+    :return: A list of result dictionaries with 'scale', 'stage', 'rows', 'seconds' and 'peak_mb'.
+    """
+    import importlib
+    import mongomock
+    import increment
+    import new_cleaner
+    mongo_import = importlib.import_module('import')
+
+    results = []
+
+    def record(scale, stage, rows, func, *args):
+        result, seconds, peak_mb = measure(func, *args)
+        results.append({'scale': scale, 'stage': stage, 'rows': rows,
+                        'seconds': round(seconds, 4), 'peak_mb': round(peak_mb, 1)})
+        print(f"{scale}x {stage}: {seconds:.2f}s, peak {peak_mb:.0f} MB")
+        return result
+
+    for scale in scales:
+        temp_folder = tempfile.mkdtemp()
+        try:
+            files = write_suite_inputs(temp_folder, scale, seed)
+            offered_dept_df = pd.read_csv(files['offered_dept'])
+            distribution_rows = SUITE_DISTRIBUTION_ROWS * scale
+            raw_rows = len(pd.read_csv(files['offered_raw']))
+
+            df = record(scale, 'past_cleaner.load_distribution', distribution_rows,
+                        past_cleaner.load_distribution, files['distribution'])
+            dept_data = record(scale, 'past_cleaner.build_dept_data', distribution_rows,
+                               past_cleaner.build_dept_data, df, offered_dept_df)
+            valid_depts = set(dept_data['dept_id'])
+            instructor_data = record(scale, 'past_cleaner.build_instructor_data',
+                                     distribution_rows, past_cleaner.build_instructor_data,
+                                     df, valid_depts)
+            course_data = record(scale, 'past_cleaner.build_course_data', distribution_rows,
+                                 past_cleaner.build_course_data, df, valid_depts)
+            valid_course_ids = set(course_data['course_id'])
+            valid_instructor_ids = set(instructor_data['instructor_id'])
+            past_instance_data = record(scale, 'past_cleaner.build_past_instance_data',
+                                        distribution_rows, past_cleaner.build_past_instance_data,
+                                        df, valid_course_ids, valid_instructor_ids)
+            record(scale, 'past_cleaner.build_instructor_course_stats_data', distribution_rows,
+                   past_cleaner.build_instructor_course_stats_data,
+                   df, valid_course_ids, valid_instructor_ids)
+            del df
+
+            tables = {'dept': dept_data, 'course': course_data, 'instructor': instructor_data}
+            for table, data in tables.items():
+                data.to_csv(os.path.join(temp_folder, f'{table}.csv'), index=False)
+            cleaned = {table: os.path.join(temp_folder, f'{table}.csv')
+                       for table in ('dept', 'course', 'instructor', 'new_instance')}
+
+            record(scale, 'new_cleaner.process_csv', raw_rows, new_cleaner.process_csv,
+                   files['offered_raw'], cleaned['new_instance'], cleaned['instructor'])
+            new_instance_df = mongo_import.read_csv_file(cleaned['new_instance'])
+            section_rows = len(new_instance_df)
+            record(scale, 'increment.process_new_instance', section_rows,
+                   increment.process_new_instance, cleaned['new_instance'], cleaned['dept'],
+                   cleaned['course'], cleaned['instructor'])
+
+            db = mongomock.MongoClient()['benchmark']
+            record(scale, 'import.insert_into_mongo(past_instance)', len(past_instance_data),
+                   mongo_import.insert_into_mongo, past_instance_data, db, 'past_instance')
+            record(scale, 'import.insert_into_mongo(new_instance)', section_rows,
+                   mongo_import.insert_into_mongo, new_instance_df, db, 'new_instance')
+        finally:
+            shutil.rmtree(temp_folder)
+
+    if output_file:
+        with open(output_file, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Wrote {len(results)} results to {output_file}")
+    return results
+
+
+def compare_results(results, baseline_file, tolerance=1.5):
+    """
+    Compares stage suite results with a saved baseline run and lists the stages that got
+    slower or use more memory than the tolerance allows.
+
+    :param results: The results returned by run_stage_suite.
+    :param baseline_file: A JSON file written by an earlier run_stage_suite.
+    :param tolerance: The allowed ratio of new to baseline seconds and peak memory.
+    :return: A list of messages describing each regression; empty if there is none.
+    """
+    with open(baseline_file, 'r') as file:
+        baseline = {(entry['scale'], entry['stage']): entry for entry in json.load(file)}
+
+    regressions = []
+    for entry in results:
+        previous = baseline.get((entry['scale'], entry['stage']))
+        if previous is None:
+            continue
+        for metric in ('seconds', 'peak_mb'):
+            if previous[metric] and entry[metric] > previous[metric] * tolerance:
+                regressions.append(f"{entry['scale']}x {entry['stage']}: {metric} "
+                                   f"{previous[metric]} -> {entry[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the data pipeline.')
+    parser.add_argument('--suite', action='store_true',
+                        help='time every stage on synthetic data instead of running the checks')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100],
+                        help='multiples of the real data size run by --suite')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='JSON file the --suite results are written to')
+    parser.add_argument('--baseline', help='JSON results of an earlier --suite run to compare with')
+    args = parser.parse_args()
+
+    if args.suite:
+        results = run_stage_suite(args.scales, args.output)
+        if args.baseline:
+            regressions = compare_results(results, args.baseline)
+            for regression in regressions:
+                print(f"Regression: {regression}")
+            if regressions:
+                sys.exit(1)
+        return
+
+    bench_aggregations()
+    bench_distribution_memory()
+    bench_streaming_memory()
+    bench_cleaned_formats()
+    bench_parallel_cleaning()
+    bench_timetable_parsers()
+    bench_instructor_matching()
+    bench_row_representation()
+    bench_search_index()
+    bench_schedule_conflicts()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from section_stats import STAT_COLUMNS
+
+# Columns missing from files written before the column was added
+OPTIONAL_COLUMNS = set(STAT_COLUMNS) | {'meetings'}
+
+# Schema fields of the section_stats columns stored after a table's existing columns
+STAT_FIELDS = [(name, pa.float64()) for name in STAT_COLUMNS]
+
+
+def trend_schema(key):
+    """
+    Returns the schema of a per-term rollup written by trend_rollup.py.
+
+    :param key: The column the rollup is grouped by, e.g. 'course_id'.
+    :return: A pyarrow schema.
+    """
+    return pa.schema([
+        ('trend_id', pa.string()),
+        (key, pa.string()),
+        ('year', pa.string()),
+        ('term', pa.string()),
+        ('term_order', pa.int64()),
+        ('gpa', pa.float64()),
+        ('enrollment', pa.int64()),
+        ('withdraw_rate', pa.float64()),
+        ('sections', pa.int64())
+    ])
+
+
+# Explicit column types of each cleaned_data table, matching the Mongoose schemas in models/
+TABLE_SCHEMAS = {
+    'dept': pa.schema([
+        ('dept_id', pa.string()),
+        ('gpa', pa.float64()),
+        ('past_classes', pa.int64()),
+        ('unique_classes', pa.int64()),
+        ('new_classes', pa.int64()),
+        ('title', pa.string())
+    ]),
+    'instructor': pa.schema([
+        ('instructor_id', pa.string()),
+        ('last_name', pa.string()),
+        ('dept', pa.string()),
+        ('gpa', pa.float64()),
+        ('enrollment', pa.float64()),
+        ('withdraw', pa.float64()),
+        ('past_classes', pa.int64()),
+        ('new_classes', pa.int64())
+    ]),
+    'course': pa.schema([
+        ('course_id', pa.string()),
+        ('dept', pa.string()),
+        ('title', pa.string()),
+        ('credits', pa.int64()),
+        ('gpa', pa.float64()),
+        ('enrollment', pa.float64()),
+        ('withdraw', pa.float64()),
+        ('past_classes', pa.int64()),
+        ('new_classes', pa.int64())
+    ] + STAT_FIELDS),
+    'past_instance': pa.schema([
+        ('instance_id', pa.string()),
+        ('course_id', pa.string()),
+        ('instructor_id', pa.string()),
+        ('year', pa.string()),
+        ('term', pa.string()),
+        ('crn', pa.string()),
+        ('gpa', pa.float64()),
+        ('withdraw', pa.int64()),
+        ('enrollment', pa.int64())
+    ]),
+    'instructor_course_stats': pa.schema([
+        ('stat_id', pa.string()),
+        ('course_id', pa.string()),
+        ('instructor_id', pa.string()),
+        ('gpa', pa.float64()),
+        ('enrollment', pa.float64()),
+        ('withdraw', pa.float64()),
+        ('past_classes', pa.int64())
+    ] + STAT_FIELDS),
+    'new_instance': pa.schema([
+        ('crn', pa.string()),
+        ('dept', pa.string()),
+        ('course_id', pa.string()),
+        ('instructor_id', pa.string()),
+        ('title', pa.string()),
+        ('modality', pa.string()),
+        ('credits', pa.int64()),
+        ('capacity', pa.int64()),
+        ('days', pa.string()),
+        ('start_time', pa.string()),
+        ('end_time', pa.string()),
+        ('location', pa.string()),
+        ('meetings', pa.string())
+    ]),
+    'course_term_trend': trend_schema('course_id'),
+    'instructor_term_trend': trend_schema('instructor_id'),
+    'dept_term_trend': trend_schema('dept')
+}
+
+
+def table_path(folder, table, extension):
+    """
+    Returns the path of a cleaned_data table in the given format.
+
+    :param folder: Folder containing the cleaned tables.
+    :param table: Table name, one of TABLE_SCHEMAS.
+    :param extension: File extension, 'csv' or 'parquet'.
+    :return: The file path.
+    """
+    return os.path.join(folder, f'{table}.{extension}')
+
+
+def csv_dtypes(table):
+    """
+    Returns the pandas dtypes read_csv should use for a table's string columns, so values
+    such as CRNs stay strings instead of being inferred as integers. The columns are object
+    columns with NaN for missing values under every pandas version, rather than the string
+    dtype pandas 3 infers for str.
+
+    :param table: Table name, one of TABLE_SCHEMAS.
+    :return: A dictionary mapping column name to dtype.
+    """
+    return {field.name: object for field in TABLE_SCHEMAS[table] if field.type == pa.string()}
+
+
+def read_csv_table(folder, table, chunksize=None):
+    """
+    Reads a cleaned_data CSV file with the column types of its schema.
+
+    :param folder: Folder containing the cleaned tables.
+    :param table: Table name, one of TABLE_SCHEMAS.
+    :param chunksize: Optional number of rows per chunk.
+    :return: A DataFrame, or an iterator of DataFrames if chunksize is given.
+    """
+    return pd.read_csv(table_path(folder, table, 'csv'), dtype=csv_dtypes(table),
+                       chunksize=chunksize)
+
+
+def to_arrow(df, table):
+    """
+    Converts a DataFrame to an Arrow table with the table's schema, in schema column order.
+    CRNs and other string columns read back as integers are converted to strings. Optional
+    columns (OPTIONAL_COLUMNS) that the DataFrame lacks are left out of the schema.
+
+    :param df: The DataFrame to convert.
+    :param table: Table name, one of TABLE_SCHEMAS.
+    :return: A pyarrow Table.
+    """
+    schema = pa.schema([field for field in TABLE_SCHEMAS[table]
+                        if field.name in df.columns or field.name not in OPTIONAL_COLUMNS])
+    df = df.astype({name: 'string' for name in csv_dtypes(table) if name in schema.names})
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+
+def from_arrow(data):
+    """
+    Converts an Arrow table or record batch read from Parquet to a DataFrame typed like
+    read_csv_table. String columns are converted to object columns with NaN for missing values,
+    whatever string dtype the pandas version maps Arrow strings to; pd.NA cannot be encoded
+    as BSON.
+
+    :param data: A pyarrow Table or RecordBatch.
+    :return: A pandas DataFrame.
+    """
+    df = data.to_pandas(ignore_metadata=True)
+    strings = [field.name for field in data.schema if field.type == pa.string()]
+    df = df.astype({name: object for name in strings})
+    df[strings] = df[strings].where(df[strings].notna(), float('nan'))
+    return df
+
+
+def write_parquet(df, folder, table):
+    """
+    Writes a table to Parquet with its explicit schema.
+
+    :param df: The DataFrame to write.
+    :param folder: Folder containing the cleaned tables.
+    :param table: Table name, one of TABLE_SCHEMAS.
+    """
+    pq.write_table(to_arrow(df, table), table_path(folder, table, 'parquet'))
+
+
+def has_fresh_parquet(folder, table):
+    """
+    Checks whether a table's Parquet file exists and is at least as new as its CSV file.
+    Stages that only rewrite the CSV (such as increment.py) leave the Parquet file stale,
+    in which case readers fall back to the CSV.
+
+    :param folder: Folder containing the cleaned tables.
+    :param table: Table name, one of TABLE_SCHEMAS.
+    :return: True if the Parquet file can be read instead of the CSV.
+    """
+    parquet_file = table_path(folder, table, 'parquet')
+    csv_file = table_path(folder, table, 'csv')
+    if not os.path.exists(parquet_file):
+        return False
+    return not os.path.exists(csv_file) or os.path.getmtime(parquet_file) >= os.path.getmtime(csv_file)
+
+
+def read_table(folder, table, columns=None):
+    """
+    Reads a cleaned_data table, memory-mapping its Parquet file when it is fresh and
+    otherwise reading the CSV with the schema's column types.
+
+    :param folder: Folder containing the cleaned tables.
+    :param table: Table name, one of TABLE_SCHEMAS.
+    :param columns: Optional list of columns to read.
+    :return: A pandas DataFrame.
+    """
+    if has_fresh_parquet(folder, table):
+        return from_arrow(pq.read_table(table_path(folder, table, 'parquet'), columns=columns,
+                                        memory_map=True))
+    return pd.read_csv(table_path(folder, table, 'csv'), dtype=csv_dtypes(table),
+                       usecols=columns)
+
+
+def iter_table_chunks(folder, table, chunksize):
+    """
+    Reads a cleaned_data table in chunks, from its memory-mapped Parquet file when it is
+    fresh and otherwise from the CSV.
+
+    :param folder: Folder containing the cleaned tables.
+    :param table: Table name, one of TABLE_SCHEMAS.
+    :param chunksize: The number of rows per chunk.
+    :return: A generator of DataFrames.
+    """
+    if not has_fresh_parquet(folder, table):
+        yield from read_csv_table(folder, table, chunksize)
+        return
+    parquet_file = pq.ParquetFile(table_path(folder, table, 'parquet'), memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=chunksize):
+        yield from_arrow(batch)
+
+
+def export_parquet(folder):
+    """
+    Writes a Parquet copy of every cleaned_data CSV file in the folder.
+    The CSV files stay in place, so stages that read CSV keep working.
+
+    :param folder: Folder containing the cleaned tables.
+    """
+    for table in TABLE_SCHEMAS:
+        if os.path.exists(table_path(folder, table, 'csv')):
+            write_parquet(read_csv_table(folder, table), folder, table)
+
+
+def main():
+    export_parquet('cleaned_data/')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import json
+import os
+import pandas as pd
+import cleaned_tables
+
+# Output file of the stage, one JSON document per line; import.py loads it into the collection
+# of the same name
+COMPARISON_FILE = 'course_comparison.jsonl'
+
+# Sources of an instructor's statistics in the order they are tried and ranked: the
+# instructor's own sections of the course, all of their sections in the department, and the
+# department's average section
+BASES = ['course', 'instructor', 'dept']
+
+
+def withdraw_rate(enrollment, withdraw):
+    """
+    Returns the share of enrolled students (graded plus withdrawn) who withdrew, as in
+    trend_rollup.build_term_rollup.
+
+    :param enrollment: Graded enrollment (a number or a Series).
+    :param withdraw: Withdrawals (a number or a Series).
+    :return: The withdraw rate, rounded to 4 decimals.
+    """
+    return (withdraw / (enrollment + withdraw)).round(4)
+
+
+def build_dept_stats(course_df):
+    """
+    Averages the sections of each department from the per-course averages of course.csv,
+    weighting every course by its number of past sections.
+
+    :param course_df: DataFrame with the columns of course.csv.
+    :return: A DataFrame indexed by department with 'gpa', 'enrollment', 'withdraw' and
+             'past_classes'.
+    """
+    df = course_df[course_df['past_classes'] > 0]
+    weighted = df[['gpa', 'enrollment', 'withdraw']].mul(df['past_classes'], axis=0)
+    totals = weighted.assign(past_classes=df['past_classes']).groupby(df['dept']).sum()
+    dept_stats = totals[['gpa', 'enrollment', 'withdraw']].div(totals['past_classes'], axis=0)
+    return dept_stats.round(2).assign(past_classes=totals['past_classes'])
+
+
+def build_comparison_rows(new_instance_df, instructor_course_stats_df, instructor_df, course_df):
+    """
+    Looks up the historical statistics of every instructor teaching each offered course.
+    An instructor who taught the course before is described by their instructor_course_stats
+    row; otherwise by their instructor.csv row if they taught in the department, and otherwise
+    by the department's average section. The 'basis' column records which one was used.
+
+    :param new_instance_df: DataFrame with the columns of new_instance.csv.
+    :param instructor_course_stats_df: DataFrame with the columns of instructor_course_stats.csv.
+    :param instructor_df: DataFrame with the columns of instructor.csv.
+    :param course_df: DataFrame with the columns of course.csv.
+    :return: A DataFrame with one row per offered course and current instructor, ranked within
+             each course.
+    """
+    stat_columns = ['gpa', 'enrollment', 'withdraw', 'past_classes']
+    sections = new_instance_df.groupby(['course_id', 'instructor_id'], sort=False).agg(
+        dept=('dept', 'first'),
+        crns=('crn', list)
+    ).reset_index()
+
+    course_stats = instructor_course_stats_df.set_index(['course_id', 'instructor_id'])
+    instructor_stats = instructor_df[instructor_df['past_classes'] > 0].set_index('instructor_id')
+    candidates = [
+        course_stats[stat_columns].reindex(
+            pd.MultiIndex.from_frame(sections[['course_id', 'instructor_id']])),
+        instructor_stats[stat_columns].reindex(sections['instructor_id']),
+        build_dept_stats(course_df)[stat_columns].reindex(sections['dept'])
+    ]
+
+    # Take each row's statistics from the first basis that has them
+    rows = sections.assign(basis=None, **{column: float('nan') for column in stat_columns})
+    for basis, stats in reversed(list(zip(BASES, candidates))):
+        found = stats['past_classes'].notna().to_numpy()
+        rows.loc[found, stat_columns] = stats[stat_columns].to_numpy()[found]
+        rows.loc[found, 'basis'] = basis
+
+    rows['withdraw_rate'] = withdraw_rate(rows['enrollment'], rows['withdraw'])
+    rows['sections'] = rows['past_classes'].astype('Int64')
+    rows['last_name'] = rows['instructor_id'].map(instructor_df.set_index('instructor_id')['last_name'])
+
+    # Direct history of the course ranks first, then higher GPA, then more past sections
+    basis_rank = rows['basis'].map({basis: i for i, basis in enumerate(BASES)}).fillna(len(BASES))
+    rows = rows.assign(basis_rank=basis_rank).sort_values(
+        ['course_id', 'basis_rank', 'gpa', 'sections', 'instructor_id'],
+        ascending=[True, True, False, False, True], na_position='last')
+    rows['rank'] = rows.groupby('course_id').cumcount() + 1
+    return rows[['course_id', 'rank', 'instructor_id', 'last_name', 'basis', 'gpa',
+                 'enrollment', 'withdraw_rate', 'sections', 'crns']].reset_index(drop=True)
+
+
+def build_comparison_documents(new_instance_df, instructor_course_stats_df, instructor_df,
+                               course_df):
+    """
+    Builds one document per offered course with the ranked statistics of its current
+    instructors, as stored in the 'course_comparison' collection.
+
+    :param new_instance_df: DataFrame with the columns of new_instance.csv.
+    :param instructor_course_stats_df: DataFrame with the columns of instructor_course_stats.csv.
+    :param instructor_df: DataFrame with the columns of instructor.csv.
+    :param course_df: DataFrame with the columns of course.csv.
+    :return: A list of dictionaries with 'course_id', 'dept', 'title' and 'instructors', in
+             course ID order.
+    """
+    rows = build_comparison_rows(new_instance_df, instructor_course_stats_df, instructor_df,
+                                 course_df)
+    # Missing statistics are stored as null rather than NaN
+    rows = rows.astype(object).where(rows.notna(), None)
+    titles = new_instance_df.groupby('course_id')[['dept', 'title']].first()
+
+    documents = []
+    for course_id, instructors in rows.groupby('course_id', sort=False):
+        documents.append({
+            'course_id': course_id,
+            'dept': titles.at[course_id, 'dept'],
+            'title': titles.at[course_id, 'title'],
+            'instructors': instructors.drop(columns='course_id').to_dict('records')
+        })
+    return documents
+
+
+def create_comparison_file(cleaned_folder):
+    """
+    Reads the current offerings and historical statistics from the cleaned folder and writes
+    the course comparison documents next to them as JSON lines.
+
+    :param cleaned_folder: Folder containing the cleaned tables.
+    """
+    documents = build_comparison_documents(
+        cleaned_tables.read_table(cleaned_folder, 'new_instance', columns=[
+            'crn', 'dept', 'course_id', 'instructor_id', 'title']),
+        cleaned_tables.read_table(cleaned_folder, 'instructor_course_stats', columns=[
+            'course_id', 'instructor_id', 'gpa', 'enrollment', 'withdraw', 'past_classes']),
+        cleaned_tables.read_table(cleaned_folder, 'instructor', columns=[
+            'instructor_id', 'last_name', 'gpa', 'enrollment', 'withdraw', 'past_classes']),
+        cleaned_tables.read_table(cleaned_folder, 'course', columns=[
+            'course_id', 'dept', 'gpa', 'enrollment', 'withdraw', 'past_classes']))
+
+    output_file = os.path.join(cleaned_folder, COMPARISON_FILE)
+    temp_file = f'{output_file}.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as file:
+        for document in documents:
+            file.write(json.dumps(document) + '\n')
+    os.replace(temp_file, output_file)
+
+
+def read_comparison_file(cleaned_folder):
+    """
+    Reads the documents written by create_comparison_file.
+
+    :param cleaned_folder: Folder containing the cleaned tables.
+    :return: A list of dictionaries.
+    """
+    with open(os.path.join(cleaned_folder, COMPARISON_FILE), 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def main():
+    create_comparison_file('cleaned_data/')
+
+
+if __name__ == "__main__":
+    main()
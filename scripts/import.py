@@ -1,34 +1,301 @@
 import os
 import pandas as pd
-from pymongo import MongoClient
+from pymongo import ASCENDING, IndexModel, MongoClient, ReplaceOne
 import bcrypt
+import cleaned_tables
+import course_comparison
+import instrumentation
+from search_index import SearchIndex
 
+# Natural ID of each collection, used as the upsert key. past_instance has no unique ID (see
+# INDEXES), so it is always loaded through a staging swap.
+NATURAL_KEYS = {
+    'course': 'course_id',
+    'instructor': 'instructor_id',
+    'dept': 'dept_id',
+    'instructor_course_stats': 'stat_id',
+    'new_instance': 'crn',
+    'course_term_trend': 'trend_id',
+    'instructor_term_trend': 'trend_id',
+    'dept_term_trend': 'trend_id',
+    'search_index': 'prefix',
+    'course_comparison': 'course_id'
+}
 
-def read_csv_file(file_path):
+# Indexes of each collection as (key columns, unique). past_instance IDs are not unique,
+# because the distribution data repeats some sections.
+INDEXES = {
+    'past_instance': [(['instance_id'], False), (['course_id'], False),
+                      (['instructor_id'], False)],
+    'course': [(['course_id'], True), (['dept'], False)],
+    'instructor': [(['instructor_id'], True), (['dept'], False)],
+    'dept': [(['dept_id'], True)],
+    'instructor_course_stats': [(['stat_id'], True), (['course_id', 'instructor_id'], True),
+                                (['instructor_id'], False)],
+    'new_instance': [(['crn'], True), (['course_id'], False), (['instructor_id'], False),
+                     (['dept'], False)],
+    'course_term_trend': [(['trend_id'], True), (['course_id', 'year', 'term'], True),
+                          (['course_id', 'year', 'term_order'], True)],
+    'instructor_term_trend': [(['trend_id'], True), (['instructor_id', 'year', 'term'], True),
+                              (['instructor_id', 'year', 'term_order'], True)],
+    'dept_term_trend': [(['trend_id'], True), (['dept', 'year', 'term'], True),
+                        (['dept', 'year', 'term_order'], True)],
+    'search_index': [(['prefix'], True)],
+    'course_comparison': [(['course_id'], True)],
+    'user': [(['username'], True)]
+}
+
+# Lookups made by the API and client, as (collection, filter columns), checked by explain_lookups
+QUERY_SHAPES = [
+    ('course', ['course_id']),
+    ('course', ['dept']),
+    ('instructor', ['instructor_id']),
+    ('instructor', ['dept']),
+    ('dept', ['dept_id']),
+    ('past_instance', ['course_id']),
+    ('past_instance', ['instructor_id']),
+    ('instructor_course_stats', ['course_id']),
+    ('instructor_course_stats', ['instructor_id']),
+    ('instructor_course_stats', ['course_id', 'instructor_id']),
+    ('new_instance', ['crn']),
+    ('new_instance', ['course_id']),
+    ('new_instance', ['instructor_id']),
+    ('course_term_trend', ['course_id']),
+    ('instructor_term_trend', ['instructor_id']),
+    ('dept_term_trend', ['dept']),
+    ('search_index', ['prefix']),
+    ('course_comparison', ['course_id']),
+    ('user', ['username'])
+]
+
+BATCH_SIZE = 1000
+
+# Rows read from a CSV file at a time by main
+CHUNK_SIZE = 50_000
+
+
+def read_csv_file(file_path, chunksize=None):
     """
     Reads a CSV file into a pandas DataFrame.
     This method is used to load CSV data into memory for further processing or insertion into a database.
+    With a chunksize, the file is read lazily as an iterator of DataFrames instead.
 
     :param file_path: The path to the CSV file to be read.
-    :return: A pandas DataFrame containing the data from the CSV file.
+    :param chunksize: Optional number of rows per chunk.
+    :return: A pandas DataFrame containing the data from the CSV file, or an iterator of DataFrames.
+    """
+    return pd.read_csv(file_path, chunksize=chunksize)
+
+
+def iter_records(df):
+    """
+    Yields the rows of a DataFrame, or of an iterable of DataFrame chunks, as dictionaries one
+    at a time. Unlike df.to_dict('records'), this never holds the full list of records in memory.
+
+    :param df: The pandas DataFrame or iterable of DataFrames to iterate over.
+    :return: A generator of dictionaries keyed by column name.
+    """
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+    for chunk in chunks:
+        columns = list(chunk.columns)
+        for values in chunk.itertuples(index=False, name=None):
+            yield dict(zip(columns, values))
+
+
+def iter_batches(records, batch_size):
+    """
+    Groups an iterable of records into lists of at most batch_size records.
+
+    :param records: An iterable of records.
+    :param batch_size: The maximum number of records per batch.
+    :return: A generator of record lists.
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_batches(df, collection_name, batch_size, write):
+    """
+    Writes the records of a DataFrame in batches, timing each batch as a 'mongo_batch'
+    operation of the stage and counting the written rows.
+
+    :param df: The pandas DataFrame (or iterable of DataFrame chunks) to write.
+    :param collection_name: The name of the collection being loaded, used as the timing label.
+    :param batch_size: The number of records per batch.
+    :param write: A function writing one list of records to MongoDB.
+    """
+    for batch in iter_batches(iter_records(df), batch_size):
+        with instrumentation.timer('mongo_batch', collection=collection_name):
+            write(batch)
+        instrumentation.count('rows_out', len(batch))
+
+
+def create_indexes(collection, collection_name):
+    """
+    Builds the indexes declared in INDEXES for a collection. Existing indexes with the same
+    keys and options are left as they are.
+
+    :param collection: The MongoDB collection to index.
+    :param collection_name: The name the collection is loaded as, used to look up its indexes.
+    """
+    indexes = [IndexModel([(column, ASCENDING) for column in columns], unique=unique)
+               for columns, unique in INDEXES.get(collection_name, [])]
+    if indexes:
+        collection.create_indexes(indexes)
+
+
+def upsert_into_mongo(df, db, collection_name, batch_size=BATCH_SIZE):
+    """
+    Upserts data from a DataFrame into a MongoDB collection in unordered bulk writes.
+    Each record replaces the document with the same natural ID (see NATURAL_KEYS) or is
+    inserted if there is none, so the collection is never emptied during the load. Once every
+    record is written, documents whose natural ID is not in the data are deleted, so rows
+    removed from the cleaned table disappear from the collection as well.
+
+    :param df: The pandas DataFrame (or iterable of DataFrame chunks) to be upserted into MongoDB.
+    :param db: The MongoDB database connection object.
+    :param collection_name: The name of the MongoDB collection to upsert into.
+    :param batch_size: The number of records sent per bulk write.
+    """
+    collection = db[collection_name]
+    key = NATURAL_KEYS[collection_name]
+    create_indexes(collection, collection_name)
+    loaded_keys = set()
+
+    def write(batch):
+        loaded_keys.update(record[key] for record in batch)
+        collection.bulk_write(
+            [ReplaceOne({key: record[key]}, record, upsert=True) for record in batch],
+            ordered=False)
+
+    write_batches(df, collection_name, batch_size, write)
+    stale_keys = [document[key] for document in collection.find({}, {key: 1, '_id': 0})
+                  if document.get(key) not in loaded_keys]
+    for batch in iter_batches(stale_keys, batch_size):
+        collection.delete_many({key: {'$in': batch}})
+
+
+def swap_into_mongo(df, db, collection_name, batch_size=BATCH_SIZE):
     """
-    return pd.read_csv(file_path)
+    Loads data from a DataFrame into a staging collection and then renames it over the
+    target collection. Readers see either the old or the new data, never an empty or
+    partially loaded collection. Indexes are built on the staging collection after the load,
+    so the live collection is always indexed.
 
+    :param df: The pandas DataFrame (or iterable of DataFrame chunks) to be loaded into MongoDB.
+    :param db: The MongoDB database connection object.
+    :param collection_name: The name of the MongoDB collection to replace.
+    :param batch_size: The number of records inserted per batch.
+    """
+    staging_name = f'{collection_name}_staging'
+    db.drop_collection(staging_name)
+    staging = db.create_collection(staging_name)
+    write_batches(df, collection_name, batch_size,
+                  lambda batch: staging.insert_many(batch, ordered=False))
+    create_indexes(staging, collection_name)
+    staging.rename(collection_name, dropTarget=True)
 
-def insert_into_mongo(df, db, collection_name):
+
+def insert_into_mongo(df, db, collection_name, mode='swap', batch_size=BATCH_SIZE):
     """
     Inserts data from a DataFrame into a MongoDB collection.
-    This method first clears any existing data in the specified collection before inserting new data,
-    ensuring that the collection reflects the current state of the DataFrame.
+    By default the data is loaded into a staging collection that is swapped in when complete;
+    'upsert' mode updates the collection in place by natural ID and deletes the documents that
+    are no longer in the data, and 'replace' mode clears the collection before inserting the
+    new data. Collections without a natural ID in NATURAL_KEYS are swapped in 'upsert' mode.
+    In every mode the collection ends up with the indexes declared in INDEXES.
 
-    :param df: The pandas DataFrame containing data to be inserted into MongoDB.
+    :param df: The pandas DataFrame (or iterable of DataFrame chunks) to be inserted into MongoDB.
     :param db: The MongoDB database connection object.
     :param collection_name: The name of the MongoDB collection where the data will be inserted.
+    :param mode: One of 'swap', 'upsert' or 'replace'.
+    :param batch_size: The number of records written per batch.
     """
-    collection = db[collection_name]
-    collection.delete_many({})  # Clear existing data
-    records = df.to_dict('records')
-    collection.insert_many(records)
+    if mode == 'swap' or (mode == 'upsert' and collection_name not in NATURAL_KEYS):
+        swap_into_mongo(df, db, collection_name, batch_size)
+    elif mode == 'upsert':
+        upsert_into_mongo(df, db, collection_name, batch_size)
+    elif mode == 'replace':
+        collection = db[collection_name]
+        collection.delete_many({})  # Clear existing data
+        write_batches(df, collection_name, batch_size, collection.insert_many)
+        create_indexes(collection, collection_name)
+    else:
+        raise ValueError(f"Unknown load mode: {mode}")
+
+
+def load_search_index(db, folder_path):
+    """
+    Builds the autocomplete prefix index over the cleaned course and instructor tables and
+    loads it into the 'search_index' collection, one document per prefix.
+
+    :param db: The MongoDB database connection object.
+    :param folder_path: Folder containing the cleaned tables.
+    """
+    search_index = SearchIndex.from_tables(cleaned_tables.read_table(folder_path, 'course'),
+                                           cleaned_tables.read_table(folder_path, 'instructor'))
+    insert_into_mongo(pd.DataFrame(search_index.to_records()), db, 'search_index')
+
+
+def load_course_comparison(db, folder_path):
+    """
+    Loads the ranked instructor comparison of each offered course written by
+    course_comparison.py into the 'course_comparison' collection, one document per course.
+    Nothing is loaded if the stage has not been run.
+
+    :param db: The MongoDB database connection object.
+    :param folder_path: Folder containing the cleaned tables.
+    """
+    if os.path.exists(os.path.join(folder_path, course_comparison.COMPARISON_FILE)):
+        insert_into_mongo(pd.DataFrame(course_comparison.read_comparison_file(folder_path)), db,
+                          'course_comparison')
+
+
+def plan_stages(plan):
+    """
+    Lists the stage names of a query plan and all of its input stages.
+
+    :param plan: A plan document from the output of the explain command.
+    :return: A list of stage names, outermost first.
+    """
+    stages = [plan['stage']]
+    children = plan.get('inputStages', []) + ([plan['inputStage']] if 'inputStage' in plan else [])
+    for child in children:
+        stages.extend(plan_stages(child))
+    return stages
+
+
+def explain_lookups(db, query_shapes=QUERY_SHAPES):
+    """
+    Explains each common lookup against the loaded data and reports whether its winning plan
+    uses an index scan or a collection scan. Each lookup is run with the values of a document
+    sampled from the collection, so it needs a mongod with the data loaded.
+
+    :param db: The MongoDB database connection object.
+    :param query_shapes: A list of (collection name, filter columns) pairs.
+    :return: A list of (collection name, filter columns, winning plan stages) tuples.
+    """
+    report = []
+    for collection_name, columns in query_shapes:
+        sample = db[collection_name].find_one({}, {column: 1 for column in columns})
+        if sample is None:
+            continue
+        query = {column: sample.get(column) for column in columns}
+        explanation = db.command('explain', {'find': collection_name, 'filter': query},
+                                 verbosity='queryPlanner')
+        # Servers using the slot-based engine nest the plan tree under 'queryPlan'
+        winning_plan = explanation['queryPlanner']['winningPlan']
+        stages = plan_stages(winning_plan.get('queryPlan', winning_plan))
+        report.append((collection_name, columns, stages))
+        scan = 'COLLSCAN' if 'COLLSCAN' in stages else 'IXSCAN'
+        print(f"{scan:8} {collection_name} by {', '.join(columns)}: {' <- '.join(stages)}")
+    return report
 
 
 def insert_admin_user(db):
@@ -54,13 +321,27 @@ def insert_admin_user(db):
     }
 
     users_collection.insert_one(admin_user)
+    create_indexes(users_collection, 'user')
 
 
 def main():
     """
-    The main function of the script.
-    It reads CSV files from a specified folder, converts them to DataFrames, and then inserts them
-    into a MongoDB database. Additionally, it inserts a hardcoded admin user into the database.
+    The main function of the script. It runs load_folder as the 'import' stage, recording the
+    load time of each collection and the latency of each MongoDB batch.
+    """
+    with instrumentation.stage_metrics('import'):
+        load_folder()
+
+
+def load_folder():
+    """
+    Reads the cleaned tables from a specified folder in chunks of DataFrames, and then inserts
+    them into a MongoDB database in batches, so memory does not grow with the size of the files.
+    Tables with an up-to-date Parquet copy are read from it memory-mapped instead of from the CSV.
+    It then builds the autocomplete search index from the course and instructor tables and
+    loads the per-course instructor comparison documents.
+    Additionally, it inserts a hardcoded admin user into the database and prints whether the
+    common lookups are served by index scans.
 
     The MongoDB database and the folder containing the CSV files are specified within the function.
     """
@@ -72,16 +353,33 @@ def main():
 
     for filename in os.listdir(folder_path):
         if filename.endswith('.csv'):
-            file_path = os.path.join(folder_path, filename)
-            df = read_csv_file(file_path)
-
             # Use filename without '.csv' as collection name
             collection_name = os.path.splitext(filename)[0]
-            insert_into_mongo(df, db, collection_name)
+
+            # Known tables are read with their schema, from Parquet when it is up to date
+            if collection_name in cleaned_tables.TABLE_SCHEMAS:
+                df = cleaned_tables.iter_table_chunks(folder_path, collection_name, CHUNK_SIZE)
+                fresh_parquet = cleaned_tables.has_fresh_parquet(folder_path, collection_name)
+            else:
+                df = read_csv_file(os.path.join(folder_path, filename), CHUNK_SIZE)
+                fresh_parquet = False
+            with instrumentation.timer('load_collection', collection=collection_name):
+                insert_into_mongo(df, db, collection_name)
+            instrumentation.file_read(cleaned_tables.table_path(
+                folder_path, collection_name, 'parquet' if fresh_parquet else 'csv'))
+
+    with instrumentation.timer('load_search_index'):
+        load_search_index(db, folder_path)
+    with instrumentation.timer('load_course_comparison'):
+        load_course_comparison(db, folder_path)
 
     # Insert a hardcoded admin user
     insert_admin_user(db)
 
+    # Check that the common lookups are served by the indexes
+    with instrumentation.timer('explain_lookups'):
+        explain_lookups(db)
+
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,16 @@
 import csv
+import os
+import shutil
+import tempfile
+from collections import Counter
+import instrumentation
+
+# new_instance column -> key column of the counted file, for each 'new_classes' counter
+COUNTERS = {
+    'dept': 'dept_id',
+    'course_id': 'course_id',
+    'instructor_id': 'instructor_id'
+}
 
 
 def read_csv_to_dict(file_path, key_column):
@@ -20,68 +32,97 @@ def read_csv_to_dict(file_path, key_column):
     return data
 
 
-def increment_new_classes(data_dict, key):
+def count_new_classes(new_instance_file):
+    """
+    Counts the new class instances per department, course and instructor in one pass.
+
+    :param new_instance_file: The file path of the CSV containing new class instances.
+    :return: A dictionary mapping each new_instance counter column ('dept', 'course_id',
+             'instructor_id') to a Counter of instances per key.
     """
-    Increments the 'new_classes' count by 1 for the specified key in the data dictionary.
-    This is used to track the addition of new classes for departments, courses, or instructors.
+    counts = {column: Counter() for column in COUNTERS}
+    with open(new_instance_file, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            for column, counter in counts.items():
+                counter[row[column]] += 1
+    return counts
+
+
+def set_new_classes(data_dict, counts):
+    """
+    Sets the 'new_classes' count of every entry in the data dictionary to its number of new
+    class instances, or 0 if it has none. Because the counts are set rather than added,
+    running it again on the same data leaves the counts unchanged.
 
     :param data_dict: The dictionary containing the data (departments, courses, or instructors).
-    :param key: The key corresponding to the entry in the data dictionary to be incremented.
+    :param counts: A Counter of new class instances per key.
     """
-    if key in data_dict:
-        data_dict[key]['new_classes'] = str(
-            int(data_dict[key].get('new_classes', '0')) + 1)
+    for key, row in data_dict.items():
+        row['new_classes'] = str(counts.get(key, 0))
 
 
 def update_csv_file(data_dict, file_path, fieldnames):
     """
     Writes the updated data from a dictionary back to a CSV file.
-    This is used to save changes made to the data, such as incremented 'new_classes' counts.
+    This is used to save changes made to the data, such as updated 'new_classes' counts.
+    The data is written to a temporary file that then replaces the original, so readers
+    never see a partially written file. The temporary file takes the original's permissions.
 
     :param data_dict: The dictionary containing the updated data.
     :param file_path: The path to the CSV file where the data should be written.
     :param fieldnames: A list of fieldnames for the CSV file, indicating the order of columns.
     """
-    with open(file_path, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data_dict.values():
-            writer.writerow(row)
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(file_path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in data_dict.values():
+                writer.writerow(row)
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
 
 
 def process_new_instance(new_instance_file, dept_file, course_file, instructor_file):
     """
-    Processes a 'new instance' CSV file to increment the 'new_classes' counts for departments,
-    courses, and instructors. This reflects the addition of new class instances in the respective
-    data files.
+    Processes a 'new instance' CSV file to set the 'new_classes' counts for departments,
+    courses, and instructors. This reflects the new class instances in the respective
+    data files, and each file is rewritten once.
 
     :param new_instance_file: The file path of the CSV containing new class instances.
     :param dept_file: The file path of the department CSV file to be updated.
     :param course_file: The file path of the course CSV file to be updated.
     :param instructor_file: The file path of the instructor CSV file to be updated.
+    :return: The dictionary of counts returned by count_new_classes.
     """
-    depts = read_csv_to_dict(dept_file, 'dept_id')
-    courses = read_csv_to_dict(course_file, 'course_id')
-    instructors = read_csv_to_dict(instructor_file, 'instructor_id')
-
-    with open(new_instance_file, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            # Increment new_classes for dept, course, and instructor
-            increment_new_classes(depts, row['dept'])
-            increment_new_classes(courses, row['course_id'])
-            increment_new_classes(instructors, row['instructor_id'])
-
-    # Update CSV files
-    update_csv_file(depts, dept_file, depts[next(iter(depts))].keys())
-    update_csv_file(courses, course_file, courses[next(iter(courses))].keys())
-    update_csv_file(instructors, instructor_file,
-                    instructors[next(iter(instructors))].keys())
+    with instrumentation.timer('count_new_classes'):
+        counts = count_new_classes(new_instance_file)
+    instrumentation.count('rows_in', sum(counts['dept'].values()))
+    instrumentation.file_read(new_instance_file)
+
+    files = {'dept': dept_file, 'course_id': course_file,
+             'instructor_id': instructor_file}
+    for column, key_column in COUNTERS.items():
+        with instrumentation.timer('update_counts', file=os.path.basename(files[column])):
+            instrumentation.file_read(files[column])
+            data = read_csv_to_dict(files[column], key_column)
+            set_new_classes(data, counts[column])
+            update_csv_file(data, files[column], data[next(iter(data))].keys())
+        instrumentation.count('rows_out', len(data))
+        instrumentation.file_written(files[column])
+    return counts
 
 
 def main():
-    process_new_instance('cleaned_data/new_instance.csv', 'cleaned_data/dept.csv',
-                         'cleaned_data/course.csv', 'cleaned_data/instructor.csv')
+    with instrumentation.stage_metrics('increment'):
+        process_new_instance('cleaned_data/new_instance.csv', 'cleaned_data/dept.csv',
+                             'cleaned_data/course.csv', 'cleaned_data/instructor.csv')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,178 @@
+import os
+import pandas as pd
+import instrumentation
+import past_cleaner
+from section_stats import SUM_COLUMNS, VALUES_COLUMN, build_section_state, finalize_section_state
+
+# Aggregate tables whose partials carry the section state behind the section_stats columns
+SECTION_TABLES = ['course', 'instructor_course_stats']
+
+
+def bootstrap_aggregate_state(cleaned_folder):
+    """
+    Approximates the aggregate state from the cleaned CSV files when no saved state exists.
+    Sums are reconstructed as the stored mean times 'past_classes', so they carry the rounding
+    of the two-decimal means; running past_cleaner.py once saves an exact state instead.
+
+    :param cleaned_folder: Folder containing the cleaned CSV files.
+    :return: A tuple of (state dictionary, terms DataFrame) like past_cleaner.load_aggregate_state.
+    """
+    state = {}
+    for table, (key, descriptive_columns) in past_cleaner.AGGREGATE_TABLES.items():
+        df = pd.read_csv(os.path.join(
+            cleaned_folder, f'{table}.csv'), index_col=key)
+        # Skip placeholder rows for missing departments and newly scraped instructors
+        df = df[df['past_classes'] > 0]
+
+        partial = df[descriptive_columns].copy()
+        for name in past_cleaner.MEAN_SOURCES:
+            values = df[name] if name in df else pd.Series(float('nan'), index=df.index)
+            partial[f'{name}_sum'] = values.fillna(0) * df['past_classes']
+            partial[f'{name}_count'] = df['past_classes'].where(
+                values.notna(), 0)
+        partial['past_classes'] = df['past_classes']
+        state[table] = partial
+
+    terms = pd.read_csv(os.path.join(cleaned_folder, 'past_instance.csv'),
+                        usecols=['year', 'term']).drop_duplicates().reset_index(drop=True)
+    return state, terms
+
+
+def bootstrap_section_state(state, cleaned_folder):
+    """
+    Adds the section state of section_stats.build_section_state to the course and
+    instructor_course_stats partials of a state that lacks it, i.e. one bootstrapped from the
+    cleaned CSV files or saved before the section state was kept. It is rebuilt once from
+    past_instance.csv, which only has the sections with a known instructor, so course
+    statistics can differ slightly from a full rebuild until past_cleaner.py is run again.
+
+    :param state: Dictionary of partial aggregates, updated in place.
+    :param cleaned_folder: Folder containing the cleaned CSV files.
+    """
+    past_instance_df = pd.read_csv(os.path.join(cleaned_folder, 'past_instance.csv'),
+                                   usecols=['course_id', 'instructor_id', 'gpa', 'enrollment'])
+    past_instance_df['stat_id'] = past_instance_df['instructor_id'] + \
+        ' ' + past_instance_df['course_id']
+    for table in SECTION_TABLES:
+        key = past_cleaner.AGGREGATE_TABLES[table][0]
+        section_state = build_section_state(past_instance_df, key, value='gpa', weight='enrollment')
+        partial = state[table].join(section_state)
+        partial[list(SUM_COLUMNS.values())] = partial[list(SUM_COLUMNS.values())].fillna(0)
+        partial[VALUES_COLUMN] = partial[VALUES_COLUMN].fillna('')
+        state[table] = partial
+
+
+def update_cleaned_table(file_path, key, updates):
+    """
+    Overwrites the aggregate columns of the given keys in a cleaned CSV file.
+    Keys that are not in the file yet are appended, with 'new_classes' set to 0 in tables that
+    have that column; every other row, including its 'new_classes' count, is left as it is.
+
+    :param file_path: The path to the cleaned CSV file.
+    :param key: The ID column of the file.
+    :param updates: DataFrame indexed by key with the new values of the updated rows.
+    """
+    table = pd.read_csv(file_path, index_col=key)
+    dtypes = table.dtypes
+    columns = [column for column in updates.columns if column in table.columns]
+
+    new_keys = updates.index.difference(table.index)
+    table = pd.concat([table, pd.DataFrame(index=new_keys)])
+    table.loc[updates.index, columns] = updates[columns]
+    if 'new_classes' in table.columns:
+        table.loc[new_keys, 'new_classes'] = 0
+
+    table = table.astype(dtypes)
+    table.index.name = key
+    table.reset_index().to_csv(file_path, index=False)
+
+
+def ingest_term(term_file, offered_dept_file, cleaned_folder, state_folder):
+    """
+    Adds one or more new terms of grade distribution data to the cleaned data without
+    rebuilding the full history. The new rows are appended to past_instance.csv, and only
+    the departments, courses, instructors and instructor-course pairs that appear in the
+    new data are recomputed from the running sum/count aggregates in the state folder,
+    including their section statistics.
+
+    The history itself is never read: the new rows are only appended to past_instance.csv.
+    The cost that remains grows with the number of keys rather than with the number of terms:
+    dept.csv, instructor.csv, course.csv and instructor_course_stats.csv are read and
+    rewritten whole (one row per key), and so is the aggregate state, whose section GPA counts
+    are bounded by the few hundred distinct two-decimal GPAs per key.
+
+    :param term_file: File path for the CSV containing the new term's distribution rows.
+    :param offered_dept_file: File path for the CSV containing offered department data.
+    :param cleaned_folder: Folder containing the cleaned CSV files to update.
+    :param state_folder: Folder holding the aggregate state saved by past_cleaner.py.
+    :return: The number of past instances appended to past_instance.csv.
+    """
+    with instrumentation.timer('load_term'):
+        term_df = past_cleaner.load_distribution(term_file)
+    instrumentation.count('rows_in', len(term_df))
+    instrumentation.file_read(term_file)
+
+    with instrumentation.timer('load_aggregate_state'):
+        saved_state = past_cleaner.load_aggregate_state(state_folder)
+        state, terms = saved_state if saved_state else bootstrap_aggregate_state(
+            cleaned_folder)
+        if VALUES_COLUMN not in state['course']:
+            bootstrap_section_state(state, cleaned_folder)
+
+    # Refuse to count the same term twice
+    new_terms = past_cleaner.loaded_terms(term_df)
+    already_loaded = new_terms.merge(terms, on=['year', 'term'])
+    if not already_loaded.empty:
+        raise ValueError("Terms already loaded: " + ', '.join(
+            already_loaded['year'] + ' ' + already_loaded['term']))
+
+    with instrumentation.timer('merge_aggregate_state'):
+        term_state = past_cleaner.build_aggregate_state(term_df)
+        state = past_cleaner.merge_aggregate_state(state, term_state)
+
+    # Append the new past instances
+    past_instance_data = past_cleaner.build_past_instance_data(
+        term_df, set(state['course'].index), set(state['instructor'].index))
+    past_instance_file = os.path.join(cleaned_folder, 'past_instance.csv')
+    past_instance_data.to_csv(past_instance_file, mode='a', header=False, index=False)
+    instrumentation.count('rows_out', len(past_instance_data))
+    instrumentation.file_written(past_instance_file)
+
+    # Recompute only the rows touched by the new term
+    updates = {table: past_cleaner.finalize_partial_aggregates(
+        state[table].loc[term_state[table].index]) for table in state}
+
+    course_counts = state['course'].groupby('dept').size()
+    offered_titles = pd.read_csv(
+        offered_dept_file, index_col='dept_id')['title']
+    dept_index = updates['dept'].index
+    updates['dept']['unique_classes'] = course_counts.reindex(
+        dept_index).fillna(0).astype('int64')
+    updates['dept']['title'] = offered_titles.reindex(
+        dept_index).fillna('Discontinued')
+
+    for table in SECTION_TABLES:
+        updates[table] = updates[table].join(
+            finalize_section_state(state[table].loc[updates[table].index]))
+
+    for table, (key, _) in past_cleaner.AGGREGATE_TABLES.items():
+        file_path = os.path.join(cleaned_folder, f'{table}.csv')
+        with instrumentation.timer('update_cleaned_table', table=table):
+            update_cleaned_table(file_path, key, updates[table])
+        instrumentation.count('rows_updated', len(updates[table]))
+        instrumentation.file_written(file_path)
+
+    with instrumentation.timer('save_aggregate_state'):
+        past_cleaner.save_aggregate_state(
+            state, pd.concat([terms, new_terms], ignore_index=True), state_folder)
+    return len(past_instance_data)
+
+
+def main():
+    with instrumentation.stage_metrics('ingest_term'):
+        ingest_term('raw_data/new_term_distribution.csv', 'raw_data/offered_dept.csv',
+                    'cleaned_data/', 'aggregate_state/')
+
+
+if __name__ == "__main__":
+    main()
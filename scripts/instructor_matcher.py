@@ -0,0 +1,181 @@
+import csv
+import difflib
+import re
+import unicodedata
+from collections import defaultdict
+
+INSTRUCTOR_FIELDS = ['instructor_id', 'last_name', 'dept', 'gpa', 'enrollment', 'withdraw',
+                     'past_classes', 'new_classes']
+
+
+def normalize_name(name):
+    """
+    Normalizes a name for matching: strips diacritics, lowercases, drops punctuation such as
+    apostrophes and periods, and treats hyphens and runs of whitespace as a single space.
+
+    :param name: The name to normalize (e.g., "O'Brien-Muñoz").
+    :return: The normalized name (e.g., 'obrien munoz').
+    """
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    name = re.sub(r"[^\w\s-]", '', name.lower())
+    return ' '.join(name.replace('-', ' ').split())
+
+
+def raw_last_name(instructor_name):
+    """
+    Extracts the last name from a timetable instructor name, which is the initials followed by
+    the last name (e.g., 'RJ Jacks'), keeping the original capitalization.
+
+    :param instructor_name: The name of the instructor as it appears in the raw data.
+    :return: The last name part of the name.
+    """
+    return ' '.join(instructor_name.split()[1:]) if ' ' in instructor_name else instructor_name
+
+
+def trigrams(name):
+    """
+    Lists the character trigrams of a name padded with spaces.
+
+    :param name: A normalized name.
+    :return: A set of three-character strings.
+    """
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class InstructorMatcher:
+    """
+    Resolves timetable instructor names to instructor IDs using a normalized-name index per
+    department. Names are tried exactly, then without spaces and leading initials, and finally
+    against a trigram blocking index with a similarity threshold. Instructors that still do not
+    match are buffered and written to the instructor file in one batch by flush.
+    """
+
+    def __init__(self, threshold=0.92, min_fuzzy_length=8):
+        """
+        Initialize an empty matcher.
+        :param threshold: Minimum difflib similarity ratio for a fuzzy match.
+        :param min_fuzzy_length: Names shorter than this are only matched exactly, since short
+                                 names that differ by a letter are usually different people.
+        """
+        self.threshold = threshold
+        self.min_fuzzy_length = min_fuzzy_length
+        self.names = defaultdict(dict)      # dept -> normalized name variant -> instructor ID
+        self.compact = defaultdict(dict)    # dept -> name without spaces -> instructor ID
+        self.blocks = defaultdict(lambda: defaultdict(set))  # dept -> trigram -> compact names
+        self.pending = []
+
+    @classmethod
+    def from_csv(cls, file_path, **kwargs):
+        """
+        Builds a matcher over the instructors in an instructor CSV file.
+        :param file_path: The file path of the CSV file containing instructor data.
+        :param kwargs: Options passed to the constructor.
+        :return: An InstructorMatcher.
+        """
+        matcher = cls(**kwargs)
+        with open(file_path, 'r') as file:
+            for row in csv.DictReader(file):
+                matcher.add(row['dept'], row['last_name'], row['instructor_id'])
+        return matcher
+
+    def add(self, dept, last_name, instructor_id):
+        """
+        Adds an instructor to the index. Like new_cleaner.read_instructors, each part of a
+        multi-word or hyphenated last name is indexed as well as the full name.
+        :param dept: The department of the instructor.
+        :param last_name: The instructor's last name.
+        :param instructor_id: The instructor ID the name resolves to.
+        """
+        name = normalize_name(last_name)
+        for variant in [name] + name.split(' '):
+            self.names[dept][variant] = instructor_id
+
+        compact_name = name.replace(' ', '')
+        self.compact[dept][compact_name] = instructor_id
+        if len(compact_name) >= self.min_fuzzy_length:
+            for gram in trigrams(compact_name):
+                self.blocks[dept][gram].add(compact_name)
+
+    def match(self, instructor_name, dept):
+        """
+        Finds the instructor ID for a timetable instructor name.
+        :param instructor_name: The name of the instructor as it appears in the raw data.
+        :param dept: The department of the instructor.
+        :return: The matching instructor ID, or None if there is no match.
+        """
+        name = normalize_name(raw_last_name(instructor_name))
+        names = self.names[dept]
+        if name in names:
+            return names[name]
+
+        # Extra initials ('A B Smith') leave single letters in front of the last name
+        tokens = name.split(' ')
+        while len(tokens) > 1 and len(tokens[0]) == 1:
+            tokens = tokens[1:]
+        compact_name = ''.join(tokens)
+        if compact_name in self.compact[dept]:
+            return self.compact[dept][compact_name]
+
+        if len(compact_name) < self.min_fuzzy_length:
+            return None
+        return self._fuzzy_match(compact_name, dept)
+
+    def _fuzzy_match(self, compact_name, dept):
+        """
+        Finds the most similar indexed name among those sharing at least half of the trigrams.
+        :param compact_name: The normalized name without spaces.
+        :param dept: The department of the instructor.
+        :return: The instructor ID of the best match above the threshold, or None.
+        """
+        grams = trigrams(compact_name)
+        shared = defaultdict(int)
+        blocks = self.blocks[dept]
+        for gram in grams:
+            for candidate in blocks.get(gram, ()):
+                shared[candidate] += 1
+
+        best_ratio, best_name = 0, None
+        for candidate, count in shared.items():
+            if count * 2 < len(grams):
+                continue
+            ratio = difflib.SequenceMatcher(None, compact_name, candidate).ratio()
+            if ratio > best_ratio:
+                best_ratio, best_name = ratio, candidate
+        if best_ratio >= self.threshold:
+            return self.compact[dept][best_name]
+        return None
+
+    def resolve(self, instructor_name, dept):
+        """
+        Finds the instructor ID for a timetable instructor name, creating a new instructor if
+        there is no match. New instructors are indexed immediately and buffered for flush.
+        :param instructor_name: The name of the instructor as it appears in the raw data.
+        :param dept: The department of the instructor.
+        :return: The matching or newly created instructor ID.
+        """
+        instructor_id = self.match(instructor_name, dept)
+        if instructor_id is not None:
+            return instructor_id
+
+        last_name = raw_last_name(instructor_name)
+        instructor_id = f"{last_name} ({dept})"
+        self.add(dept, last_name, instructor_id)
+        self.pending.append({
+            'instructor_id': instructor_id, 'last_name': last_name, 'dept': dept,
+            'gpa': 0.0, 'enrollment': 0.0, 'withdraw': 0.0, 'past_classes': 0, 'new_classes': 0
+        })
+        return instructor_id
+
+    def flush(self, instructors_file):
+        """
+        Appends the buffered new instructors to the instructor CSV file in one write.
+        :param instructors_file: The file path of the instructor CSV file.
+        """
+        if not self.pending:
+            return
+        with open(instructors_file, 'a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=INSTRUCTOR_FIELDS)
+            writer.writerows(self.pending)
+        self.pending = []
@@ -0,0 +1,328 @@
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Environment variables read by StageMetrics.from_env; pipeline.py sets them for every stage
+METRICS_FILE_VAR = 'PIPELINE_METRICS_FILE'          # JSON lines file appended to
+TEXTFILE_DIR_VAR = 'PIPELINE_METRICS_TEXTFILE_DIR'  # folder of Prometheus textfiles
+PROFILE_VAR = 'PIPELINE_PROFILE'                    # comma-separated 'cprofile', 'tracemalloc'
+PROFILE_DIR_VAR = 'PIPELINE_PROFILE_DIR'            # folder of profiler output
+
+PROFILERS = ('cprofile', 'tracemalloc')
+
+# Allocation sites listed in a stage's tracemalloc report
+TRACEMALLOC_TOP = 25
+
+# Prefix of every Prometheus metric name
+METRIC_PREFIX = 'pipeline'
+
+# Stage being recorded in this process, used by the module-level helpers
+active_stage = None
+
+
+def prometheus_labels(labels):
+    """
+    Formats labels for a Prometheus textfile, escaping backslashes, quotes and newlines.
+
+    :param labels: A dictionary of label names and values.
+    :return: A string such as '{stage="import",collection="course"}'.
+    """
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class StageMetrics:
+    """
+    Metrics of one run of a pipeline stage: wall time, counters such as rows and bytes in and
+    out, and named timings with labels (e.g., the fetch latency of each subject). Every timing
+    is emitted as a JSON line when it is recorded and the stage ends with a summary line, and
+    the totals can also be written as a Prometheus textfile. Optionally the stage is profiled
+    with cProfile or tracemalloc. Recording is thread-safe, so scraper threads can share it.
+    """
+
+    def __init__(self, stage, metrics_file=None, textfile_dir=None, profile=(),
+                 profile_dir='profiles/'):
+        """
+        Initialize the metrics of a stage.
+        :param stage: The stage name.
+        :param metrics_file: Optional JSON lines file the events are appended to.
+        :param textfile_dir: Optional folder the stage's Prometheus textfile is written to.
+        :param profile: Profilers to run, a subset of PROFILERS.
+        :param profile_dir: Folder the profiler output is written to.
+        """
+        unknown = set(profile) - set(PROFILERS)
+        if unknown:
+            raise ValueError(f"Unknown profiler: {', '.join(sorted(unknown))}")
+        self.stage = stage
+        self.metrics_file = metrics_file
+        self.textfile_dir = textfile_dir
+        self.profile = tuple(profile)
+        self.profile_dir = profile_dir
+        self.counters = {}
+        self.timings = {}    # (name, sorted label items) -> [count, total seconds, max seconds]
+        self.seconds = None
+        self.peak_bytes = None
+        self.lock = threading.Lock()
+        self.output = None
+        self.profiler = None
+        self.start_time = None
+
+    @classmethod
+    def from_env(cls, stage):
+        """
+        Creates the metrics of a stage configured by the PIPELINE_* environment variables.
+        :param stage: The stage name.
+        :return: A StageMetrics.
+        """
+        profile = [name.strip() for name in os.environ.get(PROFILE_VAR, '').split(',')
+                   if name.strip()]
+        return cls(stage, os.environ.get(METRICS_FILE_VAR) or None,
+                   os.environ.get(TEXTFILE_DIR_VAR) or None, profile,
+                   os.environ.get(PROFILE_DIR_VAR) or 'profiles/')
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish(success=exc_type is None)
+        return False
+
+    def start(self):
+        """
+        Starts the stage clock and profilers and makes this the active stage of the process.
+        """
+        global active_stage
+        if self.metrics_file:
+            self.output = open(self.metrics_file, 'a', encoding='utf-8')
+        if 'tracemalloc' in self.profile:
+            tracemalloc.start()
+        if 'cprofile' in self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start_time = time.perf_counter()
+        active_stage = self
+
+    def finish(self, success=True):
+        """
+        Stops the stage, writes the profiler output, the summary line and the Prometheus
+        textfile, and prints a one-line summary.
+        :param success: Whether the stage completed without an error.
+        """
+        global active_stage
+        self.seconds = time.perf_counter() - self.start_time
+        if active_stage is self:
+            active_stage = None
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path('prof'))
+        if 'tracemalloc' in self.profile:
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            self.write_tracemalloc_report(tracemalloc.take_snapshot())
+            tracemalloc.stop()
+
+        self.emit({'event': 'stage', 'success': success, 'seconds': round(self.seconds, 6),
+                   'counters': self.counters, 'timings': self.timing_summary(),
+                   'peak_bytes': self.peak_bytes})
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+        if self.textfile_dir:
+            self.write_textfile(success)
+
+        counters = ', '.join(f'{name} {value}' for name, value in self.counters.items())
+        print(f"{self.stage}: {self.seconds:.2f}s" + (f" ({counters})" if counters else ''))
+
+    def profile_path(self, extension):
+        """
+        Returns the path of a profiler output file of the stage, creating its folder.
+        :param extension: The file extension.
+        :return: The file path.
+        """
+        os.makedirs(self.profile_dir, exist_ok=True)
+        return os.path.join(self.profile_dir, f'{self.stage}.{extension}')
+
+    def write_tracemalloc_report(self, snapshot):
+        """
+        Writes the peak traced memory and the largest allocation sites still alive at the end
+        of the stage.
+        :param snapshot: A tracemalloc snapshot.
+        """
+        with open(self.profile_path('tracemalloc.txt'), 'w', encoding='utf-8') as file:
+            file.write(f"Peak traced memory: {self.peak_bytes / 2 ** 20:.1f} MB\n")
+            for statistic in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                file.write(f"{statistic}\n")
+
+    def emit(self, event):
+        """
+        Appends an event of this stage to the JSON lines file, if one is configured.
+        :param event: A dictionary; the time and stage name are added.
+        """
+        if self.output is None:
+            return
+        line = json.dumps(dict({'time': round(time.time(), 3), 'stage': self.stage}, **event))
+        with self.lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def count(self, name, value=1):
+        """
+        Adds to a counter of the stage, e.g. 'rows_in' or 'bytes_written'.
+        :param name: The counter name.
+        :param value: The amount to add.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name, seconds, **labels):
+        """
+        Records one timing of an operation.
+        :param name: The operation name, e.g. 'subject_fetch' or 'mongo_batch'.
+        :param seconds: The elapsed wall time.
+        :param labels: Labels telling operations of the same name apart, e.g. subject='CS'.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            timing = self.timings.setdefault(key, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+        self.emit({'event': 'timing', 'name': name, 'labels': labels,
+                   'seconds': round(seconds, 6)})
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Times the enclosed block with record.
+        :param name: The operation name.
+        :param labels: Labels of the operation.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **labels)
+
+    def timing_summary(self):
+        """
+        Lists the totals of every timing recorded so far.
+        :return: A list of dictionaries with 'name', 'labels', 'count', 'seconds' and 'max_seconds'.
+        """
+        with self.lock:
+            return [{'name': name, 'labels': dict(labels), 'count': count,
+                     'seconds': round(total, 6), 'max_seconds': round(maximum, 6)}
+                    for (name, labels), (count, total, maximum) in self.timings.items()]
+
+    def write_textfile(self, success):
+        """
+        Writes the stage totals in the Prometheus text format to '<textfile_dir>/<stage>.prom',
+        replacing the previous file atomically, for the node exporter's textfile collector.
+        :param success: Whether the stage completed without an error.
+        """
+        stage = {'stage': self.stage}
+        lines = [
+            f'# TYPE {METRIC_PREFIX}_stage_duration_seconds gauge',
+            f'{METRIC_PREFIX}_stage_duration_seconds{prometheus_labels(stage)} {self.seconds:.6f}',
+            f'# TYPE {METRIC_PREFIX}_stage_success gauge',
+            f'{METRIC_PREFIX}_stage_success{prometheus_labels(stage)} {int(success)}',
+            f'# TYPE {METRIC_PREFIX}_stage_last_run_timestamp_seconds gauge',
+            f'{METRIC_PREFIX}_stage_last_run_timestamp_seconds{prometheus_labels(stage)} '
+            f'{time.time():.0f}'
+        ]
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name}_total counter')
+            lines.append(f'{METRIC_PREFIX}_{name}_total{prometheus_labels(stage)} {value}')
+        if self.peak_bytes is not None:
+            lines.append(f'# TYPE {METRIC_PREFIX}_stage_peak_traced_bytes gauge')
+            lines.append(f'{METRIC_PREFIX}_stage_peak_traced_bytes{prometheus_labels(stage)} '
+                         f'{self.peak_bytes}')
+
+        timings = [(prometheus_labels(dict(stage, operation=timing['name'], **timing['labels'])),
+                    timing) for timing in self.timing_summary()]
+        if timings:
+            lines.append(f'# TYPE {METRIC_PREFIX}_operation_seconds summary')
+            for labels, timing in timings:
+                lines.append(f"{METRIC_PREFIX}_operation_seconds_sum{labels} {timing['seconds']}")
+                lines.append(f"{METRIC_PREFIX}_operation_seconds_count{labels} {timing['count']}")
+            lines.append(f'# TYPE {METRIC_PREFIX}_operation_seconds_max gauge')
+            for labels, timing in timings:
+                lines.append(f"{METRIC_PREFIX}_operation_seconds_max{labels} "
+                             f"{timing['max_seconds']}")
+
+        os.makedirs(self.textfile_dir, exist_ok=True)
+        path = os.path.join(self.textfile_dir, f'{self.stage}.prom')
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, path)
+
+
+def stage_metrics(stage):
+    """
+    Returns the metrics of a stage configured from the environment, to be used as a context
+    manager around the stage's main function.
+
+    :param stage: The stage name.
+    :return: A StageMetrics.
+    """
+    return StageMetrics.from_env(stage)
+
+
+def count(name, value=1):
+    """
+    Adds to a counter of the active stage; does nothing outside a stage.
+    :param name: The counter name.
+    :param value: The amount to add.
+    """
+    if active_stage is not None:
+        active_stage.count(name, value)
+
+
+def record(name, seconds, **labels):
+    """
+    Records a timing of the active stage; does nothing outside a stage.
+    :param name: The operation name.
+    :param seconds: The elapsed wall time.
+    :param labels: Labels of the operation.
+    """
+    if active_stage is not None:
+        active_stage.record(name, seconds, **labels)
+
+
+@contextmanager
+def timer(name, **labels):
+    """
+    Times the enclosed block as an operation of the active stage; only the block runs outside
+    a stage.
+    :param name: The operation name.
+    :param labels: Labels of the operation.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, **labels)
+
+
+def file_read(path):
+    """
+    Adds the size of a file the active stage read to its 'bytes_read' counter.
+    :param path: The file path.
+    """
+    if active_stage is not None and os.path.exists(path):
+        active_stage.count('bytes_read', os.path.getsize(path))
+
+
+def file_written(path):
+    """
+    Adds the size of a file the active stage wrote to its 'bytes_written' counter.
+    :param path: The file path.
+    """
+    if active_stage is not None and os.path.exists(path):
+        active_stage.count('bytes_written', os.path.getsize(path))
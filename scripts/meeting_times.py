@@ -0,0 +1,234 @@
+import csv
+from bisect import bisect_left
+from collections import defaultdict
+
+# Bit of each timetable day letter in a meeting's day mask
+DAY_BITS = {'M': 1, 'T': 2, 'W': 4, 'R': 8, 'F': 16, 'S': 32, 'U': 64}
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_time(value):
+    """
+    Converts a timetable time to minutes after midnight.
+
+    :param value: A time such as '11:00AM' or '2:30PM'.
+    :return: The number of minutes after midnight (e.g., 660 or 870).
+    """
+    hours, minutes = value[:-2].split(':')
+    hours = int(hours) % 12 + (12 if value[-2:].upper() == 'PM' else 0)
+    return hours * 60 + int(minutes)
+
+
+def parse_meetings(days, start_time, end_time):
+    """
+    Parses the meeting columns of a new_instance row, where additional meeting times are
+    joined with ' and ' (e.g., 'T R and M W F', '11:00AM and 2:30PM', '12:15PM and 3:20PM').
+    Meetings with arranged or missing times are left out.
+
+    :param days: The 'days' value of the row.
+    :param start_time: The 'start_time' value of the row.
+    :param end_time: The 'end_time' value of the row.
+    :return: A list of (day mask, start minute, end minute) tuples.
+    """
+    meetings = []
+    for day_letters, start, end in zip((days or '').split(' and '),
+                                       (start_time or '').split(' and '),
+                                       (end_time or '').split(' and ')):
+        mask = 0
+        for letter in day_letters.split():
+            mask |= DAY_BITS.get(letter, 0)
+        if mask and start[-2:].upper() in ('AM', 'PM') and end[-2:].upper() in ('AM', 'PM'):
+            meetings.append((mask, parse_time(start), parse_time(end)))
+    return meetings
+
+
+def encode_meetings(meetings):
+    """
+    Encodes meetings as the compact 'meetings' column of new_instance.csv.
+
+    :param meetings: A list of (day mask, start minute, end minute) tuples.
+    :return: A string such as '10:660-735;21:870-920', empty if there are no meetings.
+    """
+    return ';'.join(f'{mask}:{start}-{end}' for mask, start, end in meetings)
+
+
+def decode_meetings(value):
+    """
+    Decodes a 'meetings' column value written by encode_meetings.
+
+    :param value: The encoded meetings.
+    :return: A list of (day mask, start minute, end minute) tuples.
+    """
+    meetings = []
+    for meeting in filter(None, (value or '').split(';')):
+        mask, times = meeting.split(':')
+        start, end = times.split('-')
+        meetings.append((int(mask), int(start), int(end)))
+    return meetings
+
+
+def weekly_intervals(meetings):
+    """
+    Expands meetings into intervals on a single weekly minute axis, one per meeting day.
+
+    :param meetings: A list of (day mask, start minute, end minute) tuples.
+    :return: A sorted list of (start, end) minutes after Monday midnight.
+    """
+    intervals = []
+    for mask, start, end in meetings:
+        for day in range(len(DAY_BITS)):
+            if mask & (1 << day):
+                offset = day * MINUTES_PER_DAY
+                intervals.append((offset + start, offset + end))
+    return sorted(intervals)
+
+
+def intervals_overlap(left, right):
+    """
+    Checks whether two sorted interval lists share any minute. Intervals that only touch
+    (one ends when the other starts) do not overlap.
+
+    :param left: A sorted list of (start, end) intervals.
+    :param right: A sorted list of (start, end) intervals.
+    :return: True if some interval of left overlaps some interval of right.
+    """
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i][0] < right[j][1] and right[j][0] < left[i][1]:
+            return True
+        if left[i][1] <= right[j][1]:
+            i += 1
+        else:
+            j += 1
+    return False
+
+
+class ScheduleChecker:
+    """
+    Conflict checks over the sections of a term. Each section's meetings are kept as a
+    combined day mask and a sorted list of weekly intervals; two sections are compared only
+    if their day masks share a day. All intervals are also kept sorted by start in an interval
+    index, so the sections overlapping a given one are found by binary search instead of a
+    scan over the whole term.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty checker.
+        """
+        self.day_masks = {}                        # CRN -> OR of its meeting day masks
+        self.intervals = {}                        # CRN -> sorted weekly intervals
+        self.course_sections = defaultdict(list)   # course ID -> CRNs in file order
+        self.starts = []                           # interval index: sorted interval starts
+        self.index = []                            # interval index: (start, end, CRN) by start
+        self.max_length = 0
+
+    @classmethod
+    def from_csv(cls, new_instance_file):
+        """
+        Builds a checker over the sections of a new_instance CSV file. The 'meetings' column
+        is used when present; files written before it existed are parsed from the days and
+        times columns.
+
+        :param new_instance_file: The file path of the new_instance CSV file.
+        :return: A ScheduleChecker.
+        """
+        checker = cls()
+        with open(new_instance_file, 'r', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                if 'meetings' in row:
+                    meetings = decode_meetings(row['meetings'])
+                else:
+                    meetings = parse_meetings(row['days'], row['start_time'], row['end_time'])
+                checker.add(row['crn'], row['course_id'], meetings)
+        checker.build()
+        return checker
+
+    def add(self, crn, course_id, meetings):
+        """
+        Adds a section to be indexed by the next build.
+        :param crn: The section's CRN.
+        :param course_id: The section's course ID.
+        :param meetings: A list of (day mask, start minute, end minute) tuples.
+        """
+        mask = 0
+        for meeting_mask, _, _ in meetings:
+            mask |= meeting_mask
+        self.day_masks[crn] = mask
+        self.intervals[crn] = weekly_intervals(meetings)
+        self.course_sections[course_id].append(crn)
+
+    def build(self):
+        """
+        Builds the interval index over every added section.
+        """
+        self.index = sorted((start, end, crn) for crn, intervals in self.intervals.items()
+                            for start, end in intervals)
+        self.starts = [start for start, _, _ in self.index]
+        self.max_length = max((end - start for start, end, _ in self.index), default=0)
+
+    def conflict(self, crn, other_crn):
+        """
+        Checks whether two sections meet at the same time.
+        :param crn: The first section's CRN.
+        :param other_crn: The second section's CRN.
+        :return: True if the sections share a day and overlap in time.
+        """
+        if not self.day_masks[crn] & self.day_masks[other_crn]:
+            return False
+        return intervals_overlap(self.intervals[crn], self.intervals[other_crn])
+
+    def overlapping(self, start, end):
+        """
+        Lists the sections with an interval overlapping [start, end) using the interval index.
+        Only intervals starting at most max_length before start can reach it, so just that slice
+        of the index is examined.
+
+        :param start: Start minute on the weekly axis.
+        :param end: End minute on the weekly axis.
+        :return: A set of CRNs.
+        """
+        low = bisect_left(self.starts, start - self.max_length)
+        high = bisect_left(self.starts, end)
+        return {crn for other_start, other_end, crn in self.index[low:high]
+                if other_end > start}
+
+    def conflicting_sections(self, crn):
+        """
+        Lists every other section that meets at the same time as a section.
+        :param crn: The section's CRN.
+        :return: A set of CRNs.
+        """
+        conflicts = set()
+        for start, end in self.intervals[crn]:
+            conflicts |= self.overlapping(start, end)
+        conflicts.discard(crn)
+        return conflicts
+
+    def validate_schedule(self, crns):
+        """
+        Lists the pairs of sections in a schedule that meet at the same time. CRNs that are not
+        offered this term are ignored.
+
+        :param crns: The CRNs of a user's schedule.
+        :return: A list of (CRN, CRN) pairs, in schedule order.
+        """
+        crns = [crn for crn in dict.fromkeys(crns) if crn in self.intervals]
+        return [(crn, other_crn) for i, crn in enumerate(crns) for other_crn in crns[i + 1:]
+                if self.conflict(crn, other_crn)]
+
+    def open_sections(self, course_ids, schedule=()):
+        """
+        Lists, for each course, the sections that do not conflict with a schedule.
+        :param course_ids: The courses to look for sections of.
+        :param schedule: The CRNs already in the user's schedule.
+        :return: A dictionary mapping each course ID to its non-conflicting CRNs in file order.
+        """
+        busy = set()
+        for crn in schedule:
+            if crn in self.intervals:
+                busy |= self.conflicting_sections(crn) | {crn}
+        return {course_id: [crn for crn in self.course_sections.get(course_id, [])
+                            if crn not in busy]
+                for course_id in course_ids}
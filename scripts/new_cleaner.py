@@ -1,83 +1,73 @@
 import csv
+import heapq
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+import instrumentation
+from instructor_matcher import InstructorMatcher
+from meeting_times import encode_meetings, parse_meetings
+
+# Columns of new_instance.csv
+FIELDNAMES = ['crn', 'dept', 'course_id', 'instructor_id', 'title', 'modality', 'credits',
+              'capacity', 'days', 'start_time', 'end_time', 'location', 'meetings']
+
+
+class Section:
+    """
+    A cleaned new_instance row. Attributes are stored in slots instead of a per-row
+    dictionary, and every value but the CRN is interned or cached, so a term's sections
+    share their department codes, modalities, times and rooms. Rows are written with
+    csv.writer from values(), in FIELDNAMES order.
+    """
+    __slots__ = FIELDNAMES
+
+    def __init__(self, crn, dept, course_id, instructor_id, title, modality, credits, capacity,
+                 days, start_time, end_time, location, meetings=''):
+        """
+        Initialize a section; the arguments are the new_instance.csv columns.
+        """
+        intern = sys.intern
+        self.crn = crn
+        self.dept = intern(dept)
+        self.course_id = intern(course_id)
+        self.instructor_id = intern_value(instructor_id)
+        self.title = intern(title)
+        self.modality = intern(modality)
+        self.credits = intern(credits)
+        self.capacity = intern(capacity)
+        self.days = intern(days)
+        self.start_time = intern(start_time)
+        self.end_time = intern(end_time)
+        self.location = intern(location)
+        self.meetings = meetings
+
+    def __reduce__(self):
+        # Rebuilding from the values re-interns them in the process that unpickles the row
+        return Section, self.values()
+
+    def values(self):
+        """
+        Returns the column values of the section.
+        :return: A tuple in FIELDNAMES order.
+        """
+        return section_values(self)
+
+
+# Reads the FIELDNAMES attributes of a Section in one call
+section_values = attrgetter(*FIELDNAMES)
+
+
+def intern_value(value):
+    """
+    Interns a string, leaving None (such as an unresolved instructor ID) as it is.
 
-
-def read_instructors(file_path):
-    """
-    Reads instructor data from a CSV file and creates a dictionary for quick lookups.
-    This dictionary is keyed by a tuple of department and a variation of the instructor's last name,
-    allowing for flexible matching of instructor names in different formats.
-
-    :param file_path: The file path of the CSV file containing instructor data.
-    :return: A dictionary where keys are tuples of (department, instructor_name_variation)
-             and values are the corresponding instructor IDs.
-    """
-    instructors = {}
-    with open(file_path, 'r') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            # Create different name variations for matching (case-insensitive)
-            last_name = row['last_name'].lower()
-            names = [last_name] + last_name.split('-') + last_name.split(' ')
-            for name in names:
-                key = (row['dept'], name)
-                instructors[key] = row['instructor_id']
-    return instructors
-
-
-def add_new_instructor(instructor_name, dept, instructors_lookup, instructors_file):
-    """
-    Adds a new instructor to the instructor CSV file and updates the lookup dictionary.
-    This method is used when an instructor is encountered in the data that is not already
-    in the instructor lookup.
-
-    :param instructor_name: The name of the instructor to be added.
-    :param dept: The department of the instructor.
-    :param instructors_lookup: The dictionary used for instructor lookups.
-    :param instructors_file: The file path of the instructor CSV file where new instructor data will be appended.
-    :return: The newly created instructor ID.
-    """
-    # Retain original capitalization for last_name
-    last_name_original = ' '.join(instructor_name.split(
-    )[1:]) if ' ' in instructor_name else instructor_name
-    last_name_key = last_name_original.lower()  # Use lowercased version for key
-    instructor_id = f"{last_name_original} ({dept})"
-
-    # Check if instructor already exists in the lookup
-    if (dept, last_name_key) in instructors_lookup:
-        return instructors_lookup[(dept, last_name_key)]
-
-    # Add instructor to the lookup
-    instructors_lookup[(dept, last_name_key)] = instructor_id
-    # Write the new instructor to the file
-    with open(instructors_file, 'a', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=[
-                                'instructor_id', 'last_name', 'dept', 'gpa', 'enrollment', 'withdraw', 'past_classes', 'new_classes'])
-        writer.writerow({
-            'instructor_id': instructor_id, 'last_name': last_name_original, 'dept': dept,
-            'gpa': 0.0, 'enrollment': 0.0, 'withdraw': 0.0, 'past_classes': 0, 'new_classes': 0
-        })
-    return instructor_id
-
-
-def standardize_instructor(instructor_name, dept, instructors_lookup):
-    """
-    Standardizes the instructor name by removing initials and converting it to lowercase.
-    This method also checks the instructors_lookup to find a matching instructor ID.
-    If no match is found, it returns None.
-
-    :param instructor_name: The name of the instructor to standardize.
-    :param dept: The department of the instructor.
-    :param instructors_lookup: The lookup dictionary containing instructor IDs.
-    :return: The standardized instructor ID if a match is found, otherwise None.
-    """
-    last_name = ' '.join(instructor_name.split()[1:]).lower(
-    ) if ' ' in instructor_name else instructor_name.lower()
-    # Check various name iterations
-    for name in [last_name, last_name.replace(' ', '-'), last_name.replace('-', ' ')]:
-        key = (dept, name)
-        if key in instructors_lookup:
-            return instructors_lookup[key]
-    return None  # No match found
+    :param value: A string or None.
+    :return: The interned string, or None.
+    """
+    return None if value is None else sys.intern(value)
 
 
 def standardize_modality(modality):
@@ -108,108 +98,311 @@ def get_department(course):
     return course.split('-')[0]
 
 
+# Section attribute filled from each raw column of an '* Additional Times *' row, whose values
+# are shifted one column to the left
+ADDITIONAL_TIMES_COLUMNS = {'days': 'cr_hrs', 'start_time': 'capacity',
+                            'end_time': 'instructor', 'location': 'days'}
+
+
 def append_additional_times(initial_row, additional_row):
     """
     Appends additional time data to an existing course row.
     This method is used when a course has multiple meeting times and is crucial for capturing all
     the scheduling details for each course instance.
 
-    :param initial_row: The initial course row dictionary to which additional times will be added.
-    :param additional_row: The row containing the additional time data.
+    :param initial_row: The initial Section to which additional times will be added.
+    :param additional_row: The raw row dictionary containing the additional time data.
     """
-    mapped_additional_data = {
-        'days': additional_row['cr_hrs'],
-        'start_time': additional_row['capacity'],
-        'end_time': additional_row['instructor'],
-        'location': additional_row['days']
-    }
-
-    for key in ['days', 'start_time', 'end_time', 'location']:
-        if initial_row.get(key):
-            initial_row[key] += f" and {mapped_additional_data[key]}"
+    for key, column in ADDITIONAL_TIMES_COLUMNS.items():
+        value = getattr(initial_row, key)
+        if value:
+            setattr(initial_row, key, sys.intern(f"{value} and {additional_row[column]}"))
         else:
-            initial_row[key] = mapped_additional_data[key]
+            setattr(initial_row, key, sys.intern(additional_row[column]))
 
 
-def process_csv(input_filename, output_filename, instructors_file):
+@lru_cache(maxsize=4096)
+def meetings_value(days, start_time, end_time):
     """
-    Processes the raw CSV file and outputs a cleaned and standardized version.
-    This method reads course data, standardizes and enriches it with instructor IDs,
-    modality abbreviations, and corrects any inconsistencies in time and location data.
+    Encodes the meeting columns of a section with meeting_times.encode_meetings. Sections of a
+    term share a few thousand day and time combinations, so each is parsed once and sections
+    with the same times share the encoded string.
+
+    :param days: The 'days' value of the section.
+    :param start_time: The 'start_time' value of the section.
+    :param end_time: The 'end_time' value of the section.
+    :return: The 'meetings' value.
+    """
+    return encode_meetings(parse_meetings(days, start_time, end_time))
 
-    :param input_filename: The file path of the raw CSV file containing course data.
-    :param output_filename: The file path where the processed data will be saved.
-    :param instructors_file: The file path of the CSV file containing instructor data.
+
+def add_meetings(row):
+    """
+    Adds the 'meetings' column to a cleaned row: its days and times, including any additional
+    times, encoded as day bitmasks and minute intervals by meeting_times.encode_meetings.
+
+    :param row: The cleaned Section, after all additional times are appended.
+    :return: The same row.
     """
-    instructors_lookup = read_instructors(instructors_file)
+    row.meetings = meetings_value(row.days, row.start_time, row.end_time)
+    return row
 
-    with open(input_filename, 'r') as infile, open(output_filename, 'w', newline='') as outfile:
-        reader = csv.DictReader(infile)
-        fieldnames = ['crn', 'dept', 'course_id', 'instructor_id', 'title', 'modality',
-                      'credits', 'capacity', 'days', 'start_time', 'end_time', 'location']
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-        writer.writeheader()
 
-        last_non_additional_row = None
+def iter_kept_rows(reader):
+    """
+    Yields the raw rows that process_csv keeps, numbered by their position in the raw file.
+    Rows whose credits are zero or not an integer are skipped. '* Additional Times *' rows
+    carry the days in their credits column, so they are kept whenever the course row before
+    them is kept and skipped along with it otherwise.
 
-        for row in reader:
-            try:
-                credits = int(row['cr_hrs'])
-                if credits == 0:  # Skip rows where credits is 0
-                    continue
+    :param reader: An iterable of raw row dictionaries.
+    :return: A generator of (position, row) tuples.
+    """
+    course_kept = False
+    for position, row in enumerate(reader):
+        if row['modality'] == '* Additional Times *':
+            if course_kept:
+                yield position, row
+            continue
 
-            except ValueError:  # If credits is not an integer, skip this row and continue with the next
-                continue
+        try:
+            credits = int(row['cr_hrs'])
+        except ValueError:  # If credits is not an integer, skip this row and continue with the next
+            course_kept = False
+            continue
 
-            if row['modality'] == '* Additional Times *':  # Handle '* Additional Times *'
-                if last_non_additional_row:
-                    append_additional_times(last_non_additional_row, row)
-                continue
+        course_kept = credits != 0  # Skip rows where credits is 0
+        if course_kept:
+            yield position, row
 
-            modality_standardized = standardize_modality(row['modality'])
-            department = get_department(row['course'])
 
-            course_id = row['course'].replace('-', ' ')
+def clean_rows(positioned_rows, matcher, pending_positions):
+    """
+    Cleans kept raw rows into new_instance rows. '* Additional Times *' rows are appended to
+    the row before them, so each cleaned row is yielded once the next course row starts.
+
+    :param positioned_rows: An iterable of (position, row) tuples from iter_kept_rows.
+    :param matcher: The InstructorMatcher used to resolve instructor names.
+    :param pending_positions: A list that receives the position of the row behind each
+                              instructor the matcher creates, in the order they are created.
+    :return: A generator of (position, Section) tuples.
+    """
+    last_non_additional_row = None
+    last_position = None
 
-            if row['days'] == '(ARR)':  # Handle '(ARR)' in Days
-                row['start_time'], row['end_time'] = '(ARR)', '(ARR)'
+    for position, row in positioned_rows:
+        if row['modality'] == '* Additional Times *':  # Handle '* Additional Times *'
+            if last_non_additional_row:
+                append_additional_times(last_non_additional_row, row)
+            continue
 
-            standardized_instructor_id = standardize_instructor(
-                row['instructor'], department, instructors_lookup)
+        modality_standardized = standardize_modality(row['modality'])
+        department = get_department(row['course'])
 
-            if standardized_instructor_id is None:  # Add new instructor if no match
-                standardized_instructor_id = add_new_instructor(
-                    row['instructor'], department, instructors_lookup, instructors_file)
+        course_id = row['course'].replace('-', ' ')
 
-            row['instructor'] = standardized_instructor_id
+        if row['days'] == '(ARR)':  # Handle '(ARR)' in Days
+            row['start_time'], row['end_time'] = '(ARR)', '(ARR)'
 
-            new_row = {
-                'crn': row['crn'],
-                'dept': department,
-                'course_id': course_id,
-                'instructor_id': standardized_instructor_id,
-                'title': row['title'],
-                'modality': modality_standardized,
-                'credits': row['cr_hrs'],
-                'capacity': row['capacity'],
-                'days': row['days'],
-                'start_time': row['start_time'],
-                'end_time': row['end_time'],
-                'location': row['location']
-            }
+        # Match the instructor, or create a new one if there is no match
+        pending_count = len(matcher.pending)
+        standardized_instructor_id = matcher.resolve(
+            row['instructor'], department)
+        if len(matcher.pending) > pending_count:
+            pending_positions.append(position)
 
-            if last_non_additional_row:
-                writer.writerow(last_non_additional_row)
+        row['instructor'] = standardized_instructor_id
 
-            last_non_additional_row = new_row
+        new_row = Section(row['crn'], department, course_id, standardized_instructor_id,
+                          row['title'], modality_standardized, row['cr_hrs'], row['capacity'],
+                          row['days'], row['start_time'], row['end_time'], row['location'])
 
         if last_non_additional_row:
-            writer.writerow(last_non_additional_row)
+            yield last_position, add_meetings(last_non_additional_row)
+
+        last_non_additional_row = new_row
+        last_position = position
+
+    if last_non_additional_row:
+        yield last_position, add_meetings(last_non_additional_row)
+
+
+def shard_by_department(positioned_rows):
+    """
+    Splits kept raw rows by department. '* Additional Times *' rows go to the shard of the
+    course row before them, so every shard keeps them right after their course row.
+
+    :param positioned_rows: An iterable of (position, row) tuples from iter_kept_rows.
+    :return: A dictionary mapping each department to its (position, row) tuples in file order.
+    """
+    shards = {}
+    department = None
+    for position, row in positioned_rows:
+        if row['modality'] != '* Additional Times *':
+            department = get_department(row['course'])
+        if department is not None:
+            shards.setdefault(department, []).append((position, row))
+    return shards
+
+
+# Matcher of each worker process, loaded once by load_worker_matcher
+worker_matcher = None
+
+
+def load_worker_matcher(instructors_file):
+    """
+    Loads the instructor matcher of a worker process.
+    :param instructors_file: The file path of the CSV file containing instructor data.
+    """
+    global worker_matcher
+    worker_matcher = InstructorMatcher.from_csv(instructors_file)
+
+
+def clean_shard(positioned_rows):
+    """
+    Cleans the rows of one department shard in a worker process.
+    Instructor IDs are scoped per department, so the shards a worker cleans can share its
+    matcher: instructors created for one department are never matched in another.
+
+    :param positioned_rows: The shard's (position, row) tuples.
+    :return: A tuple of (list of (position, Section), list of (position, new instructor)).
+    """
+    matcher = worker_matcher
+    matcher.pending = []
+    pending_positions = []
+    cleaned = list(clean_rows(positioned_rows, matcher, pending_positions))
+    return cleaned, list(zip(pending_positions, matcher.pending))
+
+
+def load_changed_departments(changed_file):
+    """
+    Reads the subjects recorded as changed by scraper.record_changed_subjects. A subject
+    code is the department code of its courses.
+
+    :param changed_file: The JSON file written by the scraper.
+    :return: A set of department codes, or None if the file does not exist.
+    """
+    if not os.path.exists(changed_file):
+        return None
+    with open(changed_file, 'r') as file:
+        return set(json.load(file))
+
+
+def reuse_unchanged_sections(positioned_rows, previous_file, changed_depts):
+    """
+    Splits kept raw rows into the rows to clean and the previously cleaned sections of the
+    unchanged departments. An unchanged department has the same course rows as when
+    previous_file was written, so its sections are taken over in order and given the
+    positions of its course rows. A department is cleaned again if it changed or if its
+    number of sections in previous_file does not match its course rows.
+
+    :param positioned_rows: A list of (position, row) tuples from iter_kept_rows.
+    :param previous_file: The new_instance.csv written by the previous run.
+    :param changed_depts: The set of departments whose raw rows changed since then.
+    :return: A tuple of (list of (position, row) tuples to clean, list of (position, Section)
+             tuples reused), both in raw file order.
+    """
+    if not os.path.exists(previous_file):
+        return positioned_rows, []
+    previous = {}
+    with open(previous_file, 'r', newline='') as file:
+        reader = csv.reader(file)
+        if next(reader, None) != FIELDNAMES:  # Written before a column was added
+            return positioned_rows, []
+        for values in reader:
+            previous.setdefault(values[1], []).append(values)
+
+    to_clean, reused = [], []
+    for department, shard in shard_by_department(positioned_rows).items():
+        positions = [position for position, row in shard
+                     if row['modality'] != '* Additional Times *']
+        sections = previous.get(department, [])
+        if department in changed_depts or len(sections) != len(positions):
+            to_clean.extend(shard)
+        else:
+            reused.extend(zip(positions, (Section(*values) for values in sections)))
+    return sorted(to_clean, key=itemgetter(0)), sorted(reused, key=itemgetter(0))
+
+
+def process_csv(input_filename, output_filename, instructors_file, workers=1,
+                changed_depts=None):
+    """
+    Processes the raw CSV file and outputs a cleaned and standardized version.
+    This method reads course data, standardizes and enriches it with instructor IDs,
+    modality abbreviations, and corrects any inconsistencies in time and location data.
+    Instructors that match no existing instructor are added to the instructor file in one
+    batch at the end.
+
+    With more than one worker, the rows are split by department and cleaned in a process
+    pool. The shards are merged back in raw file order, so the output and the new instructors
+    are byte-identical to serial mode.
+
+    Given the departments that changed since output_filename was written, only those are
+    cleaned again; the sections of the others are read back from output_filename by
+    reuse_unchanged_sections. Instructor IDs are scoped per department, so the output is
+    the same as a full clean.
+
+    :param input_filename: The file path of the raw CSV file containing course data.
+    :param output_filename: The file path where the processed data will be saved.
+    :param instructors_file: The file path of the CSV file containing instructor data.
+    :param workers: The number of worker processes; 1 cleans the rows in this process.
+    :param changed_depts: Optional set of departments changed since the previous run; every
+                          department is cleaned if omitted.
+    """
+    with instrumentation.timer('read_raw'):
+        with open(input_filename, 'r') as infile:
+            positioned_rows = list(iter_kept_rows(csv.DictReader(infile)))
+    instrumentation.count('rows_in', len(positioned_rows))
+    instrumentation.file_read(input_filename)
+
+    reused = []
+    if changed_depts is not None:
+        with instrumentation.timer('reuse_unchanged'):
+            positioned_rows, reused = reuse_unchanged_sections(
+                positioned_rows, output_filename, changed_depts)
+        instrumentation.count('sections_reused', len(reused))
+
+    with instrumentation.timer('load_instructors'):
+        matcher = InstructorMatcher.from_csv(instructors_file)
+    if workers > 1:
+        with instrumentation.timer('clean_parallel', workers=workers):
+            shards = list(shard_by_department(positioned_rows).values())
+            with ProcessPoolExecutor(max_workers=workers, initializer=load_worker_matcher,
+                                     initargs=(instructors_file,)) as executor:
+                results = list(executor.map(clean_shard, shards,
+                                            chunksize=max(1, len(shards) // (workers * 4))))
+            cleaned = sorted(row for shard_rows, _ in results for row in shard_rows)
+            pending = sorted(record for _, shard_pending in results for record in shard_pending)
+            matcher.pending = [instructor for _, instructor in pending]
+    else:
+        cleaned = clean_rows(positioned_rows, matcher, [])
+    if reused:
+        cleaned = heapq.merge(cleaned, reused, key=itemgetter(0))
+
+    # In serial mode the rows are cleaned as they are written, so this also times the cleaning
+    rows_out = 0
+    with instrumentation.timer('clean_and_write'):
+        with open(output_filename, 'w', newline='') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(FIELDNAMES)
+            for _, row in cleaned:
+                writer.writerow(section_values(row))
+                rows_out += 1
+    instrumentation.count('rows_out', rows_out)
+    instrumentation.file_written(output_filename)
+
+    instrumentation.count('new_instructors', len(matcher.pending))
+    matcher.flush(instructors_file)
 
 
 def main():
-    process_csv('raw_data/offered_raw.csv',
-                'cleaned_data/new_instance.csv', 'cleaned_data/instructor.csv')
+    changed_file = 'raw_data/changed_subjects.json'
+    with instrumentation.stage_metrics('new_cleaner'):
+        changed_depts = load_changed_departments(changed_file)
+        process_csv('raw_data/offered_raw.csv', 'cleaned_data/new_instance.csv',
+                    'cleaned_data/instructor.csv', changed_depts=changed_depts)
+    if changed_depts is not None:
+        os.remove(changed_file)  # Cleaned; the next scrape records its own changes
 
 
 if __name__ == "__main__":
@@ -1,32 +1,172 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+import instrumentation
+from section_stats import (STAT_COLUMNS, VALUES_COLUMN, build_section_state, build_section_stats,
+                           finalize_section_state, merge_value_counts)
+
+# Aggregated columns holding per-section averages, rounded once after the groupby
+MEAN_COLUMNS = ['gpa', 'enrollment', 'withdraw']
+
+# Distribution columns behind each averaged column, used by the mergeable partial aggregates
+MEAN_SOURCES = {'gpa': 'GPA', 'enrollment': 'Graded Enrollment', 'withdraw': 'Withdraws'}
+
+# Rows per chunk read by the streaming pipeline
+CHUNK_SIZE = 200_000
+
+# Column types of distribution.csv. The text columns repeat a few thousand distinct values
+# over the whole history, so they are read as categoricals; the other columns are inferred.
+DISTRIBUTION_DTYPES = {
+    'Academic Year': 'category',
+    'Term': 'category',
+    'Subject': 'category',
+    'Course Title': 'category',
+    'Instructor': 'category',
+    'GPA': 'float64'
+}
+
+# Integer columns only used as keys or counted, downcast to the smallest integer type
+DOWNCAST_COLUMNS = ['Course No.', 'CRN']
+
+# Key column and descriptive columns of each aggregate table kept in the aggregate state
+AGGREGATE_TABLES = {
+    'dept': ('dept_id', []),
+    'instructor': ('instructor_id', ['last_name', 'dept']),
+    'course': ('course_id', ['dept', 'title', 'credits']),
+    'instructor_course_stats': ('stat_id', ['course_id', 'instructor_id'])
+}
+
+
+def load_distribution(distribution_file):
+    """
+    Loads the raw grade distribution and derives the composite keys used by every stage.
+    The text columns are read as categoricals (DISTRIBUTION_DTYPES), and the returned DataFrame
+    carries 'course_id' and 'instructor_id' columns so that later stages can work on it without
+    re-reading the file or rebuilding the keys.
+    :param distribution_file: File path for the CSV containing distribution data.
+    :return: A pandas DataFrame with the distribution data and derived key columns.
+    """
+    return add_distribution_keys(pd.read_csv(distribution_file, dtype=DISTRIBUTION_DTYPES))
 
 
-def create_dept_csv(distribution_file, offered_dept_file, output_file):
+def iter_distribution_chunks(distribution_file, chunksize=CHUNK_SIZE):
     """
-    Creates and saves a CSV file with departmental data.
+    Reads the raw grade distribution in chunks, deriving the same key columns as load_distribution.
     :param distribution_file: File path for the CSV containing distribution data.
-    :param offered_dept_file: File path for the CSV containing offered department data.
-    :param output_file: File path for the output CSV file.
+    :param chunksize: The number of rows per chunk.
+    :return: A generator of DataFrames with the distribution data and derived key columns.
+    """
+    for chunk in pd.read_csv(distribution_file, dtype=DISTRIBUTION_DTYPES, chunksize=chunksize):
+        yield add_distribution_keys(chunk)
+
+
+def add_distribution_keys(df):
+    """
+    Adds the 'course_id' and 'instructor_id' columns to distribution data as categoricals,
+    and downcasts the integer key columns.
+    :param df: A DataFrame of raw distribution rows.
+    :return: The same DataFrame with the key columns added.
+    """
+    for column in DOWNCAST_COLUMNS:
+        if pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+    df['course_id'] = categorical_key(
+        df, ['Subject', 'Course No.'], lambda subject, number: subject + ' ' + number.astype(str))
+    df['instructor_id'] = categorical_key(
+        df, ['Instructor', 'Subject'], lambda name, subject: name + ' (' + subject + ')')
+    return df
+
+
+def categorical_key(df, columns, label):
+    """
+    Builds a composite key column as a categorical instead of one concatenated string per row.
+    Rows are numbered by their combination of the columns' values, the key strings are built
+    by label once per distinct combination, and each row only stores the integer code of its
+    key. Categories are sorted, so groupbys on the key keep the order of string keys, and a
+    combination whose label is missing (e.g., no instructor) gets a missing key.
+
+    :param df: The DataFrame holding the columns.
+    :param columns: The columns the key is made of.
+    :param label: A function building the key strings from one Series per column, holding the
+                  values of each distinct combination.
+    :return: A pandas Categorical with one key per row of df.
+    """
+    combined = np.zeros(len(df), dtype='int64')
+    uniques = []
+    for column in columns:
+        codes, values = pd.factorize(df[column], use_na_sentinel=False)
+        combined = combined * len(values) + codes
+        uniques.append(np.asarray(values))
+
+    codes, combinations = pd.factorize(combined)
+    parts = []
+    for values in reversed(uniques):
+        combinations, value_codes = np.divmod(combinations, len(values))
+        parts.insert(0, pd.Series(values[value_codes]))
+
+    label_codes, categories = pd.factorize(label(*parts))
+    key = pd.Categorical.from_codes(label_codes[codes], categories=categories)
+    return key.reorder_categories(categories.sort_values())
+
+
+def decategorize(df):
+    """
+    Converts the categorical columns and index levels of an aggregated table to object dtype,
+    so it is joined, merged and written like a table aggregated from string columns.
+
+    :param df: A DataFrame grouped from the categorical distribution data.
+    :return: The DataFrame with object columns and index.
     """
-    # Load data from CSV files
-    distribution_df = pd.read_csv(distribution_file)
-    offered_dept_df = pd.read_csv(offered_dept_file)
+    df = df.astype({column: object for column, dtype in df.dtypes.items()
+                    if isinstance(dtype, pd.CategoricalDtype)})
+    if isinstance(df.index, pd.MultiIndex):
+        df.index = df.index.set_levels([level.astype(object) for level in df.index.levels])
+    elif isinstance(df.index, pd.CategoricalIndex):
+        df.index = df.index.astype(object)
+    return df
 
+
+def build_dept_data(distribution_df, offered_dept_df):
+    """
+    Aggregates departmental data from the loaded distribution data.
+    :param distribution_df: DataFrame returned by load_distribution.
+    :param offered_dept_df: DataFrame containing offered department data.
+    :return: A DataFrame with one row per department.
+    """
+    return merge_offered_depts(aggregate_dept_data(distribution_df), offered_dept_df)
+
+
+def aggregate_dept_data(distribution_df):
+    """
+    Aggregates the departments present in the loaded distribution data.
+    :param distribution_df: DataFrame returned by load_distribution.
+    :return: A DataFrame with one row per department in the data, sorted by 'dept_id'.
+    """
     # Process and aggregate department data
-    dept_data = distribution_df.groupby('Subject').agg({
-        'GPA': lambda x: round(x.mean(), 2),
-        'Subject': 'count',
-        'Course No.': pd.Series.nunique
-    }).rename(columns={
-        'GPA': 'gpa',
-        'Subject': 'past_classes',
-        'Course No.': 'unique_classes'
-    })
+    dept_data = decategorize(distribution_df.groupby('Subject', observed=True).agg(
+        gpa=('GPA', 'mean'),
+        past_classes=('Subject', 'count'),
+        unique_classes=('Course No.', 'nunique')
+    ))
+    dept_data['gpa'] = dept_data['gpa'].round(2)
     dept_data['new_classes'] = 0
 
-    # Reset index and merge with offered department data
+    # Reset index
     dept_data.reset_index(inplace=True)
     dept_data.rename(columns={'Subject': 'dept_id'}, inplace=True)
+    return dept_data
+
+
+def merge_offered_depts(dept_data, offered_dept_df):
+    """
+    Adds department titles to aggregated department data, marking departments that are no
+    longer offered as 'Discontinued' and adding empty rows for offered departments with no data.
+    :param dept_data: DataFrame returned by aggregate_dept_data.
+    :param offered_dept_df: DataFrame containing offered department data.
+    :return: A DataFrame with one row per department.
+    """
+    # Merge with offered department data
     dept_data = dept_data.merge(offered_dept_df, on='dept_id', how='left')
     dept_data['title'] = dept_data['title'].fillna('Discontinued')
 
@@ -42,9 +182,18 @@ def create_dept_csv(distribution_file, offered_dept_file, output_file):
         'unique_classes': 0
     } for _, row in missing_depts.iterrows()])
 
-    dept_data = pd.concat([dept_data, missing_dept_data], ignore_index=True)
+    return pd.concat([dept_data, missing_dept_data], ignore_index=True)
+
 
-    # Save processed data to CSV
+def create_dept_csv(distribution_file, offered_dept_file, output_file):
+    """
+    Creates and saves a CSV file with departmental data.
+    :param distribution_file: File path for the CSV containing distribution data.
+    :param offered_dept_file: File path for the CSV containing offered department data.
+    :param output_file: File path for the output CSV file.
+    """
+    dept_data = build_dept_data(load_distribution(distribution_file),
+                                pd.read_csv(offered_dept_file))
     dept_data.to_csv(output_file, index=False)
 
 
@@ -58,80 +207,84 @@ def load_valid_depts(dept_file):
     return set(dept_df['dept_id'])
 
 
-def create_instructor_csv(input_file, output_file, valid_depts):
+def build_instructor_data(distribution_df, valid_depts):
     """
-    Creates and saves a CSV file with instructor data.
-    :param input_file: File path for the CSV file containing raw data.
-    :param output_file: File path for the output CSV file.
+    Aggregates instructor data from the loaded distribution data.
+    :param distribution_df: DataFrame returned by load_distribution.
     :param valid_depts: Set of valid department IDs to filter data.
+    :return: A DataFrame with one row per instructor.
     """
-    df = pd.read_csv(input_file)
-    df['instructor_id'] = df['Instructor'] + ' (' + df['Subject'] + ')'
-    df = df[df['Subject'].isin(valid_depts)]
+    df = distribution_df[distribution_df['Subject'].isin(valid_depts)]
 
     # Process and aggregate instructor data
-    instructor_data = df.groupby('instructor_id').agg({
-        'Instructor': 'first',
-        'Subject': 'first',
-        'GPA': lambda x: round(x.mean(), 2),
-        'Graded Enrollment': lambda x: round(x.mean(), 2),
-        'Withdraws': lambda x: round(x.mean(), 2),
-        'CRN': 'count'
-    }).rename(columns={
-        'Instructor': 'last_name',
-        'Subject': 'dept',
-        'GPA': 'gpa',
-        'Graded Enrollment': 'enrollment',
-        'Withdraws': 'withdraw',
-        'CRN': 'past_classes'
-    })
+    instructor_data = decategorize(df.groupby('instructor_id', observed=True).agg(
+        last_name=('Instructor', 'first'),
+        dept=('Subject', 'first'),
+        gpa=('GPA', 'mean'),
+        enrollment=('Graded Enrollment', 'mean'),
+        withdraw=('Withdraws', 'mean'),
+        past_classes=('CRN', 'count')
+    ))
+    instructor_data[MEAN_COLUMNS] = instructor_data[MEAN_COLUMNS].round(2)
     instructor_data['new_classes'] = 0
 
-    # Reset index and save data to CSV
-    instructor_data.reset_index(inplace=True)
-    instructor_data.to_csv(output_file, index=False)
+    return instructor_data.reset_index()
 
 
-def create_course_csv(input_file, output_file, valid_depts):
+def create_instructor_csv(input_file, output_file, valid_depts):
     """
-    Creates and saves a CSV file with course data.
+    Creates and saves a CSV file with instructor data.
     :param input_file: File path for the CSV file containing raw data.
     :param output_file: File path for the output CSV file.
     :param valid_depts: Set of valid department IDs to filter data.
     """
-    df = pd.read_csv(input_file)
-    df['course_id'] = df['Subject'] + ' ' + df['Course No.'].astype(str)
-    df = df[df['Subject'].isin(valid_depts)]
+    instructor_data = build_instructor_data(
+        load_distribution(input_file), valid_depts)
+    instructor_data.to_csv(output_file, index=False)
 
-    # Custom function to determine the course title
-    def determine_title(titles):
-        if len(titles.unique()) > 1:
-            return 'Special Study'
-        else:
-            return titles.iloc[0]
+
+def build_course_data(distribution_df, valid_depts):
+    """
+    Aggregates course data from the loaded distribution data, including the
+    enrollment-weighted GPA statistics of section_stats.build_section_stats.
+    :param distribution_df: DataFrame returned by load_distribution.
+    :param valid_depts: Set of valid department IDs to filter data.
+    :return: A DataFrame with one row per course.
+    """
+    df = distribution_df[distribution_df['Subject'].isin(valid_depts)]
 
     # Process and aggregate course data
-    course_data = df.groupby('course_id').agg({
-        'Subject': 'first',
-        'Course Title': determine_title,  # Use the custom function here
-        'Credits': 'first',
-        'GPA': lambda x: round(x.mean(), 2),
-        'Graded Enrollment': lambda x: round(x.mean(), 2),
-        'Withdraws': lambda x: round(x.mean(), 2),
-        'CRN': 'count'
-    }).rename(columns={
-        'Subject': 'dept',
-        'Course Title': 'title',
-        'Credits': 'credits',
-        'GPA': 'gpa',
-        'Graded Enrollment': 'enrollment',
-        'Withdraws': 'withdraw',
-        'CRN': 'past_classes'
-    })
+    course_data = decategorize(df.groupby('course_id', observed=True).agg(
+        dept=('Subject', 'first'),
+        title=('Course Title', 'first'),
+        title_count=('Course Title', 'nunique'),
+        credits=('Credits', 'first'),
+        gpa=('GPA', 'mean'),
+        enrollment=('Graded Enrollment', 'mean'),
+        withdraw=('Withdraws', 'mean'),
+        past_classes=('CRN', 'count')
+    ))
+    course_data[MEAN_COLUMNS] = course_data[MEAN_COLUMNS].round(2)
+
+    # Courses offered under more than one title are grouped as special studies
+    course_data['title'] = course_data['title'].mask(
+        course_data.pop('title_count') > 1, 'Special Study')
     course_data['new_classes'] = 0
 
-    # Reset index and save data to CSV
-    course_data.reset_index(inplace=True)
+    # Enrollment-weighted GPA statistics, stored after the existing columns
+    course_data = course_data.join(decategorize(build_section_stats(df, 'course_id')))
+
+    return course_data.reset_index()
+
+
+def create_course_csv(input_file, output_file, valid_depts):
+    """
+    Creates and saves a CSV file with course data.
+    :param input_file: File path for the CSV file containing raw data.
+    :param output_file: File path for the output CSV file.
+    :param valid_depts: Set of valid department IDs to filter data.
+    """
+    course_data = build_course_data(load_distribution(input_file), valid_depts)
     course_data.to_csv(output_file, index=False)
 
 
@@ -146,6 +299,34 @@ def load_valid_ids(file_path, column_name):
     return set(df[column_name])
 
 
+def build_past_instance_data(distribution_df, valid_course_ids, valid_instructor_ids):
+    """
+    Selects past course instance data from the loaded distribution data.
+    :param distribution_df: DataFrame returned by load_distribution.
+    :param valid_course_ids: Set of valid course IDs to filter data.
+    :param valid_instructor_ids: Set of valid instructor IDs to filter data.
+    :return: A DataFrame with one row per past course instance.
+    """
+    # Filter based on valid foreign keys
+    df = distribution_df[distribution_df['course_id'].isin(valid_course_ids) &
+                         distribution_df['instructor_id'].isin(valid_instructor_ids)]
+
+    # Instance IDs are nearly unique per row, so they are only built for the kept rows
+    df = df.assign(instance_id=df['Academic Year'].astype(object) +
+                   df['Term'].astype(object) + df['CRN'].astype(str))
+
+    return df[['instance_id', 'course_id', 'instructor_id',
+               'Academic Year', 'Term', 'CRN', 'GPA',
+               'Withdraws', 'Graded Enrollment']].rename(columns={
+                   'Academic Year': 'year',
+                   'Term': 'term',
+                   'CRN': 'crn',
+                   'GPA': 'gpa',
+                   'Withdraws': 'withdraw',
+                   'Graded Enrollment': 'enrollment'
+               })
+
+
 def create_past_instance_csv(input_file, course_file, instructor_file, output_file):
     """
     Creates and saves a CSV file with past course instance data.
@@ -154,36 +335,51 @@ def create_past_instance_csv(input_file, course_file, instructor_file, output_fi
     :param instructor_file: File path for the CSV file containing instructor data.
     :param output_file: File path for the output CSV file.
     """
-    df = pd.read_csv(input_file)
+    past_instance_data = build_past_instance_data(
+        load_distribution(input_file),
+        load_valid_ids(course_file, 'course_id'),
+        load_valid_ids(instructor_file, 'instructor_id'))
+    past_instance_data.to_csv(output_file, index=False)
 
-    # Load valid foreign keys
-    valid_course_ids = load_valid_ids(course_file, 'course_id')
-    valid_instructor_ids = load_valid_ids(instructor_file, 'instructor_id')
 
-    # Create 'instance_id', 'course_id', and 'instructor_id'
-    df['instance_id'] = df['Academic Year'] + \
-        df['Term'] + df['CRN'].astype(str)
-    df['course_id'] = df['Subject'] + ' ' + df['Course No.'].astype(str)
-    df['instructor_id'] = df['Instructor'] + ' (' + df['Subject'] + ')'
+def build_instructor_course_stats_data(distribution_df, valid_course_ids, valid_instructor_ids):
+    """
+    Calculates average GPA, enrollment, and withdrawals for each course taught by each
+    instructor from the loaded distribution data, followed by the enrollment-weighted GPA
+    statistics of section_stats.build_section_stats.
+
+    :param distribution_df: DataFrame returned by load_distribution.
+    :param valid_course_ids: Set of valid course IDs to filter data.
+    :param valid_instructor_ids: Set of valid instructor IDs to filter data.
+    :return: A DataFrame with one row per instructor-course combination.
+    """
+    # Filter out invalid course and instructor IDs
+    df = distribution_df[distribution_df['course_id'].isin(valid_course_ids) &
+                         distribution_df['instructor_id'].isin(valid_instructor_ids)]
 
-    # Filter based on valid foreign keys
-    df = df[df['course_id'].isin(valid_course_ids) &
-            df['instructor_id'].isin(valid_instructor_ids)]
-
-    # Prepare and save past instance data
-    past_instance_data = df[['instance_id', 'course_id', 'instructor_id',
-                             'Academic Year', 'Term', 'CRN', 'GPA',
-                             'Withdraws', 'Graded Enrollment']].rename(columns={
-                                 'Academic Year': 'year',
-                                 'Term': 'term',
-                                 'CRN': 'crn',
-                                 'GPA': 'gpa',
-                                 'Withdraws': 'withdraw',
-                                 'Graded Enrollment': 'enrollment'
-                             })
-
-    # Write to CSV
-    past_instance_data.to_csv(output_file, index=False)
+    # Aggregate data to calculate statistics for each instructor-course pair
+    instructor_course_stats = df.groupby(['instructor_id', 'course_id'], observed=True).agg(
+        gpa=('GPA', 'mean'),
+        enrollment=('Graded Enrollment', 'mean'),
+        withdraw=('Withdraws', 'mean'),
+        past_classes=('CRN', 'count')  # Count the number of instances
+    ).reset_index()
+    instructor_course_stats = decategorize(instructor_course_stats)
+    instructor_course_stats[MEAN_COLUMNS] = instructor_course_stats[MEAN_COLUMNS].round(2)
+
+    # Generate a unique statistic ID for each instructor-course pair
+    instructor_course_stats['stat_id'] = instructor_course_stats['instructor_id'] + \
+        ' ' + instructor_course_stats['course_id']
+
+    # Enrollment-weighted GPA statistics, stored after the existing columns
+    section_stats = decategorize(build_section_stats(df, ['instructor_id', 'course_id']))
+    instructor_course_stats = instructor_course_stats.join(
+        section_stats, on=['instructor_id', 'course_id'])
+
+    # Rearrange the columns for clearer presentation
+    return instructor_course_stats[[
+        'stat_id', 'course_id', 'instructor_id', 'gpa', 'enrollment', 'withdraw', 'past_classes'] +
+        STAT_COLUMNS]
 
 
 def create_instructor_course_stats_csv(input_file, course_file, instructor_file, output_file):
@@ -197,63 +393,431 @@ def create_instructor_course_stats_csv(input_file, course_file, instructor_file,
     :param instructor_file: File path for the CSV file containing instructor data.
     :param output_file: File path for the output CSV file.
     """
-    df = pd.read_csv(input_file)
+    instructor_course_stats = build_instructor_course_stats_data(
+        load_distribution(input_file),
+        load_valid_ids(course_file, 'course_id'),
+        load_valid_ids(instructor_file, 'instructor_id'))
+    instructor_course_stats.to_csv(output_file, index=False)
 
-    # Load valid course and instructor IDs to ensure data integrity
-    valid_course_ids = load_valid_ids(course_file, 'course_id')
-    valid_instructor_ids = load_valid_ids(instructor_file, 'instructor_id')
 
-    # Generate 'course_id' and 'instructor_id' for each entry in the dataframe
-    df['course_id'] = df['Subject'] + ' ' + df['Course No.'].astype(str)
-    df['instructor_id'] = df['Instructor'] + ' (' + df['Subject'] + ')'
+def build_partial_aggregates(df, key, first_columns, count_column='CRN'):
+    """
+    Computes mergeable sum/count aggregates per key.
+    Unlike the rounded means written to cleaned_data, these partials can be added together
+    across terms and turned back into means with finalize_partial_aggregates.
+
+    :param df: DataFrame returned by load_distribution.
+    :param key: Column (or list of columns) to group by.
+    :param first_columns: Mapping of output column name to the source column of a descriptive field.
+    :param count_column: Column counted to produce 'past_classes'.
+    :return: A DataFrame indexed by key with descriptive, '_sum', '_count' and 'past_classes' columns.
+    """
+    aggregations = {name: (column, 'first')
+                    for name, column in first_columns.items()}
+    for name, column in MEAN_SOURCES.items():
+        aggregations[f'{name}_sum'] = (column, 'sum')
+        aggregations[f'{name}_count'] = (column, 'count')
+    aggregations['past_classes'] = (count_column, 'count')
+    return decategorize(df.groupby(key, observed=True).agg(**aggregations))
 
-    # Filter out invalid course and instructor IDs
-    df = df[df['course_id'].isin(valid_course_ids) &
-            df['instructor_id'].isin(valid_instructor_ids)]
 
-    # Aggregate data to calculate statistics for each instructor-course pair
-    instructor_course_stats = df.groupby(['instructor_id', 'course_id']).agg({
-        'GPA': lambda x: round(x.mean(), 2),  # Calculate average GPA
-        # Calculate average graded enrollment
-        'Graded Enrollment': lambda x: round(x.mean(), 2),
-        # Calculate average number of withdrawals
-        'Withdraws': lambda x: round(x.mean(), 2),
-        'CRN': 'count'  # Count the number of instances
-    }).rename(columns={
-        'GPA': 'gpa',
-        'Graded Enrollment': 'enrollment',
-        'Withdraws': 'withdraw',
-        'CRN': 'past_classes'
-    }).reset_index()
+def merge_partial_aggregates(left, right):
+    """
+    Adds two sets of partial aggregates together.
+    Sums and counts are added per key, and so are the value counts of '_values' columns
+    (section_stats.merge_value_counts); descriptive fields keep the value from left and are only taken from right
+    for keys that left does not have yet.
+
+    :param left: Partial aggregates returned by build_partial_aggregates.
+    :param right: Partial aggregates over the same key, e.g. for a new term.
+    :return: The merged partial aggregates.
+    """
+    count_columns = [column for column in left.columns
+                     if column.endswith('_count') or column == 'past_classes']
+    additive_columns = [column for column in left.columns
+                        if column.endswith('_sum')] + count_columns
 
-    # Generate a unique statistic ID for each instructor-course pair
-    instructor_course_stats['stat_id'] = instructor_course_stats['instructor_id'] + \
-        ' ' + instructor_course_stats['course_id']
+    merged = left.combine_first(right)
+    merged[additive_columns] = left[additive_columns].add(
+        right[additive_columns], fill_value=0).reindex(merged.index)
+    merged[count_columns] = merged[count_columns].astype('int64')
+    for column in [column for column in left.columns if column.endswith('_values')]:
+        merged[column] = merge_value_counts(left[column], right[column]).reindex(merged.index)
+    return merged[left.columns]
 
-    # Rearrange the columns for clearer presentation
-    instructor_course_stats = instructor_course_stats[[
-        'stat_id', 'course_id', 'instructor_id', 'gpa', 'enrollment', 'withdraw', 'past_classes']]
 
-    # Write the processed data to a CSV file
-    instructor_course_stats.to_csv(output_file, index=False)
+def finalize_partial_aggregates(partial):
+    """
+    Turns partial aggregates back into the rounded means stored in cleaned_data.
+
+    :param partial: Partial aggregates returned by build_partial_aggregates.
+    :return: A DataFrame with the descriptive columns, rounded means and 'past_classes'.
+    """
+    descriptive_columns = [column for column in partial.columns
+                           if not column.endswith(('_sum', '_count', '_values'))
+                           and column != 'past_classes']
+    result = partial[descriptive_columns].copy()
+    for name in MEAN_SOURCES:
+        result[name] = (partial[f'{name}_sum'] /
+                        partial[f'{name}_count']).round(2)
+    result['past_classes'] = partial['past_classes']
+    return result
+
+
+def merge_aggregate_state(state, new_state):
+    """
+    Merges the partial aggregates of newly loaded data into an existing aggregate state.
+    A course whose title differs between the two is grouped as a special study, matching
+    how build_course_data treats courses offered under more than one title.
+
+    :param state: Dictionary returned by build_aggregate_state or load_aggregate_state.
+    :param new_state: Dictionary returned by build_aggregate_state for the new data.
+    :return: The merged aggregate state.
+    """
+    merged = {table: merge_partial_aggregates(state[table], new_state[table])
+              for table in state}
+
+    course_index = merged['course'].index
+    titles = state['course']['title'].reindex(course_index)
+    new_titles = new_state['course']['title'].reindex(course_index)
+    changed = titles.notna() & new_titles.notna() & (titles != new_titles)
+    merged['course'].loc[changed, 'title'] = 'Special Study'
+    return merged
+
+
+def build_aggregate_state(distribution_df):
+    """
+    Builds the partial aggregates behind dept.csv, instructor.csv, course.csv and
+    instructor_course_stats.csv, keyed by each table's ID column.
+    Courses taught under more than one title within distribution_df get the title 'Special Study'.
+    The course and instructor_course_stats partials also carry the section state of
+    section_stats.build_section_state, so their section statistics can be updated per key.
+
+    :param distribution_df: DataFrame returned by load_distribution.
+    :return: A dictionary mapping table name to its partial aggregates.
+    """
+    df = distribution_df.assign(stat_id=categorical_key(
+        distribution_df, ['instructor_id', 'course_id'],
+        lambda instructor_id, course_id: instructor_id + ' ' + course_id))
+
+    course_state = build_partial_aggregates(df, 'course_id', {
+        'dept': 'Subject', 'title': 'Course Title', 'credits': 'Credits'})
+    title_counts = df.groupby('course_id', observed=True)['Course Title'].nunique()
+    title_counts.index = title_counts.index.astype(object)
+    course_state['title'] = course_state['title'].mask(
+        title_counts.reindex(course_state.index) > 1, 'Special Study')
+
+    state = {
+        'dept': build_partial_aggregates(df, 'Subject', {}, count_column='Subject'),
+        'instructor': build_partial_aggregates(df, 'instructor_id', {
+            'last_name': 'Instructor', 'dept': 'Subject'}),
+        'course': course_state.join(decategorize(build_section_state(df, 'course_id'))),
+        'instructor_course_stats': build_partial_aggregates(df, 'stat_id', {
+            'course_id': 'course_id', 'instructor_id': 'instructor_id'}).join(
+                decategorize(build_section_state(df, 'stat_id')))
+    }
+    for table, (key, _) in AGGREGATE_TABLES.items():
+        state[table].index.name = key
+    return state
+
+
+def save_aggregate_state(state, terms, state_folder):
+    """
+    Saves the partial aggregates and the list of loaded terms to the state folder.
+
+    :param state: Dictionary returned by build_aggregate_state.
+    :param terms: DataFrame with the 'year' and 'term' of every loaded term.
+    :param state_folder: Folder the state CSV files are written to.
+    """
+    os.makedirs(state_folder, exist_ok=True)
+    for table, partial in state.items():
+        partial.to_csv(os.path.join(state_folder, f'{table}.csv'))
+    terms.to_csv(os.path.join(state_folder, 'terms.csv'), index=False)
+
+
+def load_aggregate_state(state_folder):
+    """
+    Loads the partial aggregates and loaded terms saved by save_aggregate_state.
+
+    :param state_folder: Folder containing the state CSV files.
+    :return: A tuple of (state dictionary, terms DataFrame), or None if no state has been saved.
+    """
+    if not os.path.exists(os.path.join(state_folder, 'terms.csv')):
+        return None
+    state = {table: pd.read_csv(os.path.join(state_folder, f'{table}.csv'), index_col=key,
+                                dtype={VALUES_COLUMN: str})
+             for table, (key, _) in AGGREGATE_TABLES.items()}
+    terms = pd.read_csv(os.path.join(state_folder, 'terms.csv'))
+    return state, terms
+
+
+def loaded_terms(distribution_df):
+    """
+    Lists the distinct academic year and term pairs in the distribution data.
+
+    :param distribution_df: DataFrame returned by load_distribution.
+    :return: A DataFrame with 'year' and 'term' columns.
+    """
+    return decategorize(distribution_df[['Academic Year', 'Term']].drop_duplicates().rename(
+        columns={'Academic Year': 'year', 'Term': 'term'}).reset_index(drop=True))
+
+
+def build_tables_from_state(state, offered_dept_df):
+    """
+    Builds the dept, instructor, course and instructor_course_stats tables from an aggregate
+    state, with the same columns and row order as the build_*_data functions. The section_stats
+    columns of course and instructor_course_stats come from the section state the partials carry.
+
+    :param state: Dictionary returned by build_aggregate_state or merge_aggregate_state.
+    :param offered_dept_df: DataFrame containing offered department data.
+    :return: A dictionary mapping table name to its DataFrame.
+    """
+    tables = {table: finalize_partial_aggregates(state[table]) for table in state}
+
+    tables['instructor']['new_classes'] = 0
+    tables['course']['new_classes'] = 0
+    for table in ('course', 'instructor_course_stats'):
+        tables[table] = tables[table].join(finalize_section_state(state[table]))
+    tables = {table: data.sort_index().reset_index() for table, data in tables.items()}
+    course_data = tables['course']
+
+    instructor_course_stats = tables['instructor_course_stats'].sort_values(
+        ['instructor_id', 'course_id'], ignore_index=True)
+    tables['instructor_course_stats'] = instructor_course_stats[[
+        'stat_id', 'course_id', 'instructor_id', 'gpa', 'enrollment', 'withdraw', 'past_classes'] +
+        STAT_COLUMNS]
+
+    dept_data = tables['dept'][['dept_id', 'gpa', 'past_classes']].copy()
+    unique_classes = course_data.groupby('dept').size()
+    dept_data['unique_classes'] = unique_classes.reindex(
+        dept_data['dept_id']).fillna(0).astype('int64').values
+    dept_data['new_classes'] = 0
+    dept_data = dept_data.merge(offered_dept_df, on='dept_id', how='left')
+    dept_data['title'] = dept_data['title'].fillna('Discontinued')
+
+    missing_depts = offered_dept_df[~offered_dept_df['dept_id'].isin(
+        dept_data['dept_id'])]
+    missing_dept_data = pd.DataFrame({
+        'dept_id': missing_depts['dept_id'],
+        'title': missing_depts['title'],
+        'gpa': 0,
+        'past_classes': 0,
+        'new_classes': 0,
+        'unique_classes': 0
+    })
+    tables['dept'] = pd.concat([dept_data, missing_dept_data], ignore_index=True)
+    return tables
+
+
+def run_streaming_pipeline(distribution_file, offered_dept_file, output_folder, state_folder=None,
+                           chunksize=CHUNK_SIZE):
+    """
+    Runs every past_cleaner stage while holding only one chunk of the distribution in memory.
+    Each chunk is reduced to mergeable sum/count aggregates and its past instances are appended
+    to past_instance.csv, so peak memory depends on the chunk size and the number of distinct
+    keys rather than on the length of the history. Means match run_pipeline up to rounding of
+    values that fall exactly on a half-cent. The section_stats columns are finalized from the
+    merged section state, whose GPA counts stay bounded by the distinct two-decimal GPAs per key.
+
+    :param distribution_file: File path for the CSV containing distribution data.
+    :param offered_dept_file: File path for the CSV containing offered department data.
+    :param output_folder: Folder the cleaned CSV files are written to.
+    :param state_folder: Optional folder for the partial aggregates used by ingest_term.py.
+    :param chunksize: The number of distribution rows processed at a time.
+    """
+    past_instance_file = os.path.join(output_folder, 'past_instance.csv')
+    state = None
+    terms = []
+    for i, chunk in enumerate(iter_distribution_chunks(distribution_file, chunksize)):
+        chunk_state = build_aggregate_state(chunk)
+        state = chunk_state if state is None else merge_aggregate_state(
+            state, chunk_state)
+        terms.append(loaded_terms(chunk))
+
+        # Every course and instructor in the data becomes a row of course.csv and
+        # instructor.csv, so a past instance is kept whenever both of its keys are present
+        build_past_instance_data(
+            chunk, set(chunk['course_id'].dropna()), set(chunk['instructor_id'].dropna())
+        ).to_csv(past_instance_file, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+    tables = build_tables_from_state(state, pd.read_csv(offered_dept_file))
+    for table, data in tables.items():
+        data.to_csv(os.path.join(output_folder, f'{table}.csv'), index=False)
+
+    if state_folder:
+        save_aggregate_state(state, pd.concat(terms).drop_duplicates(ignore_index=True),
+                             state_folder)
+
+
+def build_shard_tables(distribution_df):
+    """
+    Builds the department, instructor, course, past instance and instructor-course tables of
+    a shard of the distribution data holding whole departments. Every key of these tables
+    includes the department, so no group spans two shards.
+
+    :param distribution_df: DataFrame returned by load_distribution, or a shard of it.
+    :return: A dictionary mapping table name to its DataFrame; past instances keep the index
+             of their distribution rows.
+    """
+    valid_depts = set(distribution_df['Subject'].dropna())
+    instructor_data = build_instructor_data(distribution_df, valid_depts)
+    course_data = build_course_data(distribution_df, valid_depts)
+    valid_course_ids = set(course_data['course_id'])
+    valid_instructor_ids = set(instructor_data['instructor_id'])
+    return {
+        'dept': aggregate_dept_data(distribution_df),
+        'instructor': instructor_data,
+        'course': course_data,
+        'past_instance': build_past_instance_data(
+            distribution_df, valid_course_ids, valid_instructor_ids),
+        'instructor_course_stats': build_instructor_course_stats_data(
+            distribution_df, valid_course_ids, valid_instructor_ids)
+    }
+
+
+def shard_by_department(distribution_df, num_shards):
+    """
+    Splits the distribution data into shards of whole departments with similar row counts.
+    Departments are assigned largest first to the currently smallest shard, so the split only
+    depends on the data.
+
+    :param distribution_df: DataFrame returned by load_distribution.
+    :param num_shards: The number of shards to create.
+    :return: A list of non-empty DataFrames.
+    """
+    sizes = distribution_df['Subject'].value_counts()
+    sizes = sizes[sizes > 0]  # Unused categories of a categorical column are counted as 0
+    sizes = sizes.sort_index(kind='stable').sort_values(ascending=False, kind='stable')
+    shard_depts = [[] for _ in range(num_shards)]
+    shard_sizes = [0] * num_shards
+    for dept, size in sizes.items():
+        smallest = shard_sizes.index(min(shard_sizes))
+        shard_depts[smallest].append(dept)
+        shard_sizes[smallest] += size
+    return [distribution_df[distribution_df['Subject'].isin(depts)]
+            for depts in shard_depts if depts]
+
+
+def build_tables_parallel(distribution_df, offered_dept_df, workers):
+    """
+    Builds the cleaned tables by running build_shard_tables on department shards in a process
+    pool. The shard results are concatenated and sorted back into the order of the serial
+    groupbys and of the distribution rows, so the written files are byte-identical.
+
+    :param distribution_df: DataFrame returned by load_distribution.
+    :param offered_dept_df: DataFrame containing offered department data.
+    :param workers: The number of worker processes.
+    :return: A dictionary mapping table name to its DataFrame.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(build_shard_tables,
+                                    shard_by_department(distribution_df, workers * 4)))
+
+    def merged(table, sort_columns=None):
+        data = pd.concat([result[table] for result in results])
+        if sort_columns is None:
+            return data.sort_index()
+        return data.sort_values(sort_columns, ignore_index=True)
+
+    return {
+        'dept': merge_offered_depts(merged('dept', ['dept_id']), offered_dept_df),
+        'instructor': merged('instructor', ['instructor_id']),
+        'course': merged('course', ['course_id']),
+        'past_instance': merged('past_instance'),
+        'instructor_course_stats': merged('instructor_course_stats',
+                                          ['instructor_id', 'course_id'])
+    }
+
+
+def run_pipeline(distribution_file, offered_dept_file, output_folder, state_folder=None,
+                 workers=1):
+    """
+    Runs every past_cleaner stage from a single parse of the distribution data.
+    The distribution file is loaded and normalized once, each stage derives its output from
+    the shared in-memory frame, and the valid key sets are handed between stages directly
+    instead of being re-read from the CSV files written by the earlier stages.
+
+    :param distribution_file: File path for the CSV containing distribution data.
+    :param offered_dept_file: File path for the CSV containing offered department data.
+    :param output_folder: Folder the cleaned CSV files are written to.
+    :param state_folder: Optional folder for the partial aggregates used by ingest_term.py.
+    :param workers: The number of worker processes; with more than one, the tables are built
+                    per department shard by build_tables_parallel.
+    """
+    with instrumentation.timer('load_distribution'):
+        distribution_df = load_distribution(distribution_file)
+    instrumentation.count('rows_in', len(distribution_df))
+    instrumentation.count('distribution_bytes', int(distribution_df.memory_usage(deep=True).sum()))
+    instrumentation.file_read(distribution_file)
+
+    if workers > 1:
+        with instrumentation.timer('build_tables_parallel', workers=workers):
+            tables = build_tables_parallel(
+                distribution_df, pd.read_csv(offered_dept_file), workers)
+        for table, data in tables.items():
+            write_table(data, output_folder, table)
+    else:
+        run_stages(distribution_df, offered_dept_file, output_folder)
+
+    if state_folder:
+        with instrumentation.timer('save_aggregate_state'):
+            save_aggregate_state(build_aggregate_state(distribution_df),
+                                 loaded_terms(distribution_df), state_folder)
+
+
+def write_table(data, output_folder, table):
+    """
+    Writes a cleaned table to its CSV file and adds it to the stage's output metrics.
+
+    :param data: The DataFrame to write.
+    :param output_folder: Folder the cleaned CSV files are written to.
+    :param table: The table name, used as the file name.
+    """
+    output_file = os.path.join(output_folder, f'{table}.csv')
+    data.to_csv(output_file, index=False)
+    instrumentation.count('rows_out', len(data))
+    instrumentation.file_written(output_file)
+
+
+def run_stages(distribution_df, offered_dept_file, output_folder):
+    """
+    Runs the past_cleaner stages one after another on the loaded distribution data, handing
+    the valid key sets from each stage to the next.
+
+    :param distribution_df: DataFrame returned by load_distribution.
+    :param offered_dept_file: File path for the CSV containing offered department data.
+    :param output_folder: Folder the cleaned CSV files are written to.
+    """
+    with instrumentation.timer('build_dept_data'):
+        dept_data = build_dept_data(
+            distribution_df, pd.read_csv(offered_dept_file))
+    write_table(dept_data, output_folder, 'dept')
+    valid_depts = set(dept_data['dept_id'])
+
+    with instrumentation.timer('build_instructor_data'):
+        instructor_data = build_instructor_data(distribution_df, valid_depts)
+    write_table(instructor_data, output_folder, 'instructor')
+    valid_instructor_ids = set(instructor_data['instructor_id'])
+
+    with instrumentation.timer('build_course_data'):
+        course_data = build_course_data(distribution_df, valid_depts)
+    write_table(course_data, output_folder, 'course')
+    valid_course_ids = set(course_data['course_id'])
+
+    with instrumentation.timer('build_past_instance_data'):
+        past_instance_data = build_past_instance_data(
+            distribution_df, valid_course_ids, valid_instructor_ids)
+    write_table(past_instance_data, output_folder, 'past_instance')
+    with instrumentation.timer('build_instructor_course_stats_data'):
+        instructor_course_stats_data = build_instructor_course_stats_data(
+            distribution_df, valid_course_ids, valid_instructor_ids)
+    write_table(instructor_course_stats_data, output_folder, 'instructor_course_stats')
 
 
 def main():
-    create_dept_csv('raw_data/distribution.csv',
-                    'raw_data/offered_dept.csv', 'cleaned_data/dept.csv')
-    valid_depts = load_valid_depts('cleaned_data/dept.csv')
-    create_instructor_csv('raw_data/distribution.csv',
-                          'cleaned_data/instructor.csv', valid_depts)
-    create_course_csv('raw_data/distribution.csv',
-                      'cleaned_data/course.csv', valid_depts)
-    create_past_instance_csv('raw_data/distribution.csv',
-                             'cleaned_data/course.csv',
-                             'cleaned_data/instructor.csv',
-                             'cleaned_data/past_instance.csv')
-    create_instructor_course_stats_csv('raw_data/distribution.csv',
-                                       'cleaned_data/course.csv',
-                                       'cleaned_data/instructor.csv',
-                                       'cleaned_data/instructor_course_stats.csv')
+    with instrumentation.stage_metrics('past_cleaner'):
+        run_pipeline('raw_data/distribution.csv',
+                     'raw_data/offered_dept.csv', 'cleaned_data/', 'aggregate_state/')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,282 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import instrumentation
+
+CLEANED_TABLES = ['dept', 'instructor', 'course', 'past_instance', 'instructor_course_stats',
+                  'new_instance', 'course_term_trend', 'instructor_term_trend', 'dept_term_trend']
+
+
+class Stage:
+    """
+    One script of the data pipeline with the files it reads and writes, relative to scripts/.
+    Stages that fetch remote data are volatile: their inputs cannot be hashed, so they run
+    on every refresh unless the refresh is offline.
+    """
+
+    def __init__(self, name, script, inputs, outputs, volatile=False):
+        """
+        Initialize a stage.
+        :param name: The stage name.
+        :param script: The script run for the stage.
+        :param inputs: The files the stage reads.
+        :param outputs: The files the stage writes.
+        :param volatile: Whether the stage reads remote data and always runs.
+        """
+        self.name = name
+        self.script = script
+        self.inputs = inputs
+        self.outputs = outputs
+        self.volatile = volatile
+
+
+# Pipeline stages in the order of bash.txt
+STAGES = [
+    Stage('scraper', 'scraper.py', [],
+          ['raw_data/offered_raw.csv', 'raw_data/changed_subjects.json'], volatile=True),
+    Stage('past_cleaner', 'past_cleaner.py',
+          ['raw_data/distribution.csv', 'raw_data/offered_dept.csv'],
+          [f'cleaned_data/{table}.csv' for table in
+           ['dept', 'instructor', 'course', 'past_instance', 'instructor_course_stats']] +
+          ['aggregate_state/terms.csv']),
+    Stage('trend_rollup', 'trend_rollup.py', ['cleaned_data/past_instance.csv'],
+          [f'cleaned_data/{table}.csv' for table in
+           ['course_term_trend', 'instructor_term_trend', 'dept_term_trend']]),
+    Stage('new_cleaner', 'new_cleaner.py',
+          ['raw_data/offered_raw.csv', 'raw_data/changed_subjects.json',
+           'cleaned_data/instructor.csv'],
+          ['cleaned_data/new_instance.csv', 'cleaned_data/instructor.csv']),
+    Stage('increment', 'increment.py',
+          [f'cleaned_data/{table}.csv' for table in ['new_instance', 'dept', 'course', 'instructor']],
+          [f'cleaned_data/{table}.csv' for table in ['dept', 'course', 'instructor']]),
+    Stage('course_comparison', 'course_comparison.py',
+          [f'cleaned_data/{table}.csv' for table in
+           ['new_instance', 'instructor_course_stats', 'instructor', 'course']],
+          ['cleaned_data/course_comparison.jsonl']),
+    Stage('cleaned_tables', 'cleaned_tables.py',
+          [f'cleaned_data/{table}.csv' for table in CLEANED_TABLES],
+          [f'cleaned_data/{table}.parquet' for table in CLEANED_TABLES]),
+    Stage('import', 'import.py',
+          [f'cleaned_data/{table}.{extension}' for table in CLEANED_TABLES
+           for extension in ('csv', 'parquet')] + ['cleaned_data/course_comparison.jsonl'], [])
+]
+
+
+def stage_dependencies(stages):
+    """
+    Derives which earlier stages each stage has to wait for from the files they share.
+    A stage depends on an earlier one if it reads or writes a file the earlier stage writes,
+    or writes a file the earlier stage reads, so the past_cleaner and scraper branches are
+    independent while new_cleaner waits for both.
+
+    :param stages: The stages in pipeline order.
+    :return: A dictionary mapping each stage name to the set of stage names it depends on.
+    """
+    dependencies = {}
+    for i, stage in enumerate(stages):
+        dependencies[stage.name] = {
+            earlier.name for earlier in stages[:i]
+            if set(earlier.outputs) & set(stage.inputs + stage.outputs) or
+            set(earlier.inputs) & set(stage.outputs)}
+    return dependencies
+
+
+class FileHasher:
+    """
+    Content hashes of pipeline files. A hash is reused while the file's size and
+    modification time are unchanged, so a refresh only reads files that were touched.
+    """
+
+    def __init__(self, known=None):
+        """
+        Initialize the hasher.
+        :param known: Dictionary of path -> [size, mtime_ns, hash] saved from a previous run.
+        """
+        self.known = dict(known or {})
+
+    def hash(self, path):
+        """
+        Returns the SHA-256 of a file's content.
+        :param path: The file path.
+        :return: The hex digest, or None if the file does not exist.
+        """
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        known = self.known.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        self.known[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+
+def load_state(state_file):
+    """
+    Loads the pipeline state saved by save_state.
+    :param state_file: The path of the JSON state file.
+    :return: A dictionary with 'stages' (stage name -> recorded input hashes) and 'files'
+             (the FileHasher cache).
+    """
+    if not os.path.exists(state_file):
+        return {'stages': {}, 'files': {}}
+    with open(state_file, 'r') as file:
+        return json.load(file)
+
+
+def save_state(state, state_file):
+    """
+    Saves the pipeline state, replacing the previous file atomically.
+    :param state: The dictionary returned by load_state, updated by run_pipeline.
+    :param state_file: The path of the JSON state file.
+    """
+    temp_file = f'{state_file}.tmp'
+    with open(temp_file, 'w') as file:
+        json.dump(state, file, indent=2, sort_keys=True)
+    os.replace(temp_file, state_file)
+
+
+def input_hashes(stage, hasher):
+    """
+    Hashes a stage's inputs, including its own script so code changes rerun it.
+    :param stage: The stage.
+    :param hasher: The FileHasher.
+    :return: A dictionary mapping each input path to its hash (None if missing).
+    """
+    return {path: hasher.hash(path) for path in [stage.script] + stage.inputs}
+
+
+def skip_reason(stage, hashes, recorded, offline):
+    """
+    Decides whether a stage can be skipped.
+    :param stage: The stage.
+    :param hashes: The current input hashes from input_hashes.
+    :param recorded: The input hashes recorded after the stage last completed, or None.
+    :param offline: Whether volatile stages are skipped.
+    :return: A reason to skip the stage, or None if it has to run.
+    """
+    if stage.volatile:
+        return 'offline' if offline else None
+    if not all(os.path.exists(path) for path in stage.outputs):
+        return None
+    if hashes == recorded:
+        return 'inputs unchanged'
+    missing = [path for path in stage.inputs if hashes[path] is None]
+    if missing:
+        return f"missing {', '.join(missing)}, keeping existing outputs"
+    return None
+
+
+def run_stage(stage):
+    """
+    Runs a stage's script in a subprocess from the scripts folder.
+    :param stage: The stage.
+    :return: The exit code of the script.
+    """
+    return subprocess.run([sys.executable, stage.script]).returncode
+
+
+def run_pipeline(stages=STAGES, state_file='pipeline_state.json', offline=False, force=(),
+                 max_workers=2):
+    """
+    Runs the pipeline stages, skipping those whose inputs are unchanged since they last
+    completed and running independent stages at the same time.
+
+    Several stages rewrite files that earlier stages produced (new_cleaner appends to
+    instructor.csv and increment updates the counted files), so the input hashes of every
+    completed stage are recorded once the whole refresh has finished. A refresh with no new
+    data then finds every stage's inputs as they were left and skips it. A stage that fails
+    has its record dropped, so it runs again next time, and the stages after it are not run.
+
+    :param stages: The stages in pipeline order.
+    :param state_file: The path of the JSON state file.
+    :param offline: Whether to skip volatile stages such as the scraper.
+    :param force: Names of stages to run even if their inputs are unchanged.
+    :param max_workers: The number of stages run at the same time.
+    :return: A dictionary mapping each stage name to 'ran', 'skipped', 'failed' or 'blocked'.
+    """
+    state = load_state(state_file)
+    hasher = FileHasher(state['files'])
+    dependencies = stage_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    results = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(results) < len(stages):
+            for stage in stages:
+                if stage.name in results or stage.name in running.values():
+                    continue
+                upstream = [results.get(name) for name in dependencies[stage.name]]
+                if any(result in ('failed', 'blocked') for result in upstream):
+                    results[stage.name] = 'blocked'
+                    print(f"{stage.name}: blocked by a failed stage")
+                    continue
+                if None in upstream:
+                    continue
+
+                reason = None if stage.name in force else skip_reason(
+                    stage, input_hashes(stage, hasher), state['stages'].get(stage.name), offline)
+                if reason:
+                    results[stage.name] = 'skipped'
+                    print(f"{stage.name}: skipped ({reason})")
+                else:
+                    print(f"{stage.name}: running {stage.script}")
+                    running[executor.submit(run_stage, stage)] = stage.name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name] = 'ran' if future.result() == 0 else 'failed'
+                if results[name] == 'failed':
+                    print(f"{name}: failed with exit code {future.result()}")
+
+    for name, result in results.items():
+        if result in ('ran', 'skipped') and not by_name[name].volatile:
+            state['stages'][name] = input_hashes(by_name[name], hasher)
+        elif result == 'failed':
+            state['stages'].pop(name, None)
+    state['files'] = hasher.known
+    save_state(state, state_file)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh the cleaned data and MongoDB.')
+    parser.add_argument('--offline', action='store_true',
+                        help='skip the scraper and use the existing raw_data/offered_raw.csv')
+    parser.add_argument('--force', nargs='*', default=[], metavar='STAGE',
+                        help='run these stages even if their inputs are unchanged')
+    parser.add_argument('--metrics-file', metavar='FILE',
+                        help='append the JSON lines metrics of every stage to this file')
+    parser.add_argument('--textfile-dir', metavar='FOLDER',
+                        help='write a Prometheus textfile of every stage to this folder')
+    parser.add_argument('--profile', nargs='+', default=[], choices=instrumentation.PROFILERS,
+                        help='profile every stage, writing the output to profiles/')
+    args = parser.parse_args()
+
+    # The stage scripts read their metrics settings from the environment they inherit
+    if args.metrics_file:
+        os.environ[instrumentation.METRICS_FILE_VAR] = os.path.abspath(args.metrics_file)
+    if args.textfile_dir:
+        os.environ[instrumentation.TEXTFILE_DIR_VAR] = os.path.abspath(args.textfile_dir)
+    if args.profile:
+        os.environ[instrumentation.PROFILE_VAR] = ','.join(args.profile)
+
+    results = run_pipeline(offline=args.offline, force=args.force)
+    if 'failed' in results.values():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
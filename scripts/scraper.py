@@ -1,9 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
 import time
 import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import Select
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import Select, WebDriverWait
 from bs4 import BeautifulSoup
+import lxml.html
+import instrumentation
+
+
+class SubjectCache:
+    """
+    On-disk cache of scraped subject pages, keyed by (term, subject).
+    Each entry stores the hash of the response body, the parsed rows and the response's
+    ETag/Last-Modified headers, so an unchanged page is not parsed again. The subjects that
+    changed in a run are recorded by record_changed_subjects, so new_cleaner.py only cleans
+    those again.
+    """
+
+    def __init__(self, cache_folder, max_age=7 * 24 * 3600, max_bytes=64 * 1024 * 1024):
+        """
+        Initialize the cache.
+        :param cache_folder: Folder the cache entries are stored in.
+        :param max_age: Seconds after which an entry is ignored and evicted.
+        :param max_bytes: Total size the cache is trimmed to, oldest entries first.
+        """
+        self.cache_folder = cache_folder
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.changed = set()
+
+    def _path(self, term_year, subject_code):
+        """
+        Builds the file path of a cache entry.
+        :param term_year: The term year of the entry.
+        :param subject_code: The subject code of the entry.
+        :return: The path of the entry's JSON file.
+        """
+        return os.path.join(self.cache_folder, term_year, f'{subject_code}.json')
+
+    def get(self, term_year, subject_code):
+        """
+        Returns the cached entry for a subject, or None if it is missing or too old.
+        :param term_year: The term year of the entry.
+        :param subject_code: The subject code of the entry.
+        :return: A dictionary with 'body_hash', 'rows', 'etag', 'last_modified' and 'fetched_at'.
+        """
+        path = self._path(term_year, subject_code)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as file:
+            entry = json.load(file)
+        if time.time() - entry['fetched_at'] > self.max_age:
+            return None
+        return entry
+
+    def put(self, term_year, subject_code, entry):
+        """
+        Stores the entry for a subject and records the subject as changed in this run.
+        :param term_year: The term year of the entry.
+        :param subject_code: The subject code of the entry.
+        :param entry: The dictionary to store, as returned by get.
+        """
+        self._write(term_year, subject_code, entry)
+        self.changed.add(subject_code)
+
+    def touch(self, term_year, subject_code, entry):
+        """
+        Stores an entry the server confirmed as unchanged with a new 'fetched_at', so it is
+        not aged out while the page stays the same. The subject is not recorded as changed.
+        :param term_year: The term year of the entry.
+        :param subject_code: The subject code of the entry.
+        :param entry: The cached entry, possibly with updated validators.
+        """
+        self._write(term_year, subject_code, dict(entry, fetched_at=time.time()))
+
+    def _write(self, term_year, subject_code, entry):
+        """
+        Writes an entry, replacing the previous file atomically.
+        :param term_year: The term year of the entry.
+        :param subject_code: The subject code of the entry.
+        :param entry: The dictionary to store.
+        """
+        path = self._path(term_year, subject_code)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(entry, file)
+        os.replace(temp_path, path)
+
+    def evict(self):
+        """
+        Removes entries older than max_age, then the oldest entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_folder):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total_bytes = sum(size for _, size, _ in entries)
+        now = time.time()
+        for modified, size, path in entries:
+            if now - modified <= self.max_age and total_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
 
 
 class TimetableScraper:
@@ -14,12 +124,29 @@ class TimetableScraper:
         'location', 'exam'
     ]
 
-    def __init__(self, driver):
+    TABLE_XPATH = "//table[contains(concat(' ', normalize-space(@class), ' '), ' dataentrytable ')]"
+
+    def __init__(self, driver, base_url=BASE_URL, timeout=10, parser='bs4', cache=None):
         """
         Initialize the scraper with a Selenium WebDriver.
         :param driver: A Selenium WebDriver instance to interact with the browser.
+        :param base_url: The timetable URL, overridable to point at a local fixture server.
+        :param timeout: Seconds to wait for form elements to appear before giving up.
+        :param parser: The HTML parser engine, 'bs4' or the faster 'lxml'.
+        :param cache: An optional SubjectCache used to skip parsing unchanged subjects.
         """
         self.driver = driver
+        self.base_url = base_url
+        self.timeout = timeout
+        self.parser = parser
+        self.cache = cache
+        self.term_year = None
+
+    def close(self):
+        """
+        Releases the browser session held by the scraper.
+        """
+        self.driver.quit()
 
     def fetch_courses(self, term_year, subject_codes):
         """
@@ -39,10 +166,19 @@ class TimetableScraper:
         Navigates to the timetable page and selects the given term.
         :param term_year: The term year to select on the webpage.
         """
-        self.driver.get(self.BASE_URL)
-        time.sleep(2)  # Wait for page to load
+        self.term_year = term_year
+        self.driver.get(self.base_url)
+        self._wait_for_element('TERMYEAR')
         Select(self.driver.find_element(By.NAME, 'TERMYEAR')).select_by_value(term_year)
-        time.sleep(2)
+        self._wait_for_element('subj_code')
+
+    def _wait_for_element(self, name):
+        """
+        Waits until a form element is present on the page.
+        :param name: The name attribute of the element to wait for.
+        """
+        WebDriverWait(self.driver, self.timeout).until(
+            EC.presence_of_element_located((By.NAME, name)))
 
     def _fetch_subject_data(self, subject_code):
         """
@@ -50,10 +186,70 @@ class TimetableScraper:
         :param subject_code: The subject code to select.
         :return: A list of course data dictionaries for the selected subject.
         """
+        if self.cache is None:
+            html, _ = self._fetch_subject_html(subject_code)
+            return self._parse_html(html)
+
+        cached = self.cache.get(self.term_year, subject_code)
+        html, headers = self._fetch_subject_html(subject_code, cached)
+        if html is None:  # Not modified since the cached response
+            self.cache.touch(self.term_year, subject_code, cached)
+            return cached['rows']
+
+        body_hash = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        if cached and cached['body_hash'] == body_hash:
+            self.cache.touch(self.term_year, subject_code, dict(
+                cached, etag=headers.get('ETag'), last_modified=headers.get('Last-Modified')))
+            return cached['rows']
+
+        rows = self._parse_html(html)
+        self.cache.put(self.term_year, subject_code, {
+            'body_hash': body_hash,
+            'rows': rows,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched_at': time.time()
+        })
+        return rows
+
+    def _fetch_subject_html(self, subject_code, cached=None):
+        """
+        Submits the form for a subject and returns the resulting page source.
+        :param subject_code: The subject code to select.
+        :param cached: The cached entry for the subject, unused by the browser backend.
+        :return: A tuple of (HTML of the results page, response headers).
+        """
         Select(self.driver.find_element(By.NAME, 'subj_code')).select_by_value(subject_code)
         self.driver.find_element(By.NAME, "BTN_PRESSED").click()
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-        return self._parse_table(soup)
+        return self.driver.page_source, {}
+
+    def _parse_html(self, html):
+        """
+        Parses the course table out of a results page with the configured parser engine.
+        :param html: The HTML of the results page.
+        :return: A list of course data dictionaries.
+        """
+        if self.parser == 'lxml':
+            return list(self._iter_rows_lxml(html))
+        return self._parse_table(BeautifulSoup(html, 'html.parser'))
+
+    def _iter_rows_lxml(self, html):
+        """
+        Yields the course rows of a results page using lxml.
+        Produces the same dictionaries as _parse_table, but only walks the rows of the
+        'dataentrytable' instead of building a BeautifulSoup tree for the whole page.
+        :param html: The HTML of the results page.
+        :return: A generator of course data dictionaries.
+        """
+        tables = lxml.html.fromstring(html).xpath(self.TABLE_XPATH)
+        if not tables:
+            return
+        for row in tables[0].iter('tr'):
+            if row.attrib:
+                continue
+            cells = [td.text_content().strip().replace('\n', ' ') for td in row.iter('td')]
+            if cells:
+                yield dict(zip(self.DATA_KEYS, cells))
 
     def _parse_table(self, soup):
         """
@@ -77,13 +273,157 @@ class TimetableScraper:
         return dict(zip(self.DATA_KEYS, entries))
 
 
+class HttpTimetableScraper(TimetableScraper):
+    """
+    Fetches timetable pages by posting the search form directly over a keep-alive HTTP
+    session instead of driving a browser. Parsing is shared with TimetableScraper.
+    """
+    FORM_DEFAULTS = {
+        'CAMPUS': '0', 'CORE_CODE': 'AR%', 'SCHDTYPE': '%', 'CRSE_NUMBER': '', 'crn': '',
+        'open_only': '', 'disp_comments_in': 'N', 'sess_code': '%', 'inst_name': '',
+        'BTN_PRESSED': 'FIND class sections'
+    }
+
+    def __init__(self, session=None, base_url=TimetableScraper.BASE_URL, timeout=10, parser='bs4',
+                 cache=None):
+        """
+        Initialize the scraper with an HTTP session.
+        :param session: A requests.Session to reuse; a pooled session is created if omitted.
+        :param base_url: The timetable URL, overridable to point at a local fixture server.
+        :param timeout: Seconds to wait for each response.
+        :param parser: The HTML parser engine, 'bs4' or the faster 'lxml'.
+        :param cache: An optional SubjectCache used to skip parsing unchanged subjects.
+        """
+        super().__init__(None, base_url, timeout, parser, cache)
+        if session is None:
+            session = requests.Session()
+            session.mount(base_url, HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session = session
+
+    def close(self):
+        """
+        Releases the pooled connections held by the session.
+        """
+        self.session.close()
+
+    def _navigate_to_page(self, term_year):
+        """
+        Remembers the term to post with every subject request.
+        :param term_year: The term year to request.
+        """
+        self.term_year = term_year
+
+    def _fetch_subject_html(self, subject_code, cached=None):
+        """
+        Posts the search form for a subject and returns the resulting page source.
+        When a cached entry is given, its validators are sent so the server can answer
+        304 Not Modified instead of resending the page.
+        :param subject_code: The subject code to request.
+        :param cached: The cached entry for the subject, if any.
+        :return: A tuple of (HTML of the results page or None if not modified, response headers).
+        """
+        form = dict(self.FORM_DEFAULTS, TERMYEAR=self.term_year, subj_code=subject_code)
+        headers = {}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.session.post(self.base_url, data=form, headers=headers,
+                                     timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            return None, response.headers
+        response.raise_for_status()
+        return response.text, response.headers
+
+
+def _scrape_shard(term_year, subject_codes, scraper_factory, retries):
+    """
+    Fetches a shard of subjects with a scraper of its own.
+    A failed subject is retried after navigating back to the term page.
+    :param term_year: The term year as a string (e.g., '202401' for Spring 2024).
+    :param subject_codes: The subject codes assigned to this shard.
+    :param scraper_factory: A callable returning a new TimetableScraper.
+    :param retries: The number of extra attempts per subject.
+    :return: A dictionary mapping each subject code to its list of course data dictionaries.
+    """
+    scraper = scraper_factory()
+    try:
+        scraper._navigate_to_page(term_year)
+        results = {}
+        for code in subject_codes:
+            for attempt in range(retries + 1):
+                try:
+                    with instrumentation.timer('subject_fetch', subject=code):
+                        results[code] = scraper._fetch_subject_data(code)
+                    break
+                except Exception as error:
+                    if attempt == retries:
+                        raise
+                    instrumentation.count('fetch_retries')
+                    print(f"Retrying {code} after error: {error}")
+                    scraper._navigate_to_page(term_year)
+        return results
+    finally:
+        scraper.close()
+
+
+def fetch_courses_parallel(term_year, subject_codes, scraper_factory, max_workers=4, retries=2):
+    """
+    Fetches course data for a list of subject codes with a pool of scrapers.
+    The subject codes are split into one shard per worker, each worker uses its own scraper
+    (and so its own browser or HTTP session), and the results are merged back in the order
+    of subject_codes, so the output matches a sequential fetch_courses call.
+    :param term_year: The term year as a string (e.g., '202401' for Spring 2024).
+    :param subject_codes: A list of subject codes to fetch data for.
+    :param scraper_factory: A callable returning a new TimetableScraper for each worker.
+    :param max_workers: The number of scrapers fetching concurrently.
+    :param retries: The number of extra attempts per subject before the scrape fails.
+    :return: A list of dictionaries containing course data.
+    """
+    shards = [subject_codes[i::max_workers] for i in range(max_workers)]
+    shards = [shard for shard in shards if shard]
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for shard_results in executor.map(
+                lambda shard: _scrape_shard(term_year, shard, scraper_factory, retries), shards):
+            results.update(shard_results)
+    return [course for code in subject_codes for course in results[code]]
+
+
+def record_changed_subjects(changed, filename):
+    """
+    Adds the subjects that changed in a scrape to the list new_cleaner.py reads. Subjects of
+    earlier scrapes that have not been cleaned yet are kept, and nothing is written when no
+    subject changed.
+    :param changed: The subject codes that changed, e.g. SubjectCache.changed.
+    :param filename: The JSON file holding the sorted list of changed subject codes.
+    """
+    if not changed:
+        return
+    subjects = set(changed)
+    if os.path.exists(filename):
+        with open(filename, 'r') as file:
+            subjects.update(json.load(file))
+    with open(filename, 'w') as file:
+        json.dump(sorted(subjects), file)
+
+
 def save_to_csv(data, filename):
     pd.DataFrame(data).to_csv(filename, index=False)
+    instrumentation.count('rows_out', len(data))
+    instrumentation.file_written(filename)
     print(f"Data saved to {filename}")
 
 
 def main():
+    with instrumentation.stage_metrics('scraper'):
+        scrape()
+
+
+def scrape():
     term_year = '202409'  # Fall 2024
+    cache = SubjectCache('scrape_cache/')
 
     subject_codes = [
         'AAD', 'AAEC', 'ACIS', 'ADV', 'AFST', 'AHRM', 'AINS', 'AIS', 'ALCE', 'ALS',
@@ -103,17 +443,25 @@ def main():
         'TA', 'TBMH', 'UAP', 'UH', 'UNIV', 'VM', 'WATR', 'WGS'
     ]
 
-    driver = webdriver.Chrome()
-
     try:
-        scraper = TimetableScraper(driver)
-        all_courses = scraper.fetch_courses(term_year, subject_codes)
-        if all_courses:
-            save_to_csv(all_courses, 'raw_data/offered_raw.csv')
-        else:
-            print("No courses found.")
-    finally:
-        driver.quit()
+        all_courses = fetch_courses_parallel(
+            term_year, subject_codes, lambda: HttpTimetableScraper(parser='lxml', cache=cache),
+            max_workers=8)
+    except requests.RequestException as error:
+        print(f"HTTP fetch failed ({error}), falling back to Selenium")
+        all_courses = fetch_courses_parallel(
+            term_year, subject_codes,
+            lambda: TimetableScraper(webdriver.Chrome(), parser='lxml', cache=cache),
+            max_workers=4)
+    cache.evict()
+    instrumentation.count('subjects_changed', len(cache.changed))
+    print(f"{len(cache.changed)} of {len(subject_codes)} subjects changed")
+    if all_courses:
+        save_to_csv(all_courses, 'raw_data/offered_raw.csv')
+        # new_cleaner.py reuses the cleaned rows of the other subjects
+        record_changed_subjects(cache.changed, 'raw_data/changed_subjects.json')
+    else:
+        print("No courses found.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,141 @@
+import heapq
+from collections import defaultdict
+from instructor_matcher import normalize_name
+
+# Number of ranked results kept per prefix
+MAX_RESULTS = 10
+
+
+def course_terms(course_id, title, dept):
+    """
+    Lists the normalized search terms of a course. The course ID comes first, followed by its
+    compact and number-only forms, the department, the full title and each title word.
+
+    :param course_id: The course ID (e.g., 'CS 3114').
+    :param title: The course title.
+    :param dept: The department ID.
+    :return: A list of normalized terms, primary term first.
+    """
+    course = normalize_name(course_id)
+    title = normalize_name(title)
+    return [course, course.replace(' ', ''), course.split(' ')[-1], normalize_name(dept),
+            title] + title.split()
+
+
+def instructor_terms(last_name, dept):
+    """
+    Lists the normalized search terms of an instructor: the last name, each of its words and
+    the department.
+
+    :param last_name: The instructor's last name.
+    :param dept: The department ID.
+    :return: A list of normalized terms, primary term first.
+    """
+    name = normalize_name(last_name)
+    return [name] + name.split() + [normalize_name(dept)]
+
+
+class SearchIndex:
+    """
+    Prefix index for course and instructor autocomplete. Every prefix of every search term
+    maps to its ranked top results, computed once at build time, so a lookup is a single
+    dictionary access on the normalized query. Results whose primary term (course ID or last
+    name) starts with the query rank first, then more popular entries (past plus new classes).
+    """
+
+    def __init__(self, max_results=MAX_RESULTS):
+        """
+        Initialize an empty index.
+        :param max_results: Number of results kept per prefix.
+        """
+        self.max_results = max_results
+        self.documents = []    # (kind, ID, label, popularity, terms)
+        self.prefixes = {}     # normalized prefix -> ranked list of result dictionaries
+
+    @classmethod
+    def from_tables(cls, course_df, instructor_df, **kwargs):
+        """
+        Builds an index over the course and instructor tables.
+        :param course_df: DataFrame with the columns of course.csv.
+        :param instructor_df: DataFrame with the columns of instructor.csv.
+        :param kwargs: Options passed to the constructor.
+        :return: A built SearchIndex.
+        """
+        index = cls(**kwargs)
+        for row in course_df.itertuples(index=False):
+            index.add('course', row.course_id, f'{row.course_id} {row.title}',
+                      row.past_classes + row.new_classes,
+                      course_terms(row.course_id, row.title, row.dept))
+        for row in instructor_df.itertuples(index=False):
+            index.add('instructor', row.instructor_id, row.instructor_id,
+                      row.past_classes + row.new_classes,
+                      instructor_terms(row.last_name, row.dept))
+        index.build()
+        return index
+
+    def add(self, kind, document_id, label, popularity, terms):
+        """
+        Adds a document to be indexed by the next build.
+        :param kind: 'course' or 'instructor'.
+        :param document_id: The course or instructor ID.
+        :param label: The text shown for the result.
+        :param popularity: Number of past and new classes, used to rank results.
+        :param terms: Normalized search terms, primary term first.
+        """
+        self.documents.append((kind, document_id, label, int(popularity), terms))
+
+    def rank(self, document, tier):
+        """
+        Returns the sort key of a matched document; smaller keys rank first.
+        :param document: A document tuple as stored by add.
+        :param tier: 0 if the prefix matches the primary term, 1 if it only matches another term.
+        :return: A tuple to sort by.
+        """
+        kind, document_id, label, popularity, _ = document
+        return tier, -popularity, label, kind
+
+    def build(self):
+        """
+        Computes the ranked results of every prefix of every term of the added documents.
+        """
+        candidates = defaultdict(list)
+        for position, document in enumerate(self.documents):
+            tiers = {}
+            for i, term in enumerate(document[4]):
+                tier = min(i, 1)
+                for end in range(1, len(term) + 1):
+                    prefix = term[:end]
+                    tiers[prefix] = min(tiers.get(prefix, tier), tier)
+            for prefix, tier in tiers.items():
+                candidates[prefix].append((self.rank(document, tier), position))
+
+        self.prefixes = {
+            prefix: [self.result(self.documents[position])
+                     for _, position in heapq.nsmallest(self.max_results, matches)]
+            for prefix, matches in candidates.items()}
+
+    @staticmethod
+    def result(document):
+        """
+        Returns the result dictionary stored for a document.
+        :param document: A document tuple as stored by add.
+        :return: A dictionary with 'kind', 'id' and 'label'.
+        """
+        kind, document_id, label, _, _ = document
+        return {'kind': kind, 'id': document_id, 'label': label}
+
+    def lookup(self, query):
+        """
+        Returns the ranked results whose search terms start with the query.
+        :param query: The text typed by the user.
+        :return: A list of result dictionaries with 'kind', 'id' and 'label'.
+        """
+        return self.prefixes.get(normalize_name(query), [])
+
+    def to_records(self):
+        """
+        Lists the index as one record per prefix, as stored in the 'search_index' collection.
+        :return: A list of dictionaries with 'prefix' and 'results'.
+        """
+        return [{'prefix': prefix, 'results': results}
+                for prefix, results in self.prefixes.items()]
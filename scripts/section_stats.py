@@ -0,0 +1,201 @@
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+# Columns added by build_section_stats, stored after the existing columns of each table
+STAT_COLUMNS = ['gpa_weighted', 'gpa_std', 'gpa_p25', 'gpa_median', 'gpa_p75',
+                'gpa_ci_low', 'gpa_ci_high']
+
+# Section GPA percentiles reported per key
+PERCENTILES = {'gpa_p25': 0.25, 'gpa_median': 0.5, 'gpa_p75': 0.75}
+
+# Two-sided 95% normal critical value for the confidence interval of the weighted mean
+Z_95 = 1.96
+
+# Mergeable aggregate state columns holding the weighted sums behind the statistics
+SUM_COLUMNS = {'w': 'section_w_sum', 'wx': 'section_wx_sum', 'wxx': 'section_wxx_sum',
+               'ww': 'section_ww_sum'}
+
+# Aggregate state column holding how many graded sections of a key had each GPA, as
+# space-separated 'gpa:count' pairs, kept for the percentiles. GPAs have two decimals, so a key
+# has at most a few hundred pairs however many terms are loaded.
+VALUES_COLUMN = 'section_gpa_values'
+
+
+def build_section_stats(df, key, value='GPA', weight='Graded Enrollment'):
+    """
+    Computes enrollment-weighted GPA statistics per key from per-section rows.
+    Each section counts in proportion to its graded enrollment, so a 300-student section
+    weighs sixty times as much as a 5-student one. The standard deviation is over students
+    (every student in a section is given the section GPA), the confidence interval uses the
+    effective sample size of the weights, and the percentiles are over section GPAs.
+    Sections without a GPA or with no graded enrollment are ignored.
+
+    :param df: DataFrame with one row per section.
+    :param key: Column (or list of columns) to group by; only observed values of categorical
+                keys are grouped.
+    :param value: Column holding the section GPA.
+    :param weight: Column holding the section's graded enrollment.
+    :return: A DataFrame indexed by key with the STAT_COLUMNS, rounded to two decimals.
+    """
+    work = section_work(df, key, value, weight)
+    grouped = work.groupby(key, observed=True)
+    sums = grouped[['w', 'wx', 'wxx', 'ww']].sum()
+    quantiles = grouped['x'].quantile(list(PERCENTILES.values())).unstack()
+    return finalize_section_stats(sums, quantiles)
+
+
+def section_work(df, key, value, weight):
+    """
+    Computes the per-section weights and weighted terms summed by build_section_stats.
+
+    :param df: DataFrame with one row per section.
+    :param key: Column (or list of columns) to group by.
+    :param value: Column holding the section GPA.
+    :param weight: Column holding the section's graded enrollment.
+    :return: A DataFrame with the key columns, 'w', 'wx', 'wxx', 'ww' and 'x'.
+    """
+    graded = df[value].notna() & (df[weight] > 0)
+    x = df[value].where(graded)
+    w = df[weight].where(graded, 0).astype('float64')
+    wx = w * x.fillna(0)
+    keys = [key] if isinstance(key, str) else list(key)
+    return df[keys].assign(w=w, wx=wx, wxx=wx * x.fillna(0), ww=w * w, x=x)
+
+
+def finalize_section_stats(sums, quantiles):
+    """
+    Turns the weighted sums and section GPA percentiles of each key into the STAT_COLUMNS.
+
+    :param sums: DataFrame indexed by key with the 'w', 'wx', 'wxx' and 'ww' sums.
+    :param quantiles: DataFrame indexed by key with one column per PERCENTILES value.
+    :return: A DataFrame indexed by key with the STAT_COLUMNS, rounded to two decimals.
+    """
+    stats = pd.DataFrame(index=sums.index)
+    mean = sums['wx'] / sums['w']
+    std = np.sqrt((sums['wxx'] / sums['w'] - mean ** 2).clip(lower=0))
+    margin = Z_95 * std / np.sqrt(sums['w'] ** 2 / sums['ww'])
+    stats['gpa_weighted'] = mean
+    stats['gpa_std'] = std
+    for name, q in PERCENTILES.items():
+        stats[name] = quantiles[q]
+    stats['gpa_ci_low'] = mean - margin
+    stats['gpa_ci_high'] = mean + margin
+    return stats.round(2)
+
+
+def build_section_state(df, key, value='GPA', weight='Graded Enrollment'):
+    """
+    Computes the mergeable state behind build_section_stats per key: the weighted sums
+    (SUM_COLUMNS), which add up across terms, and the counts of each graded section GPA
+    (VALUES_COLUMN), which merge_value_counts adds up. finalize_section_state turns it back
+    into the statistics.
+
+    :param df: DataFrame with one row per section.
+    :param key: Column to group by; only observed values of a categorical key are grouped.
+    :param value: Column holding the section GPA.
+    :param weight: Column holding the section's graded enrollment.
+    :return: A DataFrame indexed by key with the SUM_COLUMNS and VALUES_COLUMN.
+    """
+    work = section_work(df, key, value, weight)
+    state = work.groupby(key, observed=True)[list(SUM_COLUMNS)].sum().rename(columns=SUM_COLUMNS)
+    counts = work.groupby([key, 'x'], observed=True).size().reset_index(name='count')
+    pairs = counts['x'].astype(str) + ':' + counts['count'].astype(str)
+    values = pairs.groupby(counts[key], observed=True).agg(' '.join)
+    state[VALUES_COLUMN] = values.reindex(state.index).fillna('')
+    return state
+
+
+def parse_value_counts(text):
+    """
+    Reads a VALUES_COLUMN value.
+
+    :param text: Space-separated 'gpa:count' pairs, or an empty string.
+    :return: A Counter mapping each GPA, as written, to its number of sections.
+    """
+    counts = Counter()
+    for pair in text.split():
+        gpa, count = pair.split(':')
+        counts[gpa] += int(count)
+    return counts
+
+
+def format_value_counts(counts):
+    """
+    Writes a VALUES_COLUMN value.
+
+    :param counts: A Counter mapping each GPA, as a string, to its number of sections.
+    :return: Space-separated 'gpa:count' pairs in GPA order.
+    """
+    return ' '.join(f'{gpa}:{counts[gpa]}' for gpa in sorted(counts, key=float))
+
+
+def merge_value_counts(left, right):
+    """
+    Adds up the VALUES_COLUMN values of two section states key by key. Keys found on only
+    one side keep their value, so only the keys of both sides are parsed.
+
+    :param left: Series of VALUES_COLUMN values.
+    :param right: Series of VALUES_COLUMN values over the same key.
+    :return: A Series over the union of both indexes.
+    """
+    index = left.index.union(right.index)
+    left = left.reindex(index).fillna('').astype(object)
+    right = right.reindex(index).fillna('').astype(object)
+    merged = left.where(right == '', right.where(left == '', None))
+    both = merged.isna()
+    merged[both] = [format_value_counts(parse_value_counts(a) + parse_value_counts(b))
+                    for a, b in zip(left[both], right[both])]
+    return merged
+
+
+def value_quantiles(values, q):
+    """
+    Computes quantiles of the section GPAs counted in VALUES_COLUMN values, interpolated
+    linearly like numpy quantile. All keys are computed at once from the cumulative counts,
+    so no key's sections are expanded into one value per section.
+
+    :param values: Series of VALUES_COLUMN values.
+    :param q: List of quantiles.
+    :return: A DataFrame over the index of values with one column per quantile, NaN for keys
+             without a counted section.
+    """
+    pairs = values.fillna('').reset_index(drop=True).str.split().explode().dropna()
+    split = pairs.str.split(':', expand=True) if len(pairs) else pd.DataFrame({0: [], 1: []})
+    positions = pairs.index.to_numpy(dtype='int64')
+    gpas = split[0].astype('float64').to_numpy()
+    counts = split[1].astype('int64').to_numpy()
+    order = np.lexsort((gpas, positions))
+    gpas, counts, positions = gpas[order], counts[order], positions[order]
+
+    # Section i of the sorted sections of every key lies in the pair whose cumulative count
+    # first exceeds starts[key] + i
+    ends = np.cumsum(counts)
+    totals = np.bincount(positions, weights=counts, minlength=len(values)).astype('int64')
+    starts = np.cumsum(totals) - totals
+    counted = totals > 0
+    result = np.full((len(values), len(q)), np.nan)
+    for column, quantile in enumerate(q):
+        h = (totals[counted] - 1) * quantile
+        low = np.floor(h)
+        t = h - low
+        a = gpas[np.searchsorted(ends, starts[counted] + low.astype('int64'), side='right')]
+        b = gpas[np.searchsorted(ends, starts[counted] + np.minimum(
+            low.astype('int64') + 1, totals[counted] - 1), side='right')]
+        result[counted, column] = np.where(t >= 0.5, b - (b - a) * (1 - t), a + (b - a) * t)
+    return pd.DataFrame(result, index=values.index, columns=q)
+
+
+def finalize_section_state(state):
+    """
+    Computes the STAT_COLUMNS from section state built by build_section_state, possibly
+    merged across several terms. Percentiles are only computed for the keys of state, so
+    it is cheap for the few keys touched by a new term.
+
+    :param state: DataFrame indexed by key with the SUM_COLUMNS and VALUES_COLUMN.
+    :return: A DataFrame indexed by key with the STAT_COLUMNS, rounded to two decimals.
+    """
+    sums = state[list(SUM_COLUMNS.values())].rename(
+        columns={column: name for name, column in SUM_COLUMNS.items()})
+    return finalize_section_stats(sums, value_quantiles(state[VALUES_COLUMN],
+                                                       list(PERCENTILES.values())))
@@ -0,0 +1,118 @@
+import os
+import shutil
+import pandas as pd
+from pymongo import DeleteOne, MongoClient, ReplaceOne, UpdateOne
+import cleaned_tables
+
+# new_instance column -> (collection, key) whose 'new_classes' counter it drives
+COUNTERS = {
+    'dept': ('dept', 'dept_id'),
+    'course_id': ('course', 'course_id'),
+    'instructor_id': ('instructor', 'instructor_id')
+}
+
+
+def load_snapshot(file_path):
+    """
+    Loads a new_instance snapshot indexed by CRN.
+    The CSV is read with the column types of the new_instance schema, as import.py reads it,
+    so CRNs stay strings and the filters built from them match the stored documents.
+
+    :param file_path: The path to the new_instance CSV file.
+    :return: A DataFrame indexed by 'crn', or None if the file does not exist.
+    """
+    if not os.path.exists(file_path):
+        return None
+    df = pd.read_csv(file_path, dtype=cleaned_tables.csv_dtypes('new_instance'))
+    return df.set_index(df['crn'].rename(None))
+
+
+def diff_snapshots(old_df, new_df):
+    """
+    Compares two new_instance snapshots by CRN.
+
+    :param old_df: The previous snapshot returned by load_snapshot.
+    :param new_df: The current snapshot returned by load_snapshot.
+    :return: A dictionary with 'added', 'removed' and 'modified' DataFrames of rows from the
+             snapshot they belong to, plus 'previous' holding the old version of each modified row.
+    """
+    common = new_df.index.intersection(old_df.index)
+    old_common = old_df.loc[common].reindex(columns=new_df.columns)
+    new_common = new_df.loc[common]
+    changed = ((old_common != new_common) &
+               ~(old_common.isna() & new_common.isna())).any(axis=1)
+
+    return {
+        'added': new_df.loc[new_df.index.difference(old_df.index)],
+        'removed': old_df.loc[old_df.index.difference(new_df.index)],
+        'modified': new_common[changed],
+        'previous': old_common[changed]
+    }
+
+
+def counter_deltas(diff):
+    """
+    Computes the change in 'new_classes' for every department, course and instructor
+    affected by a snapshot diff. Added sections count +1, removed sections -1, and a modified
+    section that moved to another course or instructor counts -1 for the old key and +1 for the new.
+
+    :param diff: The dictionary returned by diff_snapshots.
+    :return: A dictionary mapping each new_instance counter column to a Series of non-zero deltas.
+    """
+    deltas = {}
+    for column in COUNTERS:
+        delta = pd.concat([
+            diff['added'][column].value_counts(),
+            diff['modified'][column].value_counts(),
+            -diff['removed'][column].value_counts(),
+            -diff['previous'][column].value_counts()
+        ]).groupby(level=0).sum()
+        deltas[column] = delta[delta != 0]
+    return deltas
+
+
+def apply_diff_to_mongo(db, diff):
+    """
+    Applies a snapshot diff to MongoDB as targeted writes: added and modified sections are
+    upserted into 'new_instance' by CRN, removed sections are deleted, and the 'new_classes'
+    counters of the affected departments, courses and instructors are adjusted with $inc.
+    Counters of keys that are not in MongoDB yet are left for the next full import.
+
+    :param db: The MongoDB database connection object.
+    :param diff: The dictionary returned by diff_snapshots.
+    """
+    upserts = pd.concat([diff['added'], diff['modified']])
+    operations = [ReplaceOne({'crn': record['crn']}, record, upsert=True)
+                  for record in upserts.to_dict('records')]
+    operations += [DeleteOne({'crn': crn}) for crn in diff['removed']['crn'].tolist()]
+    if operations:
+        db['new_instance'].bulk_write(operations, ordered=False)
+
+    for column, delta in counter_deltas(diff).items():
+        collection_name, key = COUNTERS[column]
+        operations = [UpdateOne({key: value}, {'$inc': {'new_classes': int(change)}})
+                      for value, change in delta.items()]
+        if operations:
+            db[collection_name].bulk_write(operations, ordered=False)
+
+
+def main():
+    snapshot_file = 'snapshots/new_instance.csv'
+    current_file = 'cleaned_data/new_instance.csv'
+
+    old_df = load_snapshot(snapshot_file)
+    if old_df is None:
+        print("No previous snapshot, assuming import.py loaded the current data")
+    else:
+        diff = diff_snapshots(old_df, load_snapshot(current_file))
+        client = MongoClient("mongodb://localhost:27017/")
+        apply_diff_to_mongo(client['VTCourseInsightDB'], diff)
+        print(f"{len(diff['added'])} added, {len(diff['removed'])} removed, "
+              f"{len(diff['modified'])} modified sections")
+
+    os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+    shutil.copyfile(current_file, snapshot_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import pytest
+
+# The pipeline scripts import each other as top-level modules from scripts/
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+RAW_DATA = os.path.join(SCRIPTS_DIR, 'raw_data')
+CLEANED_DATA = os.path.join(SCRIPTS_DIR, 'cleaned_data')
+
+# Rows of the synthetic distributions used by the past_cleaner checks
+SYNTHETIC_ROWS = 20_000
+
+
+@pytest.fixture(scope='session')
+def distribution_file(tmp_path_factory):
+    """
+    Writes a seeded synthetic distribution.csv, shared by the tests of the session. A few
+    sections have no instructor or no GPA, as in the real data.
+    """
+    import benchmark
+
+    df = benchmark.make_distribution(SYNTHETIC_ROWS)
+    df.loc[::997, 'Instructor'] = None
+    df.loc[::1009, 'GPA'] = None
+    file_path = str(tmp_path_factory.mktemp('distribution') / 'distribution.csv')
+    df.to_csv(file_path, index=False)
+    return file_path
+
+
+@pytest.fixture(scope='session')
+def offered_dept_file():
+    return os.path.join(RAW_DATA, 'offered_dept.csv')
+
+
+def read_files(folder):
+    """
+    Reads every file directly in a folder.
+
+    :param folder: The folder to read.
+    :return: A dictionary mapping file name to its contents as bytes.
+    """
+    contents = {}
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path):
+            with open(path, 'rb') as file:
+                contents[name] = file.read()
+    return contents
+
+
+@pytest.fixture
+def folder_contents():
+    return read_files
@@ -0,0 +1,55 @@
+import shutil
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import cleaned_tables
+from conftest import CLEANED_DATA
+
+TABLES = ['dept', 'instructor', 'course', 'past_instance', 'instructor_course_stats',
+          'new_instance']
+
+
+@pytest.fixture
+def cleaned_copy(tmp_path):
+    for table in TABLES:
+        shutil.copy(cleaned_tables.table_path(CLEANED_DATA, table, 'csv'), tmp_path)
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize('table', TABLES)
+def test_parquet_reads_back_like_csv(cleaned_copy, table):
+    csv_df = cleaned_tables.read_csv_table(cleaned_copy, table)
+    cleaned_tables.write_parquet(csv_df, cleaned_copy, table)
+    assert cleaned_tables.has_fresh_parquet(cleaned_copy, table)
+
+    pd.testing.assert_frame_equal(csv_df, cleaned_tables.read_table(cleaned_copy, table))
+    chunks = list(cleaned_tables.iter_table_chunks(cleaned_copy, table, 1000))
+    pd.testing.assert_frame_equal(csv_df, pd.concat(chunks, ignore_index=True))
+
+
+def test_missing_strings_read_as_nan(cleaned_copy):
+    df = cleaned_tables.read_csv_table(cleaned_copy, 'new_instance')
+    df.loc[0, 'location'] = None
+    cleaned_tables.write_parquet(df, cleaned_copy, 'new_instance')
+    parquet_df = cleaned_tables.read_table(cleaned_copy, 'new_instance')
+    assert parquet_df['location'].dtype == object
+    assert parquet_df['location'].isna().sum() == df['location'].isna().sum()
+    assert parquet_df['location'].map(type).ne(type(pd.NA)).all()
+
+
+def test_export_skips_absent_optional_columns(cleaned_copy):
+    df = cleaned_tables.read_csv_table(cleaned_copy, 'new_instance')
+    df.drop(columns='meetings', errors='ignore').to_csv(
+        cleaned_tables.table_path(cleaned_copy, 'new_instance', 'csv'), index=False)
+    cleaned_tables.export_parquet(cleaned_copy)
+    names = pq.read_schema(cleaned_tables.table_path(cleaned_copy, 'new_instance', 'parquet')).names
+    assert 'meetings' not in names and 'location' in names
+
+
+def test_stale_parquet_falls_back_to_csv(cleaned_copy):
+    cleaned_tables.export_parquet(cleaned_copy)
+    df = cleaned_tables.read_csv_table(cleaned_copy, 'dept')
+    df['new_classes'] = 7
+    df.to_csv(cleaned_tables.table_path(cleaned_copy, 'dept', 'csv'), index=False)
+    assert not cleaned_tables.has_fresh_parquet(cleaned_copy, 'dept')
+    assert (cleaned_tables.read_table(cleaned_copy, 'dept')['new_classes'] == 7).all()
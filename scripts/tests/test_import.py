@@ -0,0 +1,68 @@
+import importlib
+import pytest
+import cleaned_tables
+from conftest import CLEANED_DATA
+
+mongomock = pytest.importorskip('mongomock')
+mongo_import = importlib.import_module('import')
+
+TABLES = ['dept', 'instructor', 'course', 'past_instance', 'instructor_course_stats',
+          'new_instance']
+
+# Rows of each cleaned table loaded into mongomock, besides every row with a missing value
+SAMPLE_ROWS = 1000
+
+
+@pytest.fixture(scope='module')
+def exported_folder(tmp_path_factory):
+    folder = str(tmp_path_factory.mktemp('cleaned'))
+    for table in TABLES:
+        df = cleaned_tables.read_csv_table(CLEANED_DATA, table)
+        sample = df[(df.index < SAMPLE_ROWS) | df.isna().any(axis=1)]
+        sample.to_csv(cleaned_tables.table_path(folder, table, 'csv'), index=False)
+    cleaned_tables.export_parquet(folder)
+    return folder
+
+
+def load(chunks, collection_name, mode='swap'):
+    db = mongomock.MongoClient()['test']
+    mongo_import.insert_into_mongo(chunks, db, collection_name, mode)
+    return db
+
+
+@pytest.mark.parametrize('table', TABLES)
+def test_parquet_import_stores_same_documents_as_csv(exported_folder, table):
+    documents = {}
+    for source, chunks in (
+            ('csv', cleaned_tables.read_csv_table(exported_folder, table, 1000)),
+            ('parquet', cleaned_tables.iter_table_chunks(exported_folder, table, 1000))):
+        db = load(chunks, table)
+        documents[source] = list(db[table].find({}, {'_id': 0}))
+    assert len(documents['parquet']) == len(cleaned_tables.read_csv_table(exported_folder, table))
+    assert repr(documents['csv']) == repr(documents['parquet'])
+
+
+@pytest.mark.parametrize('mode', ['swap', 'upsert', 'replace'])
+def test_load_modes_build_declared_indexes(exported_folder, mode):
+    db = load(cleaned_tables.iter_table_chunks(exported_folder, 'course', 1000), 'course', mode)
+    keys = [list(index['key']) for index in db['course'].index_information().values()]
+    for columns, _ in mongo_import.INDEXES['course']:
+        assert [(column, 1) for column in columns] in keys
+    assert db['course'].count_documents({}) == len(
+        cleaned_tables.read_csv_table(exported_folder, 'course'))
+
+
+def test_upsert_keeps_past_instances_with_repeated_ids():
+    df = next(cleaned_tables.read_csv_table(CLEANED_DATA, 'past_instance', 1000))
+    repeated = df[df['instance_id'].duplicated(keep=False)]
+    assert not repeated.empty
+    db = load(df, 'past_instance', 'upsert')
+    assert db['past_instance'].count_documents({}) == len(df)
+
+
+def test_upsert_deletes_removed_rows(exported_folder):
+    df = cleaned_tables.read_csv_table(exported_folder, 'course')
+    db = load(df, 'course')
+    mongo_import.insert_into_mongo(df.iloc[10:], db, 'course', 'upsert')
+    stored = [document['course_id'] for document in db['course'].find({}, {'course_id': 1})]
+    assert sorted(stored) == sorted(df['course_id'].iloc[10:])
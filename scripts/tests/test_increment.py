@@ -0,0 +1,42 @@
+import csv
+import os
+import stat
+import increment
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerows(rows)
+    return str(path)
+
+
+def read_column(path, column):
+    with open(path, 'r', newline='') as file:
+        return [row[column] for row in csv.DictReader(file)]
+
+
+def test_new_classes_are_set_and_file_modes_kept(tmp_path):
+    new_instance_file = write_csv(tmp_path / 'new_instance.csv', [
+        ['crn', 'dept', 'course_id', 'instructor_id'],
+        ['1', 'CS', 'CS 1114', 'Smith (CS)'],
+        ['2', 'CS', 'CS 1114', 'Lee (CS)'],
+        ['3', 'MATH', 'MATH 1225', 'Smith (MATH)']])
+    dept_file = write_csv(tmp_path / 'dept.csv', [
+        ['dept_id', 'new_classes'], ['CS', '7'], ['MATH', '0'], ['PHYS', '3']])
+    course_file = write_csv(tmp_path / 'course.csv', [
+        ['course_id', 'new_classes'], ['CS 1114', '0'], ['CS 2114', '5']])
+    instructor_file = write_csv(tmp_path / 'instructor.csv', [
+        ['instructor_id', 'new_classes'], ['Smith (CS)', '0'], ['Lee (CS)', '0']])
+    for path in (dept_file, course_file, instructor_file):
+        os.chmod(path, 0o644)
+
+    for _ in range(2):  # Re-running leaves the counts unchanged
+        increment.process_new_instance(new_instance_file, dept_file, course_file,
+                                       instructor_file)
+
+    assert read_column(dept_file, 'new_classes') == ['2', '1', '0']
+    assert read_column(course_file, 'new_classes') == ['2', '0']
+    assert read_column(instructor_file, 'new_classes') == ['1', '1']
+    for path in (dept_file, course_file, instructor_file):
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
@@ -0,0 +1,64 @@
+import pandas as pd
+import ingest_term
+import past_cleaner
+from section_stats import STAT_COLUMNS
+
+
+def write_table(tmp_path, name, df):
+    file_path = str(tmp_path / f'{name}.csv')
+    df.to_csv(file_path, index=False)
+    return file_path
+
+
+def test_update_appends_new_keys_with_zero_new_classes(tmp_path):
+    file_path = write_table(tmp_path, 'course', pd.DataFrame({
+        'course_id': ['CS 101'], 'gpa': [3.1], 'past_classes': [4], 'new_classes': [2]}))
+    ingest_term.update_cleaned_table(file_path, 'course_id', pd.DataFrame(
+        {'gpa': [3.3, 2.8], 'past_classes': [5, 1]},
+        index=pd.Index(['CS 101', 'CS 201'], name='course_id')))
+
+    table = pd.read_csv(file_path)
+    assert table.to_dict('list') == {
+        'course_id': ['CS 101', 'CS 201'], 'gpa': [3.3, 2.8], 'past_classes': [5, 1],
+        'new_classes': [2, 0]}
+
+
+def test_update_does_not_add_new_classes_column(tmp_path):
+    file_path = write_table(tmp_path, 'instructor_course_stats', pd.DataFrame({
+        'stat_id': ['Smith CS 101'], 'gpa': [3.1], 'past_classes': [4]}))
+    ingest_term.update_cleaned_table(file_path, 'stat_id', pd.DataFrame(
+        {'gpa': [2.8], 'past_classes': [1]},
+        index=pd.Index(['Jones CS 101'], name='stat_id')))
+
+    table = pd.read_csv(file_path)
+    assert list(table.columns) == ['stat_id', 'gpa', 'past_classes']
+    assert list(table['stat_id']) == ['Smith CS 101', 'Jones CS 101']
+
+
+def test_ingest_matches_full_build(distribution_file, offered_dept_file, tmp_path):
+    df = pd.read_csv(distribution_file)
+    new_term = (df['Academic Year'] == '2022-23') & (df['Term'] == 'Winter')
+    history_file = write_table(tmp_path, 'history', df[~new_term])
+    term_file = write_table(tmp_path, 'term', df[new_term])
+    for folder in ('full', 'ingested', 'state'):
+        (tmp_path / folder).mkdir()
+
+    past_cleaner.run_pipeline(distribution_file, offered_dept_file, str(tmp_path / 'full'))
+    past_cleaner.run_pipeline(history_file, offered_dept_file, str(tmp_path / 'ingested'),
+                              str(tmp_path / 'state'))
+    history_rows = len(pd.read_csv(tmp_path / 'ingested' / 'past_instance.csv'))
+    ingested_rows = ingest_term.ingest_term(term_file, offered_dept_file,
+                                            str(tmp_path / 'ingested'), str(tmp_path / 'state'))
+    assert ingested_rows > 0
+    assert len(pd.read_csv(tmp_path / 'ingested' / 'past_instance.csv')) == \
+        history_rows + ingested_rows
+
+    for table, key in (('course', 'course_id'), ('instructor_course_stats', 'stat_id')):
+        full = pd.read_csv(tmp_path / 'full' / f'{table}.csv', index_col=key).sort_index()
+        ingested = pd.read_csv(tmp_path / 'ingested' / f'{table}.csv', index_col=key)
+        # Descriptive columns take the first row's value, which depends on the row order
+        columns = ['gpa', 'enrollment', 'withdraw', 'past_classes'] + STAT_COLUMNS
+        full = full[columns]
+        ingested = ingested.loc[full.index, columns]
+        # Means computed from merged sums can round differently in the last decimal
+        pd.testing.assert_frame_equal(full, ingested, check_exact=False, rtol=0, atol=0.011)
@@ -0,0 +1,40 @@
+from instructor_matcher import InstructorMatcher, normalize_name, raw_last_name
+
+
+def test_normalize_name():
+    assert normalize_name("O'Brien-Muñoz") == 'obrien munoz'
+    assert normalize_name('  Van   Der  Berg ') == 'van der berg'
+    assert raw_last_name('RJ De La Cruz') == 'De La Cruz'
+    assert raw_last_name('Staff') == 'Staff'
+
+
+def test_matcher_resolves_name_variants_within_department():
+    matcher = InstructorMatcher()
+    matcher.add('CS', 'Smith-Jones', 'Smith-Jones (CS)')
+    matcher.add('CS', 'Muñoz', 'Muñoz (CS)')
+    matcher.add('CS', 'Vanderberg', 'Vanderberg (CS)')
+    matcher.add('CS', 'Christopherson', 'Christopherson (CS)')
+
+    assert matcher.match('A Smith Jones', 'CS') == 'Smith-Jones (CS)'
+    assert matcher.match('J Munoz', 'CS') == 'Muñoz (CS)'
+    assert matcher.match('A B Van der Berg', 'CS') == 'Vanderberg (CS)'
+    assert matcher.match('K Christophersen', 'CS') == 'Christopherson (CS)'
+    assert matcher.match('J Munoz', 'MATH') is None
+    assert matcher.match('J Muno', 'CS') is None
+
+
+def test_unmatched_instructors_are_buffered_and_flushed_once(tmp_path):
+    instructors_file = tmp_path / 'instructor.csv'
+    instructors_file.write_text('instructor_id,last_name,dept,gpa,enrollment,withdraw,'
+                                'past_classes,new_classes\n')
+    matcher = InstructorMatcher.from_csv(str(instructors_file))
+
+    assert matcher.resolve('A Newname', 'CS') == 'Newname (CS)'
+    assert matcher.resolve('B Newname', 'CS') == 'Newname (CS)'
+    matcher.flush(str(instructors_file))
+    matcher.flush(str(instructors_file))
+
+    lines = instructors_file.read_text().splitlines()
+    assert lines[1:] == ['Newname (CS),Newname,CS,0.0,0.0,0.0,0,0']
+    assert InstructorMatcher.from_csv(str(instructors_file)).match('C Newname', 'CS') == \
+        'Newname (CS)'
@@ -0,0 +1,48 @@
+import os
+import pytest
+from conftest import CLEANED_DATA
+from meeting_times import (ScheduleChecker, decode_meetings, encode_meetings, parse_meetings,
+                           parse_time)
+
+
+def test_parse_time():
+    assert parse_time('12:15AM') == 15
+    assert parse_time('11:00AM') == 660
+    assert parse_time('12:15PM') == 735
+    assert parse_time('2:30PM') == 870
+
+
+def test_meetings_round_trip_and_skip_arranged_times():
+    meetings = parse_meetings('T R and M W F', '11:00AM and 2:30PM', '12:15PM and 3:20PM')
+    assert meetings == [(10, 660, 735), (21, 870, 920)]
+    assert encode_meetings(meetings) == '10:660-735;21:870-920'
+    assert decode_meetings(encode_meetings(meetings)) == meetings
+    assert parse_meetings('(ARR)', '(ARR)', '(ARR)') == []
+    assert decode_meetings('') == []
+
+
+def test_schedule_checks():
+    checker = ScheduleChecker()
+    checker.add('1', 'CS 1114', [(5, 600, 650)])    # M W 10:00-10:50
+    checker.add('2', 'CS 1114', [(5, 650, 700)])    # M W 10:50-11:40, touches 1
+    checker.add('3', 'MATH 1225', [(1, 620, 680)])  # M 10:20-11:20, overlaps 1 and 2
+    checker.add('4', 'MATH 1225', [(10, 600, 650)])  # T R, shares no day
+    checker.add('5', 'ENGL 1105', [])
+    checker.build()
+
+    assert checker.conflicting_sections('1') == {'3'}
+    assert checker.conflicting_sections('3') == {'1', '2'}
+    assert checker.validate_schedule(['1', '2', '3', '4', '99']) == [('1', '3'), ('2', '3')]
+    assert checker.open_sections(['CS 1114', 'MATH 1225'], schedule=['3']) == \
+        {'CS 1114': [], 'MATH 1225': ['4']}
+
+
+@pytest.mark.skipif(not os.path.exists(os.path.join(CLEANED_DATA, 'new_instance.csv')),
+                    reason='no cleaned new_instance.csv')
+def test_interval_index_matches_pairwise_scan():
+    checker = ScheduleChecker.from_csv(os.path.join(CLEANED_DATA, 'new_instance.csv'))
+    crns = list(checker.intervals)
+    for crn in crns[::25]:
+        scanned = {other_crn for other_crn in crns
+                   if other_crn != crn and checker.conflict(crn, other_crn)}
+        assert checker.conflicting_sections(crn) == scanned, crn
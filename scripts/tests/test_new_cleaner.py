@@ -0,0 +1,183 @@
+import csv
+import io
+import os
+import shutil
+import pickle
+import benchmark
+import new_cleaner
+from conftest import CLEANED_DATA, RAW_DATA
+from instructor_matcher import InstructorMatcher
+
+RAW_FILE = os.path.join(RAW_DATA, 'offered_raw.csv')
+INSTRUCTOR_FILE = os.path.join(CLEANED_DATA, 'instructor.csv')
+
+
+def raw_rows(*rows):
+    header = ['crn', 'course', 'title', 'schedule_type', 'modality', 'cr_hrs', 'capacity',
+              'instructor', 'days', 'start_time', 'end_time', 'location', 'exam']
+    return [dict(zip(header, row)) for row in rows]
+
+
+def test_parallel_process_csv_matches_serial(tmp_path, folder_contents):
+    outputs = {}
+    for workers in (1, 2):
+        folder = tmp_path / f'workers_{workers}'
+        folder.mkdir()
+        shutil.copy(INSTRUCTOR_FILE, folder)
+        new_cleaner.process_csv(RAW_FILE, str(folder / 'new_instance.csv'),
+                                str(folder / 'instructor.csv'), workers)
+        outputs[workers] = folder_contents(str(folder))
+    assert outputs[1] == outputs[2]
+
+
+def test_sections_write_same_output_as_dict_rows():
+    with open(RAW_FILE, 'r') as file:
+        positioned_rows = list(new_cleaner.iter_kept_rows(csv.DictReader(file)))
+
+    outputs = []
+    for clean, write in ((benchmark.legacy_clean_rows, benchmark.legacy_write_rows),
+                         (lambda rows, matcher: new_cleaner.clean_rows(rows, matcher, []),
+                          benchmark.write_sections)):
+        output = io.StringIO(newline='')
+        rows = [(position, dict(row)) for position, row in positioned_rows]
+        write(list(clean(rows, InstructorMatcher.from_csv(INSTRUCTOR_FILE))), output)
+        outputs.append(output.getvalue())
+    assert outputs[0] == outputs[1]
+
+
+def write_raw_file(folder, rows):
+    """
+    Writes raw rows to an offered_raw.csv and an instructor.csv without instructors to folder.
+    """
+    raw_file = str(folder / 'offered_raw.csv')
+    with open(raw_file, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(INSTRUCTOR_FILE, 'r') as file:
+        header = file.readline()
+    (folder / 'instructor.csv').write_text(header)
+    return raw_file
+
+
+def read_new_instances(file_path):
+    with open(file_path, 'r', newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def test_additional_times_join_the_course_row(tmp_path):
+    raw_file = write_raw_file(tmp_path, raw_rows(
+        ('80001', 'CS-1114', 'Intro', 'L', 'Face-to-Face Instruction', '3', '30', 'A Smith',
+         'M W', '10:10AM', '11:00AM', 'MCB 100', '00X'),
+        ('', '', '', '', '* Additional Times *', 'F', '2:30PM', '3:20PM', 'LAB 1', '', '', '',
+         ''),
+        ('80003', 'CS-4994', 'Research', 'R', '', '1 TO 19', '5', 'B Jones',
+         'T', '9:30AM', '10:45AM', 'TBA', '00X'),
+        ('', '', '', '', '* Additional Times *', 'R', '9:30AM', '10:45AM', 'TBA', '', '', '',
+         ''),
+        ('80002', 'CS-1114', 'Intro', 'L', 'Online: Asynchronous', '3', '30', 'Staff',
+         '(ARR)', '----- (ARR) -----', 'ONLINE', '00X', '')))
+    new_cleaner.process_csv(raw_file, str(tmp_path / 'new_instance.csv'),
+                            str(tmp_path / 'instructor.csv'))
+    sections = read_new_instances(tmp_path / 'new_instance.csv')
+
+    # The variable-credit course is skipped together with its additional times
+    assert [section['crn'] for section in sections] == ['80001', '80002']
+    assert sections[0]['days'] == 'M W and F'
+    assert sections[0]['start_time'] == '10:10AM and 2:30PM'
+    assert sections[0]['location'] == 'MCB 100 and LAB 1'
+    assert sections[0]['meetings'] == '5:610-660;16:870-920'
+    assert (sections[1]['start_time'], sections[1]['end_time'], sections[1]['meetings']) == \
+        ('(ARR)', '(ARR)', '')
+    instructors = read_new_instances(tmp_path / 'instructor.csv')
+    assert [instructor['instructor_id'] for instructor in instructors] == \
+        ['Smith (CS)', 'Staff (CS)']
+
+
+def test_parallel_process_csv_keeps_additional_times_across_shards(tmp_path, folder_contents):
+    # Departments alternate, so every additional times row sits on a shard boundary and each
+    # department's rows are spread over the file
+    rows = []
+    for i, (course, name) in enumerate([('CS-1114', 'A Smith'), ('MATH-1225', 'B Jones'),
+                                         ('CS-2114', 'C Lee'), ('PHYS-2305', 'D Park'),
+                                         ('MATH-1226', 'B Jones'), ('CS-1114', 'E Diaz')]):
+        rows.append(('8100' + str(i), course, 'Title', 'L', 'Face-to-Face Instruction', '3',
+                     '30', name, 'M W', '10:10AM', '11:00AM', 'MCB 100', '00X'))
+        for day in ('F', 'R')[:i % 2 + 1]:
+            rows.append(('', '', '', '', '* Additional Times *', day, f'{i + 1}:00PM',
+                         f'{i + 1}:50PM', f'LAB {i}', '', '', '', ''))
+
+    outputs = {}
+    for workers in (1, 2, 3):
+        folder = tmp_path / f'workers_{workers}'
+        folder.mkdir()
+        raw_file = write_raw_file(folder, raw_rows(*rows))
+        new_cleaner.process_csv(raw_file, str(folder / 'new_instance.csv'),
+                                str(folder / 'instructor.csv'), workers)
+        outputs[workers] = folder_contents(str(folder))
+    assert outputs[1] == outputs[2] == outputs[3]
+
+    sections = read_new_instances(tmp_path / 'workers_2' / 'new_instance.csv')
+    assert [section['crn'] for section in sections] == [f'8100{i}' for i in range(6)]
+    assert [section['location'] for section in sections] == [
+        'MCB 100 and LAB 0', 'MCB 100 and LAB 1 and LAB 1', 'MCB 100 and LAB 2',
+        'MCB 100 and LAB 3 and LAB 3', 'MCB 100 and LAB 4', 'MCB 100 and LAB 5 and LAB 5']
+
+
+def test_raw_file_keeps_additional_times_of_kept_courses():
+    with open(RAW_FILE, 'r') as file:
+        rows = list(csv.DictReader(file))
+    kept = {position for position, _ in new_cleaner.iter_kept_rows(rows)}
+
+    course_position = None
+    additional_kept = 0
+    for position, row in enumerate(rows):
+        if row['modality'] != '* Additional Times *':
+            course_position = position
+            continue
+        assert (position in kept) == (course_position in kept), position
+        additional_kept += position in kept
+    assert additional_kept > 0
+
+
+def test_changed_departments_clean_like_a_full_run(tmp_path, folder_contents):
+    with open(RAW_FILE, 'r') as file:
+        rows = list(csv.DictReader(file))
+    # A new CS section before the first one shifts the positions of every later department
+    first_cs = next(i for i, row in enumerate(rows) if row['course'].startswith('CS-'))
+    changed_rows = rows[:first_cs] + [dict(rows[first_cs], crn='99999', instructor='Z Newperson',
+                                           capacity='12')] + rows[first_cs:]
+
+    previous = tmp_path / 'previous'
+    previous.mkdir()
+    shutil.copy(INSTRUCTOR_FILE, previous)
+    new_cleaner.process_csv(RAW_FILE, str(previous / 'new_instance.csv'),
+                            str(previous / 'instructor.csv'))
+
+    outputs = {}
+    for name, changed_depts, workers in (('full', None, 1), ('changed', {'CS'}, 1),
+                                         ('changed_parallel', {'CS'}, 2)):
+        folder = tmp_path / name
+        shutil.copytree(previous, folder)
+        raw_file = write_raw_file(folder, changed_rows)
+        shutil.copy(previous / 'instructor.csv', folder)  # Replaces the empty one
+        new_cleaner.process_csv(raw_file, str(folder / 'new_instance.csv'),
+                                str(folder / 'instructor.csv'), workers, changed_depts)
+        outputs[name] = folder_contents(str(folder))
+    assert outputs['full'] == outputs['changed'] == outputs['changed_parallel']
+    assert 'Newperson (CS)' in outputs['full']['instructor.csv'].decode()
+
+    with open(raw_file, 'r') as file:
+        positioned_rows = list(new_cleaner.iter_kept_rows(csv.DictReader(file)))
+    to_clean, reused = new_cleaner.reuse_unchanged_sections(
+        positioned_rows, str(previous / 'new_instance.csv'), {'CS'})
+    assert {new_cleaner.get_department(row['course']) for _, row in to_clean
+            if row['course']} == {'CS'}
+    assert len(reused) > len(to_clean)
+
+
+def test_sections_pickle_with_their_values():
+    section = new_cleaner.Section('80001', 'CS', 'CS 1114', 'Smith (CS)', 'Intro', 'F2F', '3',
+                                  '30', 'M W', '10:10AM', '11:00AM', 'MCB 100')
+    section.meetings = '5:610-660'
+    assert pickle.loads(pickle.dumps(section)).values() == section.values()
@@ -0,0 +1,105 @@
+import tracemalloc
+import pandas as pd
+import benchmark
+import past_cleaner
+
+
+def assert_same_values(expected, actual):
+    # Grouped and per-group means sum in a different order, so a rounded mean can differ in
+    # the last decimal
+    pd.testing.assert_frame_equal(expected.set_axis(actual.columns, axis=1).reset_index(drop=True),
+                                  actual.reset_index(drop=True), check_dtype=False,
+                                  check_exact=False, rtol=0, atol=0.011)
+
+
+def synthetic_keys(distribution_file):
+    df = benchmark.legacy_load_distribution(distribution_file)
+    return df, set(df['Subject'].dropna()), set(df['course_id']), set(df['instructor_id'].dropna())
+
+
+def test_named_reductions_match_lambda_course_aggregation(distribution_file):
+    df, valid_depts, _, _ = synthetic_keys(distribution_file)
+    expected = benchmark.legacy_course_data(df)
+    actual = past_cleaner.build_course_data(df, valid_depts)
+    assert_same_values(expected, actual[['course_id', 'dept', 'title', 'credits', 'gpa',
+                                         'enrollment', 'withdraw', 'past_classes']])
+
+
+def test_named_reductions_match_lambda_instructor_course_stats(distribution_file):
+    df, _, valid_course_ids, valid_instructor_ids = synthetic_keys(distribution_file)
+    expected = benchmark.legacy_instructor_course_stats(df)
+    actual = past_cleaner.build_instructor_course_stats_data(
+        df, valid_course_ids, valid_instructor_ids)
+    assert_same_values(expected, actual[['instructor_id', 'course_id', 'gpa', 'enrollment',
+                                         'withdraw', 'past_classes']])
+
+
+def test_categorical_loading_writes_same_tables(distribution_file, offered_dept_file, tmp_path,
+                                                folder_contents):
+    outputs = {}
+    for name, loader in (('object', benchmark.legacy_load_distribution),
+                         ('categorical', past_cleaner.load_distribution)):
+        output_folder = tmp_path / name
+        output_folder.mkdir()
+        past_cleaner.run_stages(loader(distribution_file), offered_dept_file, str(output_folder))
+        outputs[name] = folder_contents(str(output_folder))
+    assert outputs['object'] == outputs['categorical']
+
+
+def test_categorical_loading_uses_less_memory(distribution_file):
+    legacy = benchmark.legacy_load_distribution(distribution_file)
+    categorical = past_cleaner.load_distribution(distribution_file)
+    assert categorical.memory_usage(deep=True).sum() < legacy.memory_usage(deep=True).sum() / 2
+
+
+def test_parallel_pipeline_matches_serial(distribution_file, offered_dept_file, tmp_path,
+                                          folder_contents):
+    outputs = {}
+    for workers in (1, 2):
+        output_folder = tmp_path / f'workers_{workers}'
+        output_folder.mkdir()
+        past_cleaner.run_pipeline(distribution_file, offered_dept_file, str(output_folder),
+                                  None, workers)
+        outputs[workers] = folder_contents(str(output_folder))
+    assert outputs[1] == outputs[2]
+
+
+def test_streaming_pipeline_matches_single_parse(distribution_file, offered_dept_file, tmp_path):
+    (tmp_path / 'full').mkdir()
+    (tmp_path / 'streamed').mkdir()
+    past_cleaner.run_pipeline(distribution_file, offered_dept_file, str(tmp_path / 'full'))
+    past_cleaner.run_streaming_pipeline(distribution_file, offered_dept_file,
+                                        str(tmp_path / 'streamed'), chunksize=3_000)
+    for table in ('dept', 'instructor', 'course', 'past_instance', 'instructor_course_stats'):
+        streamed = pd.read_csv(tmp_path / 'streamed' / f'{table}.csv')
+        full = pd.read_csv(tmp_path / 'full' / f'{table}.csv')
+        assert list(streamed.columns) == list(full.columns)
+        # Means computed from merged sums can round differently in the last decimal
+        pd.testing.assert_frame_equal(full, streamed, check_exact=False,
+                                      rtol=0, atol=0.011)
+
+
+def streaming_peak_mb(distribution_file, offered_dept_file, output_folder, chunksize):
+    tracemalloc.start()
+    try:
+        past_cleaner.run_streaming_pipeline(distribution_file, offered_dept_file,
+                                            str(output_folder), chunksize=chunksize)
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def test_streaming_memory_does_not_grow_with_history(offered_dept_file, tmp_path):
+    # The same terms repeated keep the set of keys fixed, so only the history grows
+    term = benchmark.make_distribution(2_000)
+    peaks = {}
+    for terms in (2, 8):
+        distribution_file = tmp_path / f'distribution_{terms}.csv'
+        for i in range(terms):
+            term.to_csv(distribution_file, mode='w' if i == 0 else 'a', header=i == 0,
+                        index=False)
+        output_folder = tmp_path / f'terms_{terms}'
+        output_folder.mkdir()
+        peaks[terms] = streaming_peak_mb(str(distribution_file), offered_dept_file,
+                                         output_folder, chunksize=len(term))
+    assert peaks[8] < peaks[2] * 1.25, peaks
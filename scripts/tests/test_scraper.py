@@ -0,0 +1,261 @@
+import json
+import os
+import time
+import pytest
+import timetable_fixture
+from conftest import RAW_DATA
+
+scraper = pytest.importorskip('scraper')
+
+RAW_FILE = os.path.join(RAW_DATA, 'offered_raw.csv')
+TERM_YEAR = '202409'
+
+# Saved results pages in the markup of the timetable site, each next to the rows scraper.py
+# wrote for it (<subject>.json)
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+
+def fixture_pages():
+    """
+    Renders one result page per subject of the scraped timetable with timetable_fixture.
+    """
+    columns, subjects = timetable_fixture.load_subject_rows(RAW_FILE)
+    return {subject: (timetable_fixture.render_form(TERM_YEAR, subjects) +
+                      timetable_fixture.render_table(columns, rows), rows)
+            for subject, rows in subjects.items()}
+
+
+PAGES = fixture_pages()
+
+
+@pytest.mark.parametrize('parser', ['bs4', 'lxml'])
+def test_parser_reads_back_rendered_rows(parser):
+    engine = scraper.TimetableScraper(None, parser=parser)
+    for subject, (html, rows) in PAGES.items():
+        parsed = engine._parse_html(html)
+        assert parsed == [dict(zip(scraper.TimetableScraper.DATA_KEYS, row)) for row in rows], \
+            subject
+
+
+@pytest.mark.parametrize('parser', ['bs4', 'lxml'])
+@pytest.mark.parametrize('subject', sorted(name[:-len('.html')] for name in os.listdir(PAGES_DIR)
+                                           if name.endswith('.html')))
+def test_parser_matches_saved_page(parser, subject):
+    with open(os.path.join(PAGES_DIR, f'{subject}.html'), encoding='utf-8') as file:
+        html = file.read()
+    with open(os.path.join(PAGES_DIR, f'{subject}.json'), encoding='utf-8') as file:
+        expected = json.load(file)
+    assert scraper.TimetableScraper(None, parser=parser)._parse_html(html) == expected
+
+
+def test_parser_engines_agree_on_every_page():
+    bs4_engine = scraper.TimetableScraper(None, parser='bs4')
+    lxml_engine = scraper.TimetableScraper(None, parser='lxml')
+    for subject, (html, _) in PAGES.items():
+        assert bs4_engine._parse_html(html) == lxml_engine._parse_html(html), subject
+
+
+@pytest.mark.parametrize('parser', ['bs4', 'lxml'])
+def test_page_without_results_table_has_no_rows(parser):
+    engine = scraper.TimetableScraper(None, parser=parser)
+    assert engine._parse_html('<html><body><p>NO SECTIONS FOUND</p></body></html>') == []
+
+
+def start_server(**kwargs):
+    server = timetable_fixture.serve_fixture(RAW_FILE, TERM_YEAR, **kwargs)
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+@pytest.fixture(scope='module')
+def fixture_url():
+    server, url = start_server()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=['http', 'selenium'])
+def backend(request):
+    """
+    Returns a function of the fixture URL giving a scraper factory for each backend. The
+    Selenium backend is skipped where no headless Chrome can be started.
+    """
+    if request.param == 'http':
+        return lambda url: lambda: scraper.HttpTimetableScraper(base_url=url, parser='lxml')
+
+    from selenium import webdriver
+    from selenium.common.exceptions import WebDriverException
+
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    try:
+        webdriver.Chrome(options=options).quit()
+    except WebDriverException as error:
+        pytest.skip(f'No headless Chrome: {error.msg}')
+    return lambda url: lambda: scraper.TimetableScraper(webdriver.Chrome(options=options),
+                                                        base_url=url, parser='lxml')
+
+
+def expected_rows(subject_codes):
+    return [dict(zip(scraper.TimetableScraper.DATA_KEYS, row))
+            for code in subject_codes for row in PAGES[code][1]]
+
+
+# Neither alphabetical nor grouped by shard, so the merge order is visible
+SUBJECT_CODES = sorted(PAGES)[::-9][:10]
+
+
+@pytest.mark.parametrize('workers', [1, 2, 4])
+def test_parallel_fetch_keeps_subject_order(fixture_url, backend, workers):
+    rows = scraper.fetch_courses_parallel(TERM_YEAR, SUBJECT_CODES, backend(fixture_url),
+                                          max_workers=workers)
+    assert rows == expected_rows(SUBJECT_CODES)
+
+
+def failing(factory, failures, attempts):
+    """
+    Wraps a scraper factory so the first fetches of each subject in failures raise, as many
+    times as failures gives for the subject.
+    """
+    def make():
+        engine = factory()
+        fetch = engine._fetch_subject_html
+
+        def flaky_fetch(subject_code, cached=None):
+            attempts.append(subject_code)
+            if failures.get(subject_code, 0) > 0:
+                failures[subject_code] -= 1
+                raise scraper.requests.ConnectionError(f'{subject_code} dropped')
+            return fetch(subject_code, cached)
+
+        engine._fetch_subject_html = flaky_fetch
+        return engine
+    return make
+
+
+def test_transient_failure_is_retried(fixture_url, backend):
+    attempts = []
+    failures = dict.fromkeys(SUBJECT_CODES[1::3], 1)
+    rows = scraper.fetch_courses_parallel(
+        TERM_YEAR, SUBJECT_CODES, failing(backend(fixture_url), failures, attempts),
+        max_workers=2)
+    assert rows == expected_rows(SUBJECT_CODES)
+    assert sorted(attempts) == sorted(SUBJECT_CODES + SUBJECT_CODES[1::3])
+
+
+def test_persistent_failure_fails_after_retries(fixture_url):
+    attempts = []
+    factory = failing(lambda: scraper.HttpTimetableScraper(base_url=fixture_url),
+                      {SUBJECT_CODES[0]: 3}, attempts)
+    with pytest.raises(scraper.requests.ConnectionError):
+        scraper._scrape_shard(TERM_YEAR, SUBJECT_CODES[:1], factory, retries=2)
+    assert attempts == [SUBJECT_CODES[0]] * 3
+
+
+@pytest.mark.parametrize('parser', ['bs4', 'lxml'])
+def test_http_backend_matches_saved_pages(parser):
+    server, url = start_server(pages_folder=PAGES_DIR)
+    try:
+        engine = scraper.HttpTimetableScraper(base_url=url, parser=parser)
+        for subject in server.pages:
+            with open(os.path.join(PAGES_DIR, f'{subject}.json'), encoding='utf-8') as file:
+                expected = json.load(file)
+            assert engine.fetch_courses(TERM_YEAR, [subject]) == expected, subject
+        engine.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def fetch_with_cache(url, cache_folder, subject_codes):
+    """
+    Fetches subjects through a fresh SubjectCache over cache_folder, as a new scrape would.
+    :return: A tuple of (cache, rows, subjects answered 304 Not Modified).
+    """
+    cache = scraper.SubjectCache(cache_folder)
+    engine = scraper.HttpTimetableScraper(base_url=url, cache=cache)
+    fetch = engine._fetch_subject_html
+    not_modified = []
+
+    def recording_fetch(subject_code, cached=None):
+        html, headers = fetch(subject_code, cached)
+        if html is None:
+            not_modified.append(subject_code)
+        return html, headers
+
+    engine._fetch_subject_html = recording_fetch
+    rows = engine.fetch_courses(TERM_YEAR, subject_codes)
+    engine.close()
+    return cache, rows, not_modified
+
+
+def rewrite_entries(cache, subject_codes, **changes):
+    for code in subject_codes:
+        path = cache._path(TERM_YEAR, code)
+        with open(path, encoding='utf-8') as file:
+            entry = json.load(file)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(dict(entry, **changes), file)
+
+
+def test_cache_revalidates_unchanged_subjects(tmp_path):
+    server, url = start_server()
+    codes = SUBJECT_CODES[:3]
+    try:
+        cache, rows, _ = fetch_with_cache(url, str(tmp_path), codes)
+        assert cache.changed == set(codes)
+        assert rows == expected_rows(codes)
+
+        # A 304 answers with the cached rows and keeps the entry from ageing out
+        stale = time.time() - cache.max_age + 60
+        rewrite_entries(cache, codes, fetched_at=stale)
+        cache, rows, not_modified = fetch_with_cache(url, str(tmp_path), codes)
+        assert (cache.changed, not_modified) == (set(), codes)
+        assert rows == expected_rows(codes)
+        assert all(cache.get(TERM_YEAR, code)['fetched_at'] > stale for code in codes)
+
+        # Without validators, an identical body is recognised by its hash
+        rewrite_entries(cache, codes, etag=None, fetched_at=stale)
+        cache, rows, not_modified = fetch_with_cache(url, str(tmp_path), codes)
+        assert (cache.changed, not_modified) == (set(), [])
+        assert rows == expected_rows(codes)
+        for code in codes:
+            entry = cache.get(TERM_YEAR, code)
+            assert entry['etag'] and entry['fetched_at'] > stale
+
+        # A changed page is parsed again and reported
+        server.subjects[codes[1]] = server.subjects[codes[1]][:1]
+        cache, rows, not_modified = fetch_with_cache(url, str(tmp_path), codes)
+        assert (cache.changed, not_modified) == ({codes[1]}, [codes[0], codes[2]])
+        assert rows == [dict(zip(scraper.TimetableScraper.DATA_KEYS, row))
+                        for code in codes for row in server.subjects[code]]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_cache_evicts_old_entries_then_oldest_over_size(fixture_url, tmp_path):
+    codes = SUBJECT_CODES[:4]
+    cache, _, _ = fetch_with_cache(fixture_url, str(tmp_path), codes)
+    paths = [cache._path(TERM_YEAR, code) for code in codes]
+    now = time.time()
+    for age, path in zip([cache.max_age + 60, 300, 200, 100], paths):
+        os.utime(path, (now - age, now - age))
+
+    cache.evict()
+    assert [os.path.exists(path) for path in paths] == [False, True, True, True]
+
+    cache.max_bytes = sum(os.path.getsize(path) for path in paths[2:])
+    cache.evict()
+    assert [os.path.exists(path) for path in paths] == [False, False, True, True]
+
+
+def test_changed_subjects_accumulate_until_cleaned(tmp_path):
+    changed_file = str(tmp_path / 'changed_subjects.json')
+    scraper.record_changed_subjects(set(), changed_file)
+    assert not os.path.exists(changed_file)
+
+    scraper.record_changed_subjects({'MATH', 'CS'}, changed_file)
+    scraper.record_changed_subjects({'PHYS', 'CS'}, changed_file)
+    with open(changed_file) as file:
+        assert json.load(file) == ['CS', 'MATH', 'PHYS']
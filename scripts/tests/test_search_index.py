@@ -0,0 +1,33 @@
+import pytest
+import benchmark
+import cleaned_tables
+from conftest import CLEANED_DATA
+from search_index import SearchIndex, course_terms, instructor_terms
+
+
+@pytest.fixture(scope='module')
+def search_index():
+    return SearchIndex.from_tables(cleaned_tables.read_table(CLEANED_DATA, 'course'),
+                                   cleaned_tables.read_table(CLEANED_DATA, 'instructor'))
+
+
+@pytest.mark.parametrize('query', ['c', 'cs', 'cs 31', 'cs3114', '3114', 'data str', 'intro',
+                                   'smi', 'jackson', 'math 1', 'Van', 'zzzz'])
+def test_lookup_matches_linear_scan(search_index, query):
+    assert search_index.lookup(query) == benchmark.linear_search(search_index, query)
+
+
+def test_primary_term_matches_rank_first():
+    index = SearchIndex(max_results=3)
+    index.add('course', 'MATH 1225', 'MATH 1225 Calculus', 500,
+              course_terms('MATH 1225', 'Calculus', 'MATH'))
+    index.add('course', 'CS 3114', 'CS 3114 Data Structures', 10,
+              course_terms('CS 3114', 'Data Structures', 'CS'))
+    index.add('instructor', 'Smith (CS)', 'Smith (CS)', 20, instructor_terms('Smith', 'CS'))
+    index.build()
+
+    assert [result['id'] for result in index.lookup('cs')] == ['CS 3114', 'Smith (CS)']
+    assert [result['id'] for result in index.lookup('CS-31')] == ['CS 3114']
+    assert index.lookup('calc') == [{'kind': 'course', 'id': 'MATH 1225',
+                                     'label': 'MATH 1225 Calculus'}]
+    assert len(index.to_records()) == len(index.prefixes)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import section_stats
+
+
+def test_value_counts_add_up_per_key():
+    left = pd.Series({'CS 1114': '2.5:1 3.0:2', 'CS 2114': '3.1:1'})
+    right = pd.Series({'CS 1114': '2.75:1 3.0:1', 'CS 3114': '2.0:4'})
+    merged = section_stats.merge_value_counts(left, right)
+    assert merged.to_dict() == {'CS 1114': '2.5:1 2.75:1 3.0:3', 'CS 2114': '3.1:1',
+                                'CS 3114': '2.0:4'}
+
+
+def test_state_statistics_match_direct_statistics():
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({'course_id': rng.choice(['A', 'B', 'C'], 300),
+                       'GPA': rng.uniform(2.0, 4.0, 300).round(2),
+                       'Graded Enrollment': rng.integers(0, 120, 300)})
+    df.loc[::17, 'GPA'] = None
+
+    halves = [section_stats.build_section_state(part, 'course_id')
+              for part in (df.iloc[:150], df.iloc[150:])]
+    merged = halves[0][list(section_stats.SUM_COLUMNS.values())].add(
+        halves[1][list(section_stats.SUM_COLUMNS.values())], fill_value=0)
+    merged[section_stats.VALUES_COLUMN] = section_stats.merge_value_counts(
+        halves[0][section_stats.VALUES_COLUMN], halves[1][section_stats.VALUES_COLUMN])
+
+    pd.testing.assert_frame_equal(section_stats.finalize_section_state(merged),
+                                  section_stats.build_section_stats(df, 'course_id'),
+                                  check_exact=False, rtol=0, atol=0.011)
+
+
+def test_value_quantiles_match_expanded_sections():
+    values = pd.Series({'A': '2.5:1 3.0:2 3.75:4', 'B': '', 'C': '3.1:1', 'D': '1.0:3 4.0:1'})
+    q = list(section_stats.PERCENTILES.values())
+    quantiles = section_stats.value_quantiles(values, q)
+
+    assert quantiles.loc['B'].isna().all()
+    for key, gpas in {'A': [2.5, 3.0, 3.0] + [3.75] * 4, 'C': [3.1],
+                      'D': [1.0] * 3 + [4.0]}.items():
+        np.testing.assert_allclose(quantiles.loc[key], np.quantile(gpas, q))
@@ -0,0 +1,56 @@
+import importlib
+import os
+import pandas as pd
+import pytest
+import cleaned_tables
+import snapshot_diff
+from conftest import CLEANED_DATA
+
+mongomock = pytest.importorskip('mongomock')
+mongo_import = importlib.import_module('import')
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    """
+    Writes the committed new_instance.csv as the previous snapshot and a refresh of it with
+    two sections dropped, one moved to another instructor and one added.
+    """
+    df = cleaned_tables.read_csv_table(CLEANED_DATA, 'new_instance')
+    old_file = str(tmp_path / 'old' / 'new_instance.csv')
+    new_file = str(tmp_path / 'new' / 'new_instance.csv')
+    os.makedirs(os.path.dirname(old_file))
+    os.makedirs(os.path.dirname(new_file))
+    df.to_csv(old_file, index=False)
+
+    refreshed = df.drop(index=[0, 1]).copy()
+    refreshed.loc[2, ['instructor_id', 'capacity']] = [df.loc[3, 'instructor_id'], 999]
+    added = df.loc[[4]].assign(crn='99999')
+    refreshed = pd.concat([refreshed, added], ignore_index=True)
+    refreshed.to_csv(new_file, index=False)
+    return df, refreshed, old_file, new_file
+
+
+def test_snapshot_keys_match_imported_crns(snapshots):
+    _, _, old_file, _ = snapshots
+    assert snapshot_diff.load_snapshot(old_file).index.map(type).unique().tolist() == [str]
+
+
+def test_diff_replay_matches_full_import(snapshots):
+    df, refreshed, old_file, new_file = snapshots
+    db = mongomock.MongoClient()['test']
+    mongo_import.insert_into_mongo(
+        cleaned_tables.read_csv_table(os.path.dirname(old_file), 'new_instance'), db,
+        'new_instance')
+
+    diff = snapshot_diff.diff_snapshots(snapshot_diff.load_snapshot(old_file),
+                                        snapshot_diff.load_snapshot(new_file))
+    assert (len(diff['added']), len(diff['removed']), len(diff['modified'])) == (1, 2, 1)
+    snapshot_diff.apply_diff_to_mongo(db, diff)
+
+    collection = db['new_instance']
+    assert collection.count_documents({}) == len(refreshed)
+    assert collection.count_documents({'crn': {'$in': df.loc[[0, 1], 'crn'].tolist()}}) == 0
+    moved = collection.find_one({'crn': df.loc[2, 'crn']})
+    assert (moved['instructor_id'], moved['capacity']) == (df.loc[3, 'instructor_id'], 999)
+    assert collection.find_one({'crn': '99999'})['course_id'] == df.loc[4, 'course_id']
@@ -0,0 +1,22 @@
+import pandas as pd
+import trend_rollup
+
+
+def test_rollup_rows_are_numbered_chronologically():
+    past_instance_df = pd.DataFrame({
+        'course_id': ['CS 1114'] * 5,
+        'instructor_id': ['Smith (CS)'] * 5,
+        'year': ['2019-20', '2018-19', '2018-19', '2018-19', '2019-20'],
+        'term': ['Summer I', 'Spring', 'Fall', 'Summer II', 'Fall'],
+        'crn': ['1', '2', '3', '4', '5'],
+        'gpa': [3.0, 3.1, 3.2, 3.3, 3.4],
+        'withdraw': [0, 1, 0, 2, 0],
+        'enrollment': [20, 30, 40, 50, 60]})
+    rollup = trend_rollup.build_trend_rollups(past_instance_df)['course_term_trend']
+
+    assert list(zip(rollup['year'], rollup['term'])) == [
+        ('2018-19', 'Summer II'), ('2018-19', 'Fall'), ('2018-19', 'Spring'),
+        ('2019-20', 'Summer I'), ('2019-20', 'Fall')]
+    assert list(rollup['term_order']) == [1, 2, 4, 0, 2]
+    # Sorting by year and term_order, as the API does, gives the same order
+    assert rollup.sort_values(['year', 'term_order']).index.tolist() == list(range(5))
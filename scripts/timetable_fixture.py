@@ -0,0 +1,150 @@
+import csv
+import hashlib
+import html
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def load_subject_rows(raw_file):
+    """
+    Reads a scraped offered_raw.csv and groups its rows by subject.
+    '* Additional Times *' rows have no course of their own and stay with the row before them.
+
+    :param raw_file: The file path of the raw CSV file written by scraper.py.
+    :return: A tuple of (column names, dictionary mapping subject code to a list of row value lists).
+    """
+    subjects = {}
+    with open(raw_file, 'r') as file:
+        reader = csv.reader(file)
+        columns = next(reader)
+        subject = None
+        for row in reader:
+            if row[0]:
+                subject = row[1].split('-')[0]
+            subjects.setdefault(subject, []).append(row)
+    return columns, subjects
+
+
+def render_form(term_year, subject_codes):
+    """
+    Renders the term and subject selection form of the timetable page.
+
+    :param term_year: The term year offered in the TERMYEAR dropdown.
+    :param subject_codes: The subject codes offered in the subj_code dropdown.
+    :return: The form as an HTML string.
+    """
+    options = ''.join(f'<option value="{code}">{code}</option>'
+                      for code in subject_codes)
+    return (f'<form method="post" action="">'
+            f'<select name="TERMYEAR"><option value="{term_year}">{term_year}</option></select>'
+            f'<select name="subj_code">{options}</select>'
+            f'<input type="submit" name="BTN_PRESSED" value="FIND class sections">'
+            f'</form>')
+
+
+def render_table(columns, rows):
+    """
+    Renders rows as a 'dataentrytable' shaped like the timetable results.
+    The header row carries attributes and the data rows do not, which is what the scraper
+    uses to tell them apart.
+
+    :param columns: The column names used for the header row.
+    :param rows: A list of row value lists.
+    :return: The table as an HTML string.
+    """
+    header = ''.join(f'<td class="deheader">{html.escape(column)}</td>'
+                     for column in columns)
+    body = ''.join('<tr>' + ''.join(f'<td class="dedefault">{html.escape(value)}</td>'
+                                    for value in row) + '</tr>\n' for row in rows)
+    return (f'<table class="dataentrytable">'
+            f'<tr style="background-color: #cccccc">{header}</tr>\n{body}</table>')
+
+
+class TimetableFixtureHandler(BaseHTTPRequestHandler):
+    """
+    Serves the selection form on GET and a subject's results on POST, using the rows
+    attached to the server by serve_fixture, or the subject's saved page when there is one.
+    Responses carry an ETag and honour If-None-Match.
+    """
+
+    def do_GET(self):
+        server = self.server
+        self._send(render_form(server.term_year, server.subjects))
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        subject = form.get('subj_code', [''])[0]
+        if subject in server.pages:
+            self._send_content(server.pages[subject])
+            return
+        rows = server.subjects.get(subject, [])
+        self._send(render_form(server.term_year, server.subjects) +
+                   (render_table(server.columns, rows) if rows else ''))
+
+    def _send(self, body):
+        self._send_content(f'<html><body>{body}</body></html>'.encode())
+
+    def _send_content(self, content):
+        etag = '"' + hashlib.sha256(content).hexdigest()[:16] + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_saved_pages(pages_folder):
+    """
+    Reads the saved results pages in a folder.
+
+    :param pages_folder: Folder holding one <subject>.html page per subject.
+    :return: A dictionary mapping subject code to the page as bytes.
+    """
+    pages = {}
+    for name in os.listdir(pages_folder):
+        if name.endswith('.html'):
+            with open(os.path.join(pages_folder, name), 'rb') as file:
+                pages[name[:-len('.html')]] = file.read()
+    return pages
+
+
+def serve_fixture(raw_file, term_year, port=0, pages_folder=None):
+    """
+    Starts a local stand-in for the timetable site in a background thread.
+
+    :param raw_file: The file path of the raw CSV file whose rows are served.
+    :param term_year: The term year offered by the form.
+    :param port: The port to listen on; 0 picks a free port.
+    :param pages_folder: Optional folder of saved <subject>.html pages, served as they are
+                         instead of the rows of their subject.
+    :return: The running server; its URL is http://127.0.0.1:<server.server_address[1]>/.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), TimetableFixtureHandler)
+    server.columns, server.subjects = load_subject_rows(raw_file)
+    server.term_year = term_year
+    server.pages = load_saved_pages(pages_folder) if pages_folder else {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    server = serve_fixture('raw_data/offered_raw.csv', '202409', port=8000)
+    print(f"Serving timetable fixture on http://127.0.0.1:{server.server_address[1]}/")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
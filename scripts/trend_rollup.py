@@ -0,0 +1,83 @@
+import os
+import pandas as pd
+import cleaned_tables
+
+# Output table -> past_instance column each per-term rollup is grouped by
+TREND_TABLES = {
+    'course_term_trend': 'course_id',
+    'instructor_term_trend': 'instructor_id',
+    'dept_term_trend': 'dept'
+}
+
+# Order of the terms within an academic year, used to sort the rollups chronologically
+TERM_ORDER = ['Summer I', 'Summer II', 'Fall', 'Winter', 'Spring']
+
+
+def build_term_rollup(past_instance_df, key):
+    """
+    Aggregates past course instances per key, academic year and term.
+    GPA is weighted by graded enrollment, so large sections count for more than small ones,
+    and the withdraw rate is the share of all enrolled students (graded plus withdrawn)
+    who withdrew.
+
+    :param past_instance_df: DataFrame with the columns of past_instance.csv and a 'dept' column.
+    :param key: Column to group by, e.g. 'course_id'.
+    :return: A DataFrame with one row per key and term, in chronological order per key. The
+             'term_order' column is the term's position in TERM_ORDER, so readers can sort by
+             'year' and 'term_order'.
+    """
+    graded = past_instance_df['gpa'].notna()
+    df = past_instance_df.assign(
+        gpa_points=(past_instance_df['gpa'] * past_instance_df['enrollment']).where(graded, 0),
+        gpa_enrollment=past_instance_df['enrollment'].where(graded, 0))
+
+    rollup = df.groupby([key, 'year', 'term'], sort=False).agg(
+        gpa_points=('gpa_points', 'sum'),
+        gpa_enrollment=('gpa_enrollment', 'sum'),
+        enrollment=('enrollment', 'sum'),
+        withdraw=('withdraw', 'sum'),
+        sections=('crn', 'count')
+    ).reset_index()
+
+    rollup['gpa'] = (rollup.pop('gpa_points') / rollup.pop('gpa_enrollment')).round(2)
+    rollup['withdraw_rate'] = (rollup['withdraw'] /
+                               (rollup['enrollment'] + rollup['withdraw'])).round(4)
+    rollup['trend_id'] = rollup[key] + ' ' + rollup['year'] + ' ' + rollup['term']
+
+    rollup['term_order'] = rollup['term'].map(
+        {term: i for i, term in enumerate(TERM_ORDER)}).astype('int64')
+    order = rollup.sort_values([key, 'year', 'term_order']).index
+    return rollup.loc[order, ['trend_id', key, 'year', 'term', 'term_order', 'gpa',
+                              'enrollment', 'withdraw_rate', 'sections']].reset_index(drop=True)
+
+
+def build_trend_rollups(past_instance_df):
+    """
+    Builds the per-term course, instructor and department rollups of the past instances.
+
+    :param past_instance_df: DataFrame with the columns of past_instance.csv.
+    :return: A dictionary mapping each table in TREND_TABLES to its rollup.
+    """
+    df = past_instance_df.assign(dept=past_instance_df['course_id'].str.split(' ').str[0])
+    return {table: build_term_rollup(df, key) for table, key in TREND_TABLES.items()}
+
+
+def create_trend_csvs(cleaned_folder):
+    """
+    Reads past_instance from the cleaned folder and writes the course, instructor and
+    department per-term rollups next to it.
+
+    :param cleaned_folder: Folder containing the cleaned tables.
+    """
+    past_instance_df = cleaned_tables.read_table(cleaned_folder, 'past_instance', columns=[
+        'course_id', 'instructor_id', 'year', 'term', 'crn', 'gpa', 'withdraw', 'enrollment'])
+    for table, rollup in build_trend_rollups(past_instance_df).items():
+        rollup.to_csv(os.path.join(cleaned_folder, f'{table}.csv'), index=False)
+
+
+def main():
+    create_trend_csvs('cleaned_data/')
+
+
+if __name__ == "__main__":
+    main()
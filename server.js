@@ -29,6 +29,9 @@ const instructorsRouter = require('./routes/Instructor');
 const pastInstancesRouter = require('./routes/PastInstance');
 const instructorCourseStatsRouter = require('./routes/InstructorCourseStats');
 const newInstancesRouter = require('./routes/NewInstance');
+const termTrendsRouter = require('./routes/TermTrend');
+const searchRouter = require('./routes/Search');
+const courseComparisonRouter = require('./routes/CourseComparison');
 const userRouter = require('./routes/User');
 
 
@@ -38,6 +41,9 @@ app.use('/api/instructor', instructorsRouter);
 app.use('/api/pastInstance', pastInstancesRouter);
 app.use('/api/instructorCourseStat', instructorCourseStatsRouter);
 app.use('/api/newInstance', newInstancesRouter);
+app.use('/api/termTrend', termTrendsRouter);
+app.use('/api/search', searchRouter);
+app.use('/api/courseComparison', courseComparisonRouter);
 app.use('/api/user', userRouter);
 
 const PORT = process.env.PORT || 5000;